@@ -2,17 +2,14 @@
 # ... existing code ... 
 
 from fastapi import APIRouter, Request, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import List
 import logging
 from sqlalchemy.orm import Session
 from app.models import SessionLocal
 from app.models.alert_schemas import CommonResponse
 from app.alert.services.alert_service import parse_and_dispatch_alert
-from app.alert.services.engine_service import (
-    start_alert_engine, 
-    stop_alert_engine, 
-    get_alert_engine_status,
-    alert_engine_job
-)
+from app.alert.services import engine_process
 from app.utils.logger import logger
 
 router = APIRouter()
@@ -36,7 +33,7 @@ async def alert_webhook(request: Request):
 def start_engine():
     """启动告警引擎"""
     try:
-        start_alert_engine()
+        engine_process.start_engine()
         return {"code": 0, "data": {"status": "started"}, "msg": "告警引擎启动成功"}
     except Exception as e:
         logger.error(f"启动告警引擎失败: {e}")
@@ -46,7 +43,7 @@ def start_engine():
 def stop_engine():
     """停止告警引擎"""
     try:
-        stop_alert_engine()
+        engine_process.stop_engine()
         return {"code": 0, "data": {"status": "stopped"}, "msg": "告警引擎停止成功"}
     except Exception as e:
         logger.error(f"停止告警引擎失败: {e}")
@@ -56,7 +53,7 @@ def stop_engine():
 def get_engine_status():
     """获取告警引擎状态"""
     try:
-        status = get_alert_engine_status()
+        status = engine_process.get_engine_status()
         return {"code": 0, "data": status, "msg": "获取状态成功"}
     except Exception as e:
         logger.error(f"获取告警引擎状态失败: {e}")
@@ -64,10 +61,33 @@ def get_engine_status():
 
 @router.post("/alert/engine/test", response_model=CommonResponse[dict])
 def test_engine():
-    """手动触发一次告警检测（测试用）"""
+    """手动触发一次告警检测（测试用），忽略评估间隔评估全部启用的规则"""
     try:
-        alert_engine_job()
+        engine_process.run_engine_once()
         return {"code": 0, "data": {"status": "executed"}, "msg": "手动执行告警检测成功"}
     except Exception as e:
         logger.error(f"手动执行告警检测失败: {e}")
-        return {"code": 1, "data": None, "msg": f"执行失败: {str(e)}"} 
\ No newline at end of file
+        return {"code": 1, "data": None, "msg": f"执行失败: {str(e)}"} 
+
+@router.get("/alert/engine/metrics", response_class=PlainTextResponse)
+def get_engine_metrics():
+    """告警引擎指标（Prometheus 文本格式），供 Prometheus 抓取"""
+    try:
+        return PlainTextResponse(engine_process.get_engine_metrics(), media_type="text/plain; version=0.0.4")
+    except Exception as e:
+        logger.error(f"获取告警引擎指标失败: {e}")
+        return PlainTextResponse(f"# 获取告警引擎指标失败: {str(e)}\n", status_code=500)
+
+@router.get("/alert/engine/slow_rules", response_model=CommonResponse[List[dict]])
+def get_slow_rules(limit: int = 10, stage: str = 'total', order_by: str = 'avg'):
+    """
+    耗时最长的规则
+    stage: 按哪个阶段排序 total/query/evaluate/write/notify/render/send
+    order_by: avg(平均)/max(最大)/last(最近一次)
+    """
+    try:
+        rules = engine_process.get_slow_rules(limit=limit, stage=stage, order_by=order_by)
+        return {"code": 0, "data": rules, "msg": "获取成功"}
+    except Exception as e:
+        logger.error(f"获取耗时最长的规则失败: {e}")
+        return {"code": 1, "data": None, "msg": f"获取失败: {str(e)}"}
@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 from pydantic import BaseModel
 from app.models import SessionLocal, AlertHistory
 from app.models.alert_schemas import CommonResponse
+from app.alert.services import rule_state_service
 from app.utils.logger import logger
 
 router = APIRouter()
@@ -271,11 +272,11 @@ def acknowledge_alert(
         history.acknowledged_at = datetime.now()
         history.acknowledged_by = acknowledged_by
         
-        # 将对应的告警规则状态设置为静默，停止发送
+        # 将对应的告警规则状态设置为静默，停止发送（由告警引擎应用到告警实例）
         from app.models import AlertRule
         rule = db.query(AlertRule).filter(AlertRule.id == history.rule_id).first()
-        if rule and rule.alert_state == 'alerting':
-            rule.alert_state = 'silenced'
+        if rule and rule_state_service.get_rule_alert_state(db, rule.id) == 'alerting':
+            rule_state_service.request_manual_state(db, rule.id, 'silenced')
             logger.info(f"告警规则 {rule.name} 已被手动确认，状态设为静默")
         
         db.commit()
@@ -309,8 +310,9 @@ def acknowledge_rule_alert(
             return {"code": 1, "data": None, "msg": "告警规则不存在"}
         
         # 将规则状态设置为静默
-        if rule.alert_state in ['alerting']:
-            rule.alert_state = 'silenced'
+        alert_state = rule_state_service.get_rule_alert_state(db, rule_id)
+        if alert_state in ['alerting']:
+            rule_state_service.request_manual_state(db, rule_id, 'silenced')
             
             # 更新最近的告警历史记录为已确认
             recent_history = db.query(AlertHistory).filter(
@@ -337,7 +339,7 @@ def acknowledge_rule_alert(
                 "msg": "规则告警确认成功，已停止发送"
             }
         else:
-            return {"code": 1, "data": None, "msg": f"规则当前状态为 {rule.alert_state}，无需确认"}
+            return {"code": 1, "data": None, "msg": f"规则当前状态为 {alert_state}，无需确认"}
         
     except Exception as e:
         logger.error(f"确认规则告警失败: {e}")
@@ -372,8 +374,8 @@ def resolve_alert(
         # 将对应的告警规则状态设置为正常
         from app.models import AlertRule
         rule = db.query(AlertRule).filter(AlertRule.id == history.rule_id).first()
-        if rule and rule.alert_state == 'alerting':
-            rule.alert_state = 'ok'
+        if rule and rule_state_service.get_rule_alert_state(db, rule.id) == 'alerting':
+            rule_state_service.request_manual_state(db, rule.id, 'ok')
             logger.info(f"告警规则 {rule.name} 已被手动解决，状态设为正常")
         
         db.commit()
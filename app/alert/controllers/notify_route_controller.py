@@ -0,0 +1,80 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from typing import List
+from app.models import SessionLocal
+from app.models.alert_schemas import AlertNotifyRouteOut, CommonResponse
+from app.alert.services import notify_route_service
+from app.utils.logger import logger
+
+router = APIRouter()
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+@router.get("/alert/notify_route", response_model=CommonResponse[List[AlertNotifyRouteOut]])
+def list_routes(db: Session = Depends(get_db)):
+    try:
+        routes = notify_route_service.get_routes(db)
+        return {"code": 0, "data": [AlertNotifyRouteOut.model_validate(r) for r in routes], "msg": "查询成功"}
+    except Exception as e:
+        logger.error(f"查询通知路由异常: {e}")
+        return {"code": 1, "data": None, "msg": "查询失败"}
+
+@router.post("/alert/notify_route/match", response_model=CommonResponse[List[dict]])
+def match_routes(labels: dict, db: Session = Depends(get_db)):
+    """
+    预览告警标签命中的路由和通知模板
+    labels: 告警标签（规则标签 + 指标标签，可包含 alertname/level/category）
+    """
+    try:
+        return {"code": 0, "data": notify_route_service.match_routes(db, labels), "msg": "匹配成功"}
+    except Exception as e:
+        logger.error(f"匹配通知路由异常: {e}")
+        return {"code": 1, "data": None, "msg": f"匹配失败: {str(e)}"}
+
+@router.get("/alert/notify_route/{route_id}", response_model=CommonResponse[AlertNotifyRouteOut])
+def get_route(route_id: int, db: Session = Depends(get_db)):
+    try:
+        route = notify_route_service.get_route(db, route_id)
+        if not route:
+            return {"code": 1, "data": None, "msg": "未找到路由"}
+        return {"code": 0, "data": AlertNotifyRouteOut.model_validate(route), "msg": "查询成功"}
+    except Exception as e:
+        logger.error(f"查询通知路由异常: {e}")
+        return {"code": 1, "data": None, "msg": "查询失败"}
+
+@router.post("/alert/notify_route", response_model=CommonResponse[AlertNotifyRouteOut])
+def create_route(data: dict, db: Session = Depends(get_db)):
+    try:
+        route = notify_route_service.create_route(db, data)
+        logger.info(f"创建通知路由成功: {route.id}({route.name})")
+        return {"code": 0, "data": AlertNotifyRouteOut.model_validate(route), "msg": "创建成功"}
+    except Exception as e:
+        logger.error(f"创建通知路由异常: {e}")
+        return {"code": 1, "data": None, "msg": f"创建失败: {str(e)}"}
+
+@router.put("/alert/notify_route/{route_id}", response_model=CommonResponse[AlertNotifyRouteOut])
+def update_route(route_id: int, data: dict, db: Session = Depends(get_db)):
+    try:
+        route = notify_route_service.update_route(db, route_id, data)
+        if not route:
+            return {"code": 1, "data": None, "msg": "未找到路由"}
+        return {"code": 0, "data": AlertNotifyRouteOut.model_validate(route), "msg": "修改成功"}
+    except Exception as e:
+        logger.error(f"修改通知路由异常: {e}")
+        return {"code": 1, "data": None, "msg": f"修改失败: {str(e)}"}
+
+@router.delete("/alert/notify_route/{route_id}", response_model=CommonResponse[dict])
+def delete_route(route_id: int, db: Session = Depends(get_db)):
+    try:
+        ok = notify_route_service.delete_route(db, route_id)
+        if not ok:
+            return {"code": 1, "data": None, "msg": "未找到路由"}
+        return {"code": 0, "data": {"success": True}, "msg": "删除成功"}
+    except Exception as e:
+        logger.error(f"删除通知路由异常: {e}")
+        return {"code": 1, "data": None, "msg": "删除失败"}
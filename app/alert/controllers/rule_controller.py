@@ -4,6 +4,7 @@ from typing import List, Optional
 from app.models import SessionLocal
 from app.models.alert_schemas import AlertRuleOut, CommonResponse
 from app.alert.services import rule_service
+from app.alert.services.backtest_service import backtest_rule
 from app.utils.logger import logger
 
 router = APIRouter()
@@ -127,4 +128,26 @@ def batch_update_category(
         }
     except Exception as e:
         logger.error(f"批量更新分组失败: {e}")
-        return {"code": 1, "data": None, "msg": f"更新失败: {str(e)}"}
\ No newline at end of file
+        return {"code": 1, "data": None, "msg": f"更新失败: {str(e)}"}
+
+@router.post("/alert/rule/backtest", response_model=CommonResponse[dict])
+def backtest(payload: dict, db: Session = Depends(get_db)):
+    """
+    用历史数据回测候选规则，返回会发送的通知数量和时间
+    payload: promql、condition、suppress、repeat、duration、max_send_count、for_duration，
+    可选 rule_id（以已有规则为基础，覆盖提供的字段）、days（回测天数，默认7）、step（评估步长秒数）
+    """
+    try:
+        base_rule = None
+        if payload.get('rule_id'):
+            base_rule = rule_service.get_rule(db, payload['rule_id'])
+            if not base_rule:
+                return {"code": 1, "data": None, "msg": "未找到规则"}
+        result = backtest_rule(payload, days=float(payload.get('days') or 7), step=payload.get('step'),
+                               base_rule=base_rule)
+        return {"code": 0, "data": result, "msg": "回测完成"}
+    except ValueError as e:
+        return {"code": 1, "data": None, "msg": f"参数错误: {str(e)}"}
+    except Exception as e:
+        logger.error(f"规则回测异常: {e}")
+        return {"code": 1, "data": None, "msg": f"回测失败: {str(e)}"}
@@ -0,0 +1,88 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from app.models import SessionLocal, AlertSilence
+from app.models.alert_schemas import AlertSilenceOut, CommonResponse
+from app.alert.services import silence_service
+from app.utils.logger import logger
+
+router = APIRouter()
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def _to_out(silence: AlertSilence) -> AlertSilenceOut:
+    out = AlertSilenceOut.model_validate(silence)
+    out.status = silence_service.silence_status(silence)
+    return out
+
+@router.get("/alert/silence", response_model=CommonResponse[List[AlertSilenceOut]])
+def list_silences(
+    status: Optional[str] = Query(None, description="状态筛选(pending/active/expired)"),
+    db: Session = Depends(get_db)
+):
+    try:
+        silences = silence_service.get_silences(db, status)
+        return {"code": 0, "data": [_to_out(s) for s in silences], "msg": "查询成功"}
+    except Exception as e:
+        logger.error(f"查询告警静默异常: {e}")
+        return {"code": 1, "data": None, "msg": "查询失败"}
+
+@router.get("/alert/silence/{silence_id}", response_model=CommonResponse[AlertSilenceOut])
+def get_silence(silence_id: int, db: Session = Depends(get_db)):
+    try:
+        silence = silence_service.get_silence(db, silence_id)
+        if not silence:
+            return {"code": 1, "data": None, "msg": "未找到静默"}
+        return {"code": 0, "data": _to_out(silence), "msg": "查询成功"}
+    except Exception as e:
+        logger.error(f"查询告警静默异常: {e}")
+        return {"code": 1, "data": None, "msg": "查询失败"}
+
+@router.post("/alert/silence", response_model=CommonResponse[AlertSilenceOut])
+def create_silence(data: dict, db: Session = Depends(get_db)):
+    try:
+        silence = silence_service.create_silence(db, data)
+        logger.info(f"创建告警静默成功: {silence.id}, {silence.matchers}, {silence.starts_at} ~ {silence.ends_at}")
+        return {"code": 0, "data": _to_out(silence), "msg": "创建成功"}
+    except Exception as e:
+        logger.error(f"创建告警静默异常: {e}")
+        return {"code": 1, "data": None, "msg": f"创建失败: {str(e)}"}
+
+@router.put("/alert/silence/{silence_id}", response_model=CommonResponse[AlertSilenceOut])
+def update_silence(silence_id: int, data: dict, db: Session = Depends(get_db)):
+    try:
+        silence = silence_service.update_silence(db, silence_id, data)
+        if not silence:
+            return {"code": 1, "data": None, "msg": "未找到静默"}
+        return {"code": 0, "data": _to_out(silence), "msg": "修改成功"}
+    except Exception as e:
+        logger.error(f"修改告警静默异常: {e}")
+        return {"code": 1, "data": None, "msg": f"修改失败: {str(e)}"}
+
+@router.post("/alert/silence/{silence_id}/expire", response_model=CommonResponse[AlertSilenceOut])
+def expire_silence(silence_id: int, db: Session = Depends(get_db)):
+    """提前结束静默"""
+    try:
+        silence = silence_service.expire_silence(db, silence_id)
+        if not silence:
+            return {"code": 1, "data": None, "msg": "未找到静默"}
+        return {"code": 0, "data": _to_out(silence), "msg": "静默已结束"}
+    except Exception as e:
+        logger.error(f"结束告警静默异常: {e}")
+        return {"code": 1, "data": None, "msg": "操作失败"}
+
+@router.delete("/alert/silence/{silence_id}", response_model=CommonResponse[dict])
+def delete_silence(silence_id: int, db: Session = Depends(get_db)):
+    try:
+        ok = silence_service.delete_silence(db, silence_id)
+        if not ok:
+            return {"code": 1, "data": None, "msg": "未找到静默"}
+        return {"code": 0, "data": {"success": True}, "msg": "删除成功"}
+    except Exception as e:
+        logger.error(f"删除告警静默异常: {e}")
+        return {"code": 1, "data": None, "msg": "删除失败"}
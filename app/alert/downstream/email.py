@@ -64,7 +64,8 @@ def send_email_msg(params: dict) -> dict:
         "ssl": true,
         "subject": "告警通知",
         "content": "告警内容HTML",
-        "attachments": ["/path/to/file.png"]  # 可选附件
+        "attachments": ["/path/to/file.png"],  # 可选附件
+        "timeout": 10  # 可选，SMTP连接和读写超时(秒)
     }
     """
     try:
@@ -108,10 +109,12 @@ def send_email_msg(params: dict) -> dict:
         
         # 连接SMTP服务器
         smtp_port = int(params['smtp_port'])
+        # 连接和读写超时，避免SMTP服务器无响应时发送线程一直阻塞
+        smtp_timeout = params.get('timeout', 10)
         if params.get('ssl', False):
-            server = smtplib.SMTP_SSL(params['smtp_host'], smtp_port)
+            server = smtplib.SMTP_SSL(params['smtp_host'], smtp_port, timeout=smtp_timeout)
         else:
-            server = smtplib.SMTP(params['smtp_host'], smtp_port)
+            server = smtplib.SMTP(params['smtp_host'], smtp_port, timeout=smtp_timeout)
             if params.get('starttls', False):
                 server.starttls()
         
@@ -126,13 +129,45 @@ def send_email_msg(params: dict) -> dict:
         server.sendmail(params['from'], all_recipients, msg.as_string())
         server.quit()
         
-        logger.info(f"邮件发送成功: {params['subject']} -> {all_recipients}")
+        logger.debug("邮件发送成功: %s -> %s", params['subject'], all_recipients)
         return {"success": True, "msg": "邮件发送成功"}
         
     except Exception as e:
         logger.error(f"邮件发送失败: {e}")
         return {"success": False, "msg": str(e)}
 
+def render_alert_list(alerts: List[dict]) -> str:
+    """渲染分组通知中的告警列表（规则、等级、当前值、触发时间、标签）"""
+    rows = ""
+    for alert in alerts:
+        labels = alert.get('labels') or {}
+        label_text = ', '.join(f"{key}={value}" for key, value in labels.items() if not str(key).startswith('__'))
+        level = alert.get('level') or ''
+        rows += f"""
+        <tr>
+            <td style="padding: 8px; border-bottom: 1px solid #e2e8f0;">{alert.get('rule_name', '')}</td>
+            <td style="padding: 8px; border-bottom: 1px solid #e2e8f0;"><span class="status-badge status-{level.lower()}">{get_level_display(level)}</span></td>
+            <td style="padding: 8px; border-bottom: 1px solid #e2e8f0;">{alert.get('current_value', '')}</td>
+            <td style="padding: 8px; border-bottom: 1px solid #e2e8f0;">{alert.get('trigger_time', '')}</td>
+            <td style="padding: 8px; border-bottom: 1px solid #e2e8f0; word-break: break-word;">{label_text}</td>
+        </tr>
+        """
+    return f"""
+    <div class="details-section">
+        <h3>🏷️ 告警列表（{len(alerts)}条）</h3>
+        <table style="width: 100%; border-collapse: collapse; font-size: 13px; color: #2d3748;">
+            <tr style="background: #f8f9fa; text-align: left;">
+                <th style="padding: 8px;">{get_param_label('rule_name')}</th>
+                <th style="padding: 8px;">{get_param_label('level')}</th>
+                <th style="padding: 8px;">{get_param_label('current_value')}</th>
+                <th style="padding: 8px;">{get_param_label('trigger_time')}</th>
+                <th style="padding: 8px;">标签</th>
+            </tr>
+            {rows}
+        </table>
+    </div>
+    """
+
 def render_email_template(template_data: dict, alert_context: dict) -> tuple:
     """
     渲染邮件模板 - 统一美观的HTML模板
@@ -141,9 +176,8 @@ def render_email_template(template_data: dict, alert_context: dict) -> tuple:
     返回: (subject, content)
     """
     try:
-        logger.info(f"开始渲染邮件模板")
-        logger.info(f"模板数据: {template_data}")
-        logger.info(f"告警上下文: {alert_context}")
+        # 模板数据含SMTP密码，不输出到日志
+        logger.debug("开始渲染邮件模板: 规则=%s", alert_context.get('rule_name'))
         
         # 获取要显示的参数列表
         email_params = template_data.get('email_params', [])
@@ -376,8 +410,7 @@ def render_email_template(template_data: dict, alert_context: dict) -> tuple:
         # 使用自定义主题模板或默认模板
         subject_template = template_data.get('subject_template', default_subject)
         
-        logger.info(f"主题模板: {subject_template}")
-        logger.info(f"要显示的参数: {email_params}")
+        logger.debug("主题模板: %s, 要显示的参数: %s", subject_template, email_params)
         
         # 生成概览项
         summary_items = ""
@@ -458,6 +491,10 @@ def render_email_template(template_data: dict, alert_context: dict) -> tuple:
             </div>
             """
         
+        # 分组合并的通知：标签区改为逐条列出组内告警
+        if alert_context.get('alerts'):
+            labels_section = render_alert_list(alert_context['alerts'])
+        
         # 格式化模板
         subject = subject_template.format(**alert_context)
         # 移除故障排查建议
@@ -476,8 +513,7 @@ def render_email_template(template_data: dict, alert_context: dict) -> tuple:
             level_display = get_level_display(alert_context['level'])
             subject = subject.replace('{level_display}', level_display)
         
-        logger.info(f"渲染后的主题: {subject}")
-        logger.info(f"渲染后的内容: {content}")
+        logger.debug("渲染后的主题: %s, 内容 %s 字符", subject, len(content))
         return subject, content
         
     except Exception as e:
@@ -35,7 +35,7 @@ def send_http_msg(params: dict) -> dict:
             if 'Content-Type' not in headers:
                 headers['Content-Type'] = 'application/json'
         
-        logger.info(f"发送HTTP告警: {method} {url}")
+        logger.debug("发送HTTP告警: %s %s", method, url)
         
         # 发送请求
         resp = requests.request(
@@ -47,7 +47,7 @@ def send_http_msg(params: dict) -> dict:
             verify=verify_ssl
         )
         
-        logger.info(f"HTTP告警响应: {resp.status_code} - {resp.text[:200]}")
+        logger.debug("HTTP告警响应: %s - %.200s", resp.status_code, resp.text)
         
         return {
             "success": resp.ok,
@@ -128,8 +128,8 @@ def _send_group_message(params: dict) -> dict:
             if optional_field in params:
                 data[optional_field] = params[optional_field]
         
-        logger.info(f"发送乐聊群组告警: POST {params['url']}")
-        logger.debug(f"请求数据: {data}")
+        logger.debug("发送乐聊群组告警: POST %s", params['url'])
+        logger.debug("请求数据: %s", data)
         
         # 发送请求
         headers = {'Content-Type': 'application/x-www-form-urlencoded'}
@@ -0,0 +1,80 @@
+"""
+告警引擎补评估（catch-up）
+引擎每轮评估后把评估时间写入 alert_engine_checkpoint 表。重启后按停机时长确定补评估窗口：
+- 窗口为 [上次成功评估时间, 本次启动时间)，最长不超过 alert_engine_catchup_max_window
+- 每条规则只发送一次 query_range 请求，取回窗口内按评估间隔对齐的样本
+- 整个结果矩阵一次性检查告警条件，再按时间顺序回放状态机（由告警引擎执行）
+多实例部署时检查点是集群级的：所有实例写同一条记录，只前进不后退，记录的是任一实例最近一次完成评估的时间。
+有实例存活时，下线实例的规则由存活实例接管，重启的实例加入集群后规则需要交接，不必补评估；
+只有整个集群都停机时才需要补评估，此时最后停止的实例的检查点就是全部规则的起点。
+检查点最多每 CHECKPOINT_SAVE_TICKS 个时间片写一次，补评估窗口因此最多多回放这么长时间。
+"""
+
+import math
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models import AlertEngineCheckpoint
+from app.config import get_settings
+
+# 检查点名称（集群共用）
+ENGINE_CHECKPOINT = 'alert_engine'
+
+# 检查点最多每隔多少个调度时间片保存一次（补评估只需要时间片级别的精度）
+CHECKPOINT_SAVE_TICKS = 6
+
+# Prometheus 单次 query_range 每条序列最多返回的点数
+MAX_RANGE_POINTS = 11000
+
+
+def load_last_tick(db: Session, name: str = ENGINE_CHECKPOINT) -> Optional[datetime]:
+    """读取最近一次成功评估的时间，没有记录时返回None"""
+    row = db.query(AlertEngineCheckpoint).filter(AlertEngineCheckpoint.name == name).first()
+    return row.last_tick_at if row else None
+
+
+def save_last_tick(db: Session, tick_time: datetime, name: str = ENGINE_CHECKPOINT) -> datetime:
+    """
+    记录最近一次成功评估的时间，只前进不后退（其他实例可能已写入更晚的时间），调用方负责提交事务
+    返回保存后的检查点时间；已有更晚的记录时不加锁直接返回
+    """
+    stored = load_last_tick(db, name)
+    if stored is not None and stored >= tick_time:
+        return stored
+    row = db.query(AlertEngineCheckpoint).filter(AlertEngineCheckpoint.name == name).with_for_update().first()
+    if row is None:
+        db.add(AlertEngineCheckpoint(name=name, last_tick_at=tick_time))
+    elif row.last_tick_at is None or tick_time > row.last_tick_at:
+        row.last_tick_at = tick_time
+    else:
+        return row.last_tick_at
+    return tick_time
+
+
+def catchup_window(last_tick: Optional[datetime], now: datetime) -> Optional[Tuple[datetime, datetime]]:
+    """
+    计算需要补评估的时间窗口 (开始, 结束)
+    没有检查点、未启用补评估或停机时间不足一个调度时间片时返回None
+    """
+    settings = get_settings()
+    max_window = settings.alert_engine_catchup_max_window
+    if last_tick is None or max_window <= 0:
+        return None
+    if now - last_tick <= timedelta(seconds=max(settings.alert_engine_resolution, 1)):
+        return None
+    return max(last_tick, now - timedelta(seconds=max_window)), now
+
+
+def range_step(start: datetime, end: datetime, interval: int) -> int:
+    """补评估的采样步长：规则评估间隔，窗口过长时放大步长以满足 query_range 的点数限制"""
+    seconds = (end - start).total_seconds()
+    return max(interval, math.ceil(seconds / MAX_RANGE_POINTS), 1)
+
+
+def step_times(start: datetime, end: datetime, step: int) -> List[float]:
+    """窗口内（不含开始和结束时间）按步长对齐的评估时间戳"""
+    begin, finish = start.timestamp(), end.timestamp()
+    first = (math.floor(begin / step) + 1) * step
+    return [float(t) for t in range(int(first), math.ceil(finish), step) if t < finish]
@@ -0,0 +1,252 @@
+"""
+告警引擎多实例协同
+多个进程（uvicorn多worker或多副本）同时运行告警引擎时，通过 alert_engine_instance 表的心跳租约协同：
+- 每个实例每个时间片更新一次心跳，超过 alert_engine_instance_lease 未更新心跳的实例视为下线
+- 规则按一致性哈希分配给存活实例（每个实例多个虚拟节点），实例加入或下线时只迁移少量规则
+- 有依赖关系的规则按依赖链的根规则分配，父子规则总在同一实例评估（抑制依赖内存中的父规则状态）
+- 规则从仍存活的实例迁入时等待交接时间（两个时间片），原实例看到新的实例列表后停止评估，
+  本实例再从状态表重新加载规则状态；原实例已下线时立即接管
+- 存活实例中启动最早的为主实例，负责清理过期的实例记录和发件箱记录
+- 心跳失败超过租约时暂停评估，避免与已接管规则的实例重复发送通知
+没有使用 MySQL GET_LOCK：锁绑定在数据库连接上，与连接池配合不可靠，也无法表达规则分片。
+"""
+
+import bisect
+import hashlib
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models import AlertEngineInstance
+from app.config import get_settings
+from app.utils.logger import logger
+
+# 每个实例在哈希环上的虚拟节点数
+HASH_VNODES = 64
+
+# 实例记录超过租约的倍数后由主实例删除
+PRUNE_LEASES = 10
+
+
+def _hash(value: str) -> int:
+    return int(hashlib.md5(value.encode('utf-8')).hexdigest()[:8], 16)
+
+
+class HashRing:
+    """一致性哈希环（构建后只读）"""
+
+    def __init__(self, members: Iterable[str], vnodes: int = HASH_VNODES):
+        self.members = frozenset(members)
+        points = sorted((_hash(f"{member}#{i}"), member) for member in self.members for i in range(vnodes))
+        self._keys = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, key) -> Optional[str]:
+        """负责key的实例，环为空时返回None"""
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(str(key))) % len(self._keys)
+        return self._owners[index]
+
+
+def shard_key(rule_id: int, parents: Dict[int, Optional[int]]) -> int:
+    """规则的分片键：沿父规则链找到的根规则ID（父规则未启用时以自身为根）"""
+    seen = {rule_id}
+    current = rule_id
+    parent_id = parents.get(current)
+    while parent_id and parent_id in parents and parent_id not in seen:
+        seen.add(parent_id)
+        current = parent_id
+        parent_id = parents.get(current)
+    return current
+
+
+class EngineCluster:
+    """本实例的心跳和规则分片，线程安全"""
+
+    def __init__(self):
+        self.instance_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._lock = threading.Lock()
+        self._started_at = datetime.now()
+        self._ring: Optional[HashRing] = None
+        self._members: List[str] = []
+        self._leader = False
+        self._last_heartbeat: Optional[float] = None
+        # 正在评估的规则、等待交接的规则 -> 可以开始评估的时间、上一轮分配时的全部规则
+        self._active: Set[int] = set()
+        self._pending: Dict[int, float] = {}
+        self._known: Set[int] = set()
+        self._stats = {"heartbeats": 0, "heartbeat_failures": 0, "membership_changes": 0,
+                       "acquired_rules": 0, "released_rules": 0}
+
+    def assign(self, db: Session, rules: List) -> Tuple[List, List[int], List[int]]:
+        """
+        更新心跳并计算本实例负责的规则，返回 (本轮可以评估的规则, 需要从状态表重新加载的规则ID, 不再负责的规则ID)
+        未开启多实例协同时负责全部规则
+        """
+        settings = get_settings()
+        if not settings.alert_engine_cluster_enabled:
+            return rules, [], []
+        with self._lock:
+            previous = self._ring
+            owned_count = len(self._active)
+        ring = self._heartbeat(db, owned_count)
+        if ring is None:
+            if self._last_heartbeat is None:
+                # 从未成功心跳（如实例表不存在），按单实例评估全部规则
+                return rules, [], []
+            logger.error("告警引擎实例心跳超过租约未成功，暂停评估等待恢复")
+            ring = HashRing([])
+
+        parents = {rule.id: rule.parent_rule_id for rule in rules}
+        with self._lock:
+            known = self._known
+        if previous is None and len(ring.members) > 1:
+            # 加入已有的集群，分到的规则都要从其他实例交接
+            previous = HashRing(ring.members - {self.instance_id})
+            known = set(parents)
+        now = time.monotonic()
+        handover = 2 * max(settings.alert_engine_resolution, 1)
+        owned, reload = [], []
+        with self._lock:
+            active, pending = set(), {}
+            for rule in rules:
+                key = shard_key(rule.id, parents)
+                if ring.owner(key) != self.instance_id:
+                    continue
+                if rule.id in self._active or previous is None:
+                    # 首次分配的规则状态由实例存储启动时统一恢复
+                    active.add(rule.id)
+                    owned.append(rule)
+                    continue
+                ready_at = self._pending.get(rule.id)
+                if ready_at is None:
+                    previous_owner = previous.owner(key) if rule.id in known else self.instance_id
+                    # 原实例仍存活，或本实例刚从心跳中断中恢复（其他实例可能已接管）时等待交接
+                    handing_over = previous_owner != self.instance_id and (
+                        previous_owner is None or previous_owner in ring.members
+                    )
+                    ready_at = now + handover if handing_over else now
+                    self._stats["acquired_rules"] += 1
+                if ready_at <= now:
+                    active.add(rule.id)
+                    owned.append(rule)
+                    reload.append(rule.id)
+                else:
+                    pending[rule.id] = ready_at
+            released = [rule_id for rule_id in self._active if rule_id not in active]
+            self._stats["released_rules"] += len(released)
+            self._active, self._pending = active, pending
+            self._known = set(parents)
+        if reload or released:
+            logger.info(f"告警引擎规则分片变化: 接管 {len(reload)} 条, 移交 {len(released)} 条, "
+                        f"等待交接 {len(pending)} 条, 本实例负责 {len(owned)} 条")
+        return owned, reload, released
+
+    def _heartbeat(self, db: Session, owned_count: int) -> Optional[HashRing]:
+        """更新本实例心跳并读取存活实例，失败时返回上一次的哈希环（超过租约后返回None）"""
+        lease = max(get_settings().alert_engine_instance_lease, 1)
+        now = datetime.now()
+        try:
+            row = db.query(AlertEngineInstance).filter(AlertEngineInstance.instance_id == self.instance_id).first()
+            if row is None:
+                row = AlertEngineInstance(instance_id=self.instance_id, hostname=socket.gethostname(),
+                                          pid=os.getpid(), started_at=self._started_at)
+                db.add(row)
+            row.heartbeat_at = now
+            row.owned_rules = owned_count
+            db.commit()
+            members = [
+                instance_id for instance_id, in db.query(AlertEngineInstance.instance_id).filter(
+                    AlertEngineInstance.heartbeat_at >= now - timedelta(seconds=lease)
+                ).order_by(AlertEngineInstance.started_at, AlertEngineInstance.instance_id).all()
+            ]
+        except Exception as e:
+            db.rollback()
+            logger.error(f"告警引擎实例心跳失败: {e}")
+            with self._lock:
+                self._stats["heartbeat_failures"] += 1
+                if self._last_heartbeat is not None and time.monotonic() - self._last_heartbeat <= lease:
+                    return self._ring
+            return None
+
+        if self.instance_id not in members:
+            members.append(self.instance_id)
+        with self._lock:
+            self._last_heartbeat = time.monotonic()
+            self._stats["heartbeats"] += 1
+            if self._ring is None or self._ring.members != frozenset(members):
+                logger.info(f"告警引擎存活实例: {members}")
+                self._stats["membership_changes"] += 1
+                self._ring = HashRing(members)
+            self._members = members
+            self._leader = members[0] == self.instance_id
+            leader, ring = self._leader, self._ring
+        if leader:
+            self._prune(db, now - timedelta(seconds=lease * PRUNE_LEASES))
+        return ring
+
+    def _prune(self, db: Session, before: datetime):
+        """删除长时间没有心跳的实例记录"""
+        try:
+            deleted = db.query(AlertEngineInstance).filter(
+                AlertEngineInstance.heartbeat_at < before
+            ).delete(synchronize_session=False)
+            db.commit()
+            if deleted:
+                logger.info(f"清理下线的告警引擎实例记录 {deleted} 条")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"清理告警引擎实例记录失败: {e}")
+
+    def leave(self, db: Session):
+        """引擎停止时删除本实例记录，其他实例下一次心跳即接管规则，不必等租约过期"""
+        if get_settings().alert_engine_cluster_enabled:
+            try:
+                db.query(AlertEngineInstance).filter(
+                    AlertEngineInstance.instance_id == self.instance_id
+                ).delete(synchronize_session=False)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"删除告警引擎实例记录失败: {e}")
+        self.reset()
+
+    def is_leader(self) -> bool:
+        """是否为主实例（未开启多实例协同时总是主实例）"""
+        if not get_settings().alert_engine_cluster_enabled:
+            return True
+        with self._lock:
+            return self._leader
+
+    def reset(self):
+        with self._lock:
+            self._ring = None
+            self._members = []
+            self._leader = False
+            self._last_heartbeat = None
+            self._active = set()
+            self._pending = {}
+            self._known = set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": get_settings().alert_engine_cluster_enabled,
+                "instance_id": self.instance_id,
+                "leader": self._leader,
+                "members": list(self._members),
+                "owned_rules": len(self._active),
+                "pending_handover": len(self._pending),
+                **self._stats
+            }
+
+
+# 全局引擎实例
+engine_cluster = EngineCluster()
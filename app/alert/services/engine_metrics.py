@@ -0,0 +1,262 @@
+"""
+告警引擎指标
+记录每条规则各阶段的耗时和每个时间片的耗时分布，以 Prometheus 文本格式导出（GET /api/alert/engine/metrics），
+可以让 Prometheus 直接抓取 BigDataOps 自身；另提供按耗时排序的最慢规则（GET /api/alert/engine/slow_rules）。
+规则阶段：
+- query: Prometheus查询耗时（与其他规则共享查询结果时为等待结果的时间）
+- evaluate: 条件检查和各序列的状态机
+- write: 状态变更写库（提供写缓冲时只是登记，批量写库的耗时记在时间片的 flush 阶段）
+- notify: 生成告警历史和发件箱记录
+- render / send: 发件箱发送时渲染通知模板、调用下游的耗时（合并通知计入组内每条规则）
+- total: 规则一次评估的总耗时
+时间片阶段：refresh（同步规则、路由、静默、模板）、plan、evaluate、flush、total
+"""
+
+import bisect
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 规则阶段耗时直方图的分桶(秒)
+RULE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# 时间片阶段耗时直方图的分桶(秒)
+TICK_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32)
+
+RULE_STAGES = ('query', 'evaluate', 'write', 'notify', 'render', 'send', 'total')
+
+
+class Histogram:
+    """固定分桶的直方图，调用方负责加锁"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, 累计次数) 列表，最后一项为 +Inf"""
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((_format(bound), total))
+        result.append(('+Inf', self.count))
+        return result
+
+
+class StageTiming:
+    """单条规则一个阶段的耗时统计"""
+
+    __slots__ = ('count', 'sum', 'max', 'last')
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        self.last = seconds
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_seconds": round(self.sum / self.count, 6) if self.count else 0,
+            "max_seconds": round(self.max, 6),
+            "last_seconds": round(self.last, 6),
+        }
+
+
+class RuleTiming:
+    """单条规则的耗时统计"""
+
+    __slots__ = ('rule_id', 'rule_name', 'series', 'stages')
+
+    def __init__(self, rule_id: int, rule_name: str):
+        self.rule_id = rule_id
+        self.rule_name = rule_name
+        self.series = 0
+        self.stages: Dict[str, StageTiming] = {}
+
+
+class EngineMetrics:
+    """告警引擎耗时指标，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rules: Dict[int, RuleTiming] = {}
+        self._rule_stages = {stage: Histogram(RULE_BUCKETS) for stage in RULE_STAGES}
+        self._tick_stages: Dict[str, Histogram] = {}
+        self._ticks = 0
+
+    def observe_rule(self, rule_id: int, rule_name: str, stage: str, seconds: float):
+        """记录规则一个阶段的耗时"""
+        with self._lock:
+            timing = self._rule(rule_id, rule_name)
+            stage_timing = timing.stages.get(stage)
+            if stage_timing is None:
+                stage_timing = timing.stages[stage] = StageTiming()
+            stage_timing.observe(seconds)
+            histogram = self._rule_stages.get(stage)
+            if histogram is None:
+                histogram = self._rule_stages[stage] = Histogram(RULE_BUCKETS)
+            histogram.observe(seconds)
+
+    def observe_series(self, rule_id: int, rule_name: str, count: int):
+        """记录规则最近一次查询返回的序列数"""
+        with self._lock:
+            self._rule(rule_id, rule_name).series = count
+
+    def observe_notification(self, rule_ids: Iterable[Optional[int]], render_seconds: float, send_seconds: float):
+        """记录一次通知发送的渲染和下游调用耗时，合并通知计入组内每条规则（只记录已有统计的规则）"""
+        for rule_id in set(rule_ids):
+            with self._lock:
+                timing = self._rules.get(rule_id)
+            if timing is None:
+                continue
+            self.observe_rule(rule_id, timing.rule_name, 'render', render_seconds)
+            self.observe_rule(rule_id, timing.rule_name, 'send', send_seconds)
+
+    def observe_tick(self, stages: Dict[str, float]):
+        """记录一个时间片各阶段的耗时"""
+        with self._lock:
+            self._ticks += 1
+            for stage, seconds in stages.items():
+                histogram = self._tick_stages.get(stage)
+                if histogram is None:
+                    histogram = self._tick_stages[stage] = Histogram(TICK_BUCKETS)
+                histogram.observe(seconds)
+
+    def tick_stats(self) -> Dict[str, dict]:
+        """各时间片阶段的次数和平均耗时"""
+        with self._lock:
+            return {
+                stage: {"count": histogram.count,
+                        "avg_seconds": round(histogram.sum / histogram.count, 6) if histogram.count else 0}
+                for stage, histogram in self._tick_stages.items()
+            }
+
+    def retain(self, rule_ids: Iterable[int]):
+        """只保留本实例负责的规则，规则删除、禁用或迁移到其他引擎实例后不再导出其指标"""
+        rule_ids = set(rule_ids)
+        with self._lock:
+            for rule_id in [rule_id for rule_id in self._rules if rule_id not in rule_ids]:
+                del self._rules[rule_id]
+
+    def slowest(self, limit: int = 10, stage: str = 'total', order_by: str = 'avg') -> List[dict]:
+        """按某阶段的平均/最大/最近耗时排序的最慢规则"""
+        key = {'avg': lambda t: t.sum / t.count if t.count else 0, 'max': lambda t: t.max,
+               'last': lambda t: t.last}.get(order_by)
+        if key is None:
+            raise ValueError(f"不支持的排序方式: {order_by}，可选 avg/max/last")
+        with self._lock:
+            ranked = sorted(
+                (timing for timing in self._rules.values() if stage in timing.stages),
+                key=lambda timing: key(timing.stages[stage]), reverse=True
+            )[:max(limit, 0)]
+            return [
+                {
+                    "rule_id": timing.rule_id,
+                    "rule_name": timing.rule_name,
+                    "series": timing.series,
+                    "stages": {name: stage_timing.to_dict() for name, stage_timing in timing.stages.items()},
+                }
+                for timing in ranked
+            ]
+
+    def exposition(self) -> List[str]:
+        """Prometheus 文本格式的指标行"""
+        lines = []
+        with self._lock:
+            lines += _histogram_lines('alert_engine_tick_stage_seconds', '告警引擎每个时间片各阶段耗时',
+                                      self._tick_stages)
+            lines += _histogram_lines('alert_engine_rule_stage_seconds', '告警规则各阶段耗时（全部规则）',
+                                      {s: h for s, h in self._rule_stages.items() if h.count})
+            lines += [
+                '# HELP alert_rule_stage_seconds_total 单条规则各阶段累计耗时',
+                '# TYPE alert_rule_stage_seconds_total counter',
+            ]
+            for timing in self._rules.values():
+                for stage, stage_timing in timing.stages.items():
+                    lines.append(f"alert_rule_stage_seconds_total{{{_rule_labels(timing)},stage=\"{stage}\"}} "
+                                 f"{_format(stage_timing.sum)}")
+            lines += [
+                '# HELP alert_rule_stage_runs_total 单条规则各阶段执行次数',
+                '# TYPE alert_rule_stage_runs_total counter',
+            ]
+            for timing in self._rules.values():
+                for stage, stage_timing in timing.stages.items():
+                    lines.append(f"alert_rule_stage_runs_total{{{_rule_labels(timing)},stage=\"{stage}\"}} "
+                                 f"{stage_timing.count}")
+            lines += [
+                '# HELP alert_rule_series 规则最近一次查询返回的序列数',
+                '# TYPE alert_rule_series gauge',
+            ]
+            for timing in self._rules.values():
+                lines.append(f"alert_rule_series{{{_rule_labels(timing)}}} {timing.series}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._rules.clear()
+            self._rule_stages = {stage: Histogram(RULE_BUCKETS) for stage in RULE_STAGES}
+            self._tick_stages.clear()
+            self._ticks = 0
+
+    def _rule(self, rule_id: int, rule_name: str) -> RuleTiming:
+        """调用方持有锁"""
+        timing = self._rules.get(rule_id)
+        if timing is None:
+            timing = self._rules[rule_id] = RuleTiming(rule_id, rule_name)
+        timing.rule_name = rule_name
+        return timing
+
+
+def counter_lines(name: str, help_text: str, values: Dict[str, float], label: str) -> List[str]:
+    """一组按标签区分的计数器的指标行"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+    for key, value in values.items():
+        lines.append(f"{name}{{{label}=\"{_escape(key)}\"}} {_format(value)}")
+    return lines
+
+
+def _histogram_lines(name: str, help_text: str, histograms: Dict[str, Histogram]) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for stage, histogram in histograms.items():
+        for bound, count in histogram.cumulative():
+            lines.append(f"{name}_bucket{{stage=\"{stage}\",le=\"{bound}\"}} {count}")
+        lines.append(f"{name}_sum{{stage=\"{stage}\"}} {_format(histogram.sum)}")
+        lines.append(f"{name}_count{{stage=\"{stage}\"}} {histogram.count}")
+    return lines
+
+
+def _rule_labels(timing: RuleTiming) -> str:
+    return f"rule_id=\"{timing.rule_id}\",rule=\"{_escape(timing.rule_name)}\""
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format(value: float) -> str:
+    value = float(value)
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+# 全局引擎指标
+engine_metrics = EngineMetrics()
@@ -0,0 +1,297 @@
+"""
+告警引擎独立进程
+开启 alert_engine_process 后，告警引擎（规则评估、通知渲染和发送）运行在 API 进程派生的子进程中，
+不与 FastAPI 的请求处理争用 GIL，引擎繁忙时接口响应时间不受影响：
+- API 进程的 lifespan 启动和停止子进程，监控线程在子进程异常退出时自动重启（间隔逐次加倍，上限60秒）
+- 启动/停止/状态/手动执行/指标查询通过 Pipe 发送命令给子进程执行，命令带序号，超时后迟到的回复会被丢弃
+- 规则、模板、路由和静默的修改由引擎按数据库版本同步，不依赖API进程内的缓存失效
+未开启时引擎仍运行在 API 进程的调度线程中，本模块的接口直接调用引擎函数。
+"""
+
+import itertools
+import multiprocessing
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from app.alert.services.engine_service import (
+    alert_engine_job, get_alert_engine_metrics, get_alert_engine_status, get_slow_rules as get_engine_slow_rules,
+    start_alert_engine, stop_alert_engine
+)
+from app.config import get_settings
+from app.utils.logger import logger
+
+# 子进程异常退出后的最长重启间隔(秒)
+MAX_RESTART_DELAY = 60
+
+# 子进程稳定运行超过该时间(秒)后重启间隔恢复为1秒
+STABLE_SECONDS = 60
+
+# 命令超时时间(秒)，手动执行一轮评估需要更长时间
+COMMAND_TIMEOUT = 30
+RUN_ONCE_TIMEOUT = 300
+
+
+def _engine_main(conn, autostart: bool):
+    """子进程入口：启动告警引擎，然后逐条处理API进程发来的命令"""
+    handlers = {
+        'start': start_alert_engine,
+        'stop': stop_alert_engine,
+        'status': get_alert_engine_status,
+        'run_once': lambda: alert_engine_job(evaluate_all=True),
+        'metrics': get_alert_engine_metrics,
+        'slow_rules': get_engine_slow_rules,
+    }
+    if autostart:
+        start_alert_engine()
+    logger.info("告警引擎进程已就绪")
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            # API进程已退出
+            break
+        command = request.get('cmd')
+        if command == 'exit':
+            break
+        try:
+            reply = {'id': request.get('id'), 'ok': True, 'data': handlers[command](**request.get('args', {}))}
+        except Exception as e:
+            reply = {'id': request.get('id'), 'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        try:
+            conn.send(reply)
+        except (EOFError, OSError):
+            break
+    stop_alert_engine()
+    logger.info("告警引擎进程已退出")
+
+
+class EngineProcess:
+    """告警引擎子进程的启动、监控和命令调用（在API进程中使用），线程安全"""
+
+    def __init__(self):
+        # _lock 只保护子进程和统计等状态；_pipe_lock 串行化管道上的命令收发，
+        # 长时间执行的命令（如 run_once）不会阻塞状态查询和子进程监控
+        self._lock = threading.Lock()
+        self._pipe_lock = threading.Lock()
+        self._process: Optional[multiprocessing.Process] = None
+        self._conn = None
+        self._ids = itertools.count(1)
+        self._stopping = threading.Event()
+        self._supervisor: Optional[threading.Thread] = None
+        # 引擎是否应处于运行状态，子进程重启后据此决定是否自动启动引擎
+        self._engine_wanted = False
+        self._spawned_at: Optional[float] = None
+        self._stats = {"restarts": 0, "command_timeouts": 0, "started_at": None}
+
+    def start(self):
+        """启动子进程（已在运行时启动其中的告警引擎）"""
+        with self._lock:
+            self._engine_wanted = True
+            running = self._alive()
+            if not running:
+                self._spawn()
+        if running:
+            self.call('start')
+        self._ensure_supervisor()
+
+    def stop(self):
+        """停止子进程中的告警引擎，子进程保留以便再次启动"""
+        with self._lock:
+            self._engine_wanted = False
+            running = self._alive()
+        if running:
+            self.call('stop')
+
+    def shutdown(self, timeout: float = 30):
+        """停止子进程：先让引擎优雅停止，超时后强制结束"""
+        self._stopping.set()
+        with self._lock:
+            process, conn = self._process, self._conn
+            self._process, self._conn = None, None
+        if process is None:
+            return
+        # 仍有命令在执行时不等待，超时后强制结束
+        if self._pipe_lock.acquire(timeout=timeout):
+            try:
+                conn.send({'cmd': 'exit'})
+            except (EOFError, OSError):
+                pass
+            finally:
+                self._pipe_lock.release()
+            process.join(timeout)
+        if process.is_alive():
+            logger.warning("告警引擎进程未在超时时间内退出，强制结束")
+            process.terminate()
+            process.join(5)
+        conn.close()
+
+    def call(self, command: str, timeout: float = COMMAND_TIMEOUT, **args):
+        """向子进程发送命令并等待结果，args 作为命令的参数"""
+        with self._lock:
+            if not self._alive():
+                raise RuntimeError("告警引擎进程未运行")
+            conn = self._conn
+            request_id = next(self._ids)
+        deadline = time.monotonic() + timeout
+        if not self._pipe_lock.acquire(timeout=timeout):
+            self._count_timeout()
+            raise TimeoutError(f"告警引擎进程执行 {command} 超时（等待其他命令完成）")
+        try:
+            try:
+                conn.send({'id': request_id, 'cmd': command, 'args': args})
+            except (EOFError, OSError):
+                raise RuntimeError(f"告警引擎进程在执行 {command} 时退出")
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    ready = remaining > 0 and conn.poll(remaining)
+                    if ready:
+                        reply = conn.recv()
+                except (EOFError, OSError):
+                    # 子进程退出，或等待期间子进程被重启、旧管道已关闭
+                    raise RuntimeError(f"告警引擎进程在执行 {command} 时退出")
+                if not ready:
+                    self._count_timeout()
+                    raise TimeoutError(f"告警引擎进程执行 {command} 超时")
+                # 之前超时命令的迟到回复
+                if reply.get('id') == request_id:
+                    break
+        finally:
+            self._pipe_lock.release()
+        if not reply['ok']:
+            raise RuntimeError(reply['error'])
+        return reply['data']
+
+    def _count_timeout(self):
+        with self._lock:
+            self._stats["command_timeouts"] += 1
+
+    def _alive(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def _spawn(self):
+        """派生子进程，调用方持有锁"""
+        if self._conn is not None:
+            self._conn.close()
+        context = multiprocessing.get_context('spawn')
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(target=_engine_main, args=(child_conn, self._engine_wanted),
+                                  name="alert-engine", daemon=True)
+        process.start()
+        child_conn.close()
+        self._process, self._conn = process, parent_conn
+        self._spawned_at = time.monotonic()
+        self._stats["started_at"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        logger.info(f"告警引擎进程已启动: pid={process.pid}")
+
+    def _ensure_supervisor(self):
+        with self._lock:
+            if self._supervisor is not None and self._supervisor.is_alive():
+                return
+            self._stopping.clear()
+            self._supervisor = threading.Thread(target=self._supervise, name="alert-engine-supervisor", daemon=True)
+            self._supervisor.start()
+
+    def _supervise(self):
+        """子进程异常退出时重启，连续重启的间隔逐次加倍"""
+        delay = 1
+        while not self._stopping.wait(2):
+            with self._lock:
+                process = self._process
+                stable = self._spawned_at is not None and time.monotonic() - self._spawned_at >= STABLE_SECONDS
+            if process is None:
+                continue
+            if process.is_alive():
+                if stable:
+                    delay = 1
+                continue
+            logger.error(f"告警引擎进程异常退出(exitcode={process.exitcode})，{delay}秒后重启")
+            if self._stopping.wait(delay):
+                break
+            with self._lock:
+                if self._process is process:
+                    self._spawn()
+                    self._stats["restarts"] += 1
+            delay = min(delay * 2, MAX_RESTART_DELAY)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pid": self._process.pid if self._process is not None else None,
+                "alive": self._alive(),
+                "engine_wanted": self._engine_wanted,
+                **self._stats
+            }
+
+
+# 全局引擎进程（仅 alert_engine_process 开启时使用）
+engine_process = EngineProcess()
+
+
+def start_engine():
+    """启动告警引擎（独立进程模式下启动子进程或子进程中的引擎）"""
+    if get_settings().alert_engine_process:
+        engine_process.start()
+        return
+    start_alert_engine()
+
+
+def stop_engine():
+    """停止告警引擎（独立进程模式下子进程保留）"""
+    if get_settings().alert_engine_process:
+        engine_process.stop()
+        return
+    stop_alert_engine()
+
+
+def shutdown_engine():
+    """应用关闭时停止告警引擎（独立进程模式下同时结束子进程）"""
+    if get_settings().alert_engine_process:
+        engine_process.shutdown()
+        return
+    stop_alert_engine()
+
+
+def get_engine_status() -> dict:
+    """获取告警引擎状态，独立进程模式下附带子进程信息"""
+    if not get_settings().alert_engine_process:
+        return get_alert_engine_status()
+    process = engine_process.stats()
+    if not process["alive"]:
+        return {"running": False, "jobs": [], "message": "告警引擎进程未运行", "process": process}
+    status = engine_process.call('status')
+    status["process"] = process
+    return status
+
+
+def run_engine_once():
+    """手动执行一轮评估（评估全部启用的规则）"""
+    if get_settings().alert_engine_process:
+        engine_process.call('run_once', timeout=RUN_ONCE_TIMEOUT)
+        return
+    alert_engine_job(evaluate_all=True)
+
+
+def get_engine_metrics() -> str:
+    """告警引擎指标（Prometheus 文本格式），独立进程模式下附带子进程的重启次数"""
+    if not get_settings().alert_engine_process:
+        return get_alert_engine_metrics()
+    process = engine_process.stats()
+    lines = [
+        "# HELP alert_engine_process_restarts_total 告警引擎进程异常退出后的重启次数",
+        "# TYPE alert_engine_process_restarts_total counter",
+        f"alert_engine_process_restarts_total {process['restarts']}",
+    ]
+    if not process["alive"]:
+        lines += ["# HELP alert_engine_up 告警引擎是否在运行", "# TYPE alert_engine_up gauge", "alert_engine_up 0"]
+        return '\n'.join(lines) + '\n'
+    return '\n'.join(lines) + '\n' + engine_process.call('metrics')
+
+
+def get_slow_rules(limit: int = 10, stage: str = 'total', order_by: str = 'avg') -> list:
+    """按某阶段耗时排序的最慢规则"""
+    if get_settings().alert_engine_process:
+        return engine_process.call('slow_rules', limit=limit, stage=stage, order_by=order_by)
+    return get_engine_slow_rules(limit, stage, order_by)
@@ -1,20 +1,68 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.executors.pool import ThreadPoolExecutor
-import requests
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
+import concurrent.futures
+import copy
+import threading
+import time
 import json
+import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional
 from sqlalchemy.orm import Session
-from app.models import SessionLocal, AlertRule, AlertNotifyTemplate, AlertHistory
+from app.models import SessionLocal, AlertRule, AlertHistory
 from app.alert.downstream.email import send_email_msg, render_email_template
 from app.alert.downstream.http import send_http_msg, render_http_template
 from app.alert.downstream.lechat import send_lechat_msg, render_lechat_template
-from app.utils.logger import logger
+from app.alert.services.catchup_service import (
+    CHECKPOINT_SAVE_TICKS, catchup_window, load_last_tick, range_step, save_last_tick, step_times
+)
+from app.alert.services.engine_cluster import engine_cluster
+from app.alert.services.engine_metrics import counter_lines, engine_metrics
+from app.alert.services.eval_scheduler import eval_scheduler
+from app.alert.services.inhibition import InhibitionIndex
+from app.alert.services.tick_monitor import prioritize, tick_monitor
+from app.alert.services.notify_dispatcher import notify_dispatcher
+from app.alert.services.notify_grouping import notify_group
+from app.alert.services.notify_rate_limiter import notify_rate_limiter
+from app.alert.services.notify_outbox import enqueue_notifications, make_idempotency_key, notify_outbox
+from app.alert.services.notify_router import alert_labels, notify_router
+from app.alert.services.silence_store import silence_store
+from app.alert.services.query_planner import QueryPlan
+from app.alert.services.instance_store import (
+    AlertInstance, instance_store, label_fingerprint, aggregate_rule_state
+)
+from app.alert.services.rule_compiler import (
+    CompiledRule, CompiledTemplate, rule_cache, parse_alert_condition, parse_time_duration
+)
+from app.alert.services.rule_registry import RuleSnapshot, rule_registry
+from app.alert.services.state_writer import StateChange, StateWriteBuffer, write_state_changes
+from app.utils.http_client import prometheus_http
+from app.utils.logger import log_sampled, logger
 from app.config import get_settings
 
 # 全局调度器实例
 scheduler = None
 
+# 并行评估线程池（通知由独立的分发队列发送，不占用评估线程）
+_query_pool = None
+_pool_lock = threading.Lock()
+
+# 上一轮超时仍在执行的规则，避免同一规则被并发评估
+_inflight_rules = set()
+_inflight_lock = threading.Lock()
+
+# 最近一轮评估的统计信息
+_last_tick_stats = {}
+
+# 引擎启动后第一轮评估前需要补评估停机期间错过的时间段
+_catchup_pending = False
+_catchup_lock = threading.Lock()
+_last_catchup_stats = {}
+
+# 已知的集群检查点时间（本实例保存或从数据库读到的最新值），据此限制保存频率
+_checkpoint_at = None
+
 def _get_scheduler():
     """获取或创建调度器实例"""
     global scheduler
@@ -34,112 +82,627 @@ def _get_scheduler():
             executors=executors,
             job_defaults=job_defaults
         )
+        # 上一时间片仍在执行时调度器会跳过本次运行，记录下来而不是静默丢弃
+        scheduler.add_listener(_on_job_missed, EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED)
     return scheduler
 
+def _on_job_missed(event):
+    """调度器跳过了一次告警引擎运行"""
+    tick_monitor.missed_tick()
+    logger.warning(f"告警引擎时间片被跳过（上一时间片仍在执行或调度延迟）: {event.job_id}")
+
+def _get_query_pool():
+    """获取或创建规则评估线程池"""
+    global _query_pool
+    with _pool_lock:
+        if _query_pool is None:
+            _query_pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=max(get_settings().alert_engine_query_workers, 1),
+                thread_name_prefix="alert-query"
+            )
+        return _query_pool
+
+def _shutdown_worker_pools():
+    """关闭评估线程池，不等待超时中的规则"""
+    global _query_pool
+    with _pool_lock:
+        if _query_pool is not None:
+            _query_pool.shutdown(wait=False)
+        _query_pool = None
+    with _inflight_lock:
+        _inflight_rules.clear()
+
 # Prometheus配置，可以从config.py读取
 PROMETHEUS_URL = get_settings().prometheus_url
 
-def alert_engine_job():
-    """告警引擎主任务"""
-    logger.info("告警引擎开始执行")
+def alert_engine_job(evaluate_all: bool = False):
+    """
+    告警引擎主任务，每个调度时间片执行一次，只评估到期的规则
+    evaluate_all: 忽略评估间隔，评估全部启用的规则（手动触发时使用）
+    """
+    logger.debug("告警引擎开始执行")
+    
+    if _catchup_pending:
+        _run_catchup()
     
+    if get_settings().alert_engine_parallel:
+        _run_parallel_tick(evaluate_all)
+    else:
+        _run_serial_tick(evaluate_all)
+        
+    logger.debug("告警引擎执行完成")
+
+def _run_serial_tick(evaluate_all: bool = False):
+    """串行评估到期的规则（共用一个数据库会话），按优先级评估，预算用完后其余规则推迟"""
+    settings = get_settings()
+    started = time.monotonic()
+    tick_time = datetime.now()
+    budget = settings.alert_engine_tick_budget
     db = SessionLocal()
     try:
-        # 获取所有启用的规则
-        enabled_rules = db.query(AlertRule).filter(AlertRule.enabled == True).all()
-        logger.info(f"找到 {len(enabled_rules)} 条启用的告警规则")
+        # 获取所有启用的规则（注册表增量同步），多实例部署时只保留本实例负责的规则
+        enabled_rules = _assign_shard(db, rule_registry.refresh(db))
+        notify_router.refresh(db)
+        rule_cache.refresh_templates(db)
+        silence_store.refresh(db)
+        due_rules = _select_due_rules(enabled_rules, evaluate_all)
+        _sync_instance_store(db, enabled_rules)
+        inhibition = InhibitionIndex(enabled_rules)
+        planned = time.monotonic()
+        rules, deferred = _plan_tick(due_rules, budget, 1, inhibition)
         
-        for rule in enabled_rules:
+        query_plan = QueryPlan([rule.promql for rule in rules], query_prometheus)
+        write_buffer = StateWriteBuffer()
+        evaluate_started = time.monotonic()
+        evaluated = 0
+        for index, rule in enumerate(rules):
+            if time.monotonic() - started > budget:
+                deferred = rules[index:] + deferred
+                break
+            rule_started = time.monotonic()
             try:
-                process_alert_rule(db, rule)
+                process_alert_rule(db, rule, query_plan=query_plan, write_buffer=write_buffer,
+                                   inhibition=inhibition)
             except Exception as e:
                 logger.error(f"处理规则 {rule.id}({rule.name}) 时出错: {e}")
+            inhibition.mark_done(rule.id)
+            _observe_rule(rule, time.monotonic() - rule_started)
+            evaluated += 1
+        inhibition.release()
+        
+        _finish_tick(started, budget, due_rules, evaluated, deferred, [], [])
+        flush_started = time.monotonic()
+        _record_tick_stats(started, query_plan, write_buffer.flush(), inhibition, enabled=len(enabled_rules),
+                           due=len(due_rules), evaluated=evaluated, deferred=len(deferred))
+        _observe_tick(started, planned, evaluate_started, flush_started)
+        if enabled_rules:
+            _save_checkpoint(tick_time)
         
     except Exception as e:
         logger.error(f"告警引擎执行异常: {e}")
     finally:
         db.close()
+
+def _run_parallel_tick(evaluate_all: bool = False):
+    """
+    并行评估到期的规则
+    - 每条规则在评估线程池中使用独立的数据库会话评估，按优先级（告警等级）提交
+    - 需要发送的通知放入通知分发队列后立即返回，不等待下游投递
+    - 超过 alert_engine_tick_budget 仍未开始的规则推迟到下一时间片；
+      已开始但未完成的规则被隔离到后台，在其完成之前不会被再次提交
+    """
+    settings = get_settings()
+    started = time.monotonic()
+    tick_time = datetime.now()
+    budget = settings.alert_engine_tick_budget
+    
+    db = SessionLocal()
+    try:
+        enabled_rules = _assign_shard(db, rule_registry.refresh(db))
+        notify_router.refresh(db)
+        rule_cache.refresh_templates(db)
+        silence_store.refresh(db)
+        due_rules = _select_due_rules(enabled_rules, evaluate_all)
+        _sync_instance_store(db, enabled_rules)
+        inhibition = InhibitionIndex(enabled_rules)
+    except Exception as e:
+        logger.error(f"告警引擎执行异常: {e}")
+        return
+    finally:
+        db.close()
+    
+    planned = time.monotonic()
+    rules, deferred = _plan_tick(due_rules, budget, settings.alert_engine_query_workers, inhibition)
+    query_plan = QueryPlan([rule.promql for rule in rules], query_prometheus)
+    write_buffer = StateWriteBuffer()
+    evaluate_started = time.monotonic()
+    query_pool = _get_query_pool()
+    deadline = started + budget
+    
+    query_futures = {}
+    skipped = []
+    for rule in rules:
+        rule_id = rule.id
+        with _inflight_lock:
+            if rule_id in _inflight_rules:
+                logger.warning(f"规则 {rule_id} 上一轮评估尚未完成，本轮跳过")
+                skipped.append(rule)
+                inhibition.mark_done(rule_id)
+                continue
+            _inflight_rules.add(rule_id)
+        try:
+            future = query_pool.submit(
+                _evaluate_rule_isolated, rule, query_plan, write_buffer, inhibition
+            )
+        except RuntimeError as e:
+            # 引擎停止时线程池已关闭
+            with _inflight_lock:
+                _inflight_rules.discard(rule_id)
+            inhibition.mark_done(rule_id)
+            logger.warning(f"提交规则 {rule_id} 评估任务失败: {e}")
+            continue
+        query_futures[future] = rule
+    
+    _, pending = concurrent.futures.wait(query_futures, timeout=max(deadline - time.monotonic(), 0))
+    isolated = []
+    for future in pending:
+        rule = query_futures[future]
+        if future.cancel():
+            # 尚未开始，推迟到下一时间片
+            with _inflight_lock:
+                _inflight_rules.discard(rule.id)
+            inhibition.mark_done(rule.id)
+            deferred.append(rule)
+        else:
+            logger.warning(f"规则 {rule.id} 评估超出预算，已隔离到后台继续执行")
+            isolated.append(rule)
+    inhibition.release()
+    
+    evaluated = len(query_futures) - (len(pending) - len(isolated))
+    _finish_tick(started, budget, due_rules, evaluated, prioritize(deferred), skipped, isolated)
+    flush_started = time.monotonic()
+    _record_tick_stats(started, query_plan, write_buffer.flush(), inhibition, enabled=len(enabled_rules),
+                       due=len(due_rules), evaluated=evaluated, deferred=len(deferred), skipped=len(skipped),
+                       isolated=len(isolated))
+    _observe_tick(started, planned, evaluate_started, flush_started)
+    if enabled_rules:
+        _save_checkpoint(tick_time)
+
+def _plan_tick(due_rules: List[RuleSnapshot], budget: float, workers: int,
+               inhibition: InhibitionIndex) -> tuple:
+    """
+    按优先级排序到期规则，超出预估评估能力的低优先级规则直接推迟，返回 (本轮评估, 推迟)
+    本轮评估的规则按依赖深度排序，父规则先于子规则评估
+    """
+    rules = prioritize(due_rules)
+    deferred = []
+    capacity = tick_monitor.capacity(budget, workers)
+    if capacity is not None and len(rules) > capacity:
+        logger.warning(f"到期规则 {len(rules)} 条超过本时间片预估评估能力 {capacity} 条，低优先级规则推迟")
+        rules, deferred = rules[:capacity], rules[capacity:]
+    rules = inhibition.order(rules)
+    inhibition.expect(rules)
+    return rules, deferred
+
+def _finish_tick(started: float, budget: float, due_rules: List[RuleSnapshot], evaluated: int,
+                 deferred: List[RuleSnapshot], skipped: List[RuleSnapshot], isolated: List[RuleSnapshot]):
+    """推迟的规则重新排期，并记录本时间片的预算使用情况"""
+    if deferred:
+        eval_scheduler.defer([rule.id for rule in deferred])
+    if tick_monitor.record_tick(started, budget, len(due_rules), evaluated, deferred, skipped, isolated):
+        logger.warning(
+            f"告警引擎评估超出预算: 耗时 {time.monotonic() - started:.2f}秒/预算 {budget}秒, "
+            f"推迟 {len(deferred)} 条, 跳过 {len(skipped)} 条, 隔离 {len(isolated)} 条"
+        )
+
+def _select_due_rules(rules: List[RuleSnapshot], evaluate_all: bool = False) -> List[RuleSnapshot]:
+    """按各规则的评估间隔选出本时间片到期的规则"""
+    eval_scheduler.sync(rules)
+    due_ids = set(eval_scheduler.pop_due())
+    due_rules = rules if evaluate_all else [rule for rule in rules if rule.id in due_ids]
+    logger.debug("启用的告警规则 %s 条, 本轮到期 %s 条", len(rules), len(due_rules))
+    return due_rules
+
+def _assign_shard(db: Session, rules: List[RuleSnapshot]) -> List[RuleSnapshot]:
+    """
+    多实例部署时只评估本实例负责的规则（见 engine_cluster）：
+    迁入的规则从状态表重新加载告警实例，迁出的规则释放内存中的实例
+    """
+    owned, reload, released = engine_cluster.assign(db, rules)
+    for rule_id in released:
+        instance_store.remove_rule(rule_id)
+    if reload:
+        instance_store.reload_rules(db, reload)
+    engine_metrics.retain(rule.id for rule in owned)
+    return owned
+
+def _sync_instance_store(db: Session, rules: List[RuleSnapshot]):
+    """首次评估前从状态表恢复告警实例，并应用本实例负责的规则上的界面确认/解决请求"""
+    instance_store.ensure_loaded(db)
+    instance_store.apply_manual_requests(db, {rule.id for rule in rules})
+
+def _record_tick_stats(started: float, query_plan: QueryPlan, write_stats: dict, inhibition: InhibitionIndex,
+                       **counts):
+    """
+    记录本轮查询计划、写库和抑制统计，供引擎状态接口查看，并输出一行 key=value 格式的本轮汇总日志
+    counts: 本轮规则数统计（启用、到期、评估、推迟、跳过、隔离）
+    """
+    global _last_tick_stats
+    stats = query_plan.summary()
+    stats["writes"] = dict(write_stats)
+    stats["inhibition"] = inhibition.summary()
+    _last_tick_stats = stats
+    summary = {
+        "duration": f"{time.monotonic() - started:.3f}s",
+        **counts,
+        "queries": stats["executed_queries"],
+        "saved_queries": stats["saved_round_trips"],
+        "state_upserts": write_stats["state_upserts"],
+        "state_deletes": write_stats["state_deletes"],
+        "notifications": write_stats["histories"],
+        "duplicates": write_stats["duplicate_notifications"],
+        "failed_rows": write_stats["failed_rows"],
+    }
+    logger.info("告警引擎时间片完成 " + ' '.join(f"{key}={value}" for key, value in summary.items()))
+
+def _observe_rule(rule: RuleSnapshot, seconds: float):
+    """记录规则一次评估的总耗时（预算预估和引擎指标）"""
+    tick_monitor.observe_rule(seconds)
+    engine_metrics.observe_rule(rule.id, rule.name, 'total', seconds)
+
+def _observe_tick(started: float, planned: float, evaluate_started: float, flush_started: float):
+    """记录本时间片各阶段耗时：同步规则等(refresh)、排期(plan)、评估(evaluate)、批量写库(flush)"""
+    now = time.monotonic()
+    engine_metrics.observe_tick({
+        "refresh": planned - started,
+        "plan": evaluate_started - planned,
+        "evaluate": flush_started - evaluate_started,
+        "flush": now - flush_started,
+        "total": now - started,
+    })
+
+def _save_checkpoint(tick_time: datetime):
+    """
+    记录本轮评估时间，重启后据此确定补评估窗口
+    只在本实例评估了负责的规则时调用：心跳中断暂停评估的实例不能推进集群共用的检查点；
+    已知检查点距本轮不足 CHECKPOINT_SAVE_TICKS 个时间片时不写库，避免各实例每个时间片争抢同一行
+    """
+    global _checkpoint_at
+    interval = timedelta(seconds=CHECKPOINT_SAVE_TICKS * max(get_settings().alert_engine_resolution, 1))
+    if _checkpoint_at is not None and tick_time - _checkpoint_at < interval:
+        return
+    db = SessionLocal()
+    try:
+        _checkpoint_at = save_last_tick(db, tick_time)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"保存告警引擎检查点失败: {e}")
+    finally:
+        db.close()
+
+def _run_catchup():
+    """
+    补评估停机期间错过的时间段（引擎启动后第一轮评估前执行一次）
+    每条规则一次 query_range 查询，按规则评估间隔回放状态机，窗口不超过 alert_engine_catchup_max_window
+    """
+    global _catchup_pending, _last_catchup_stats
+    with _catchup_lock:
+        if not _catchup_pending:
+            return
+        _catchup_pending = False
         
-    logger.info("告警引擎执行完成")
+        started = time.monotonic()
+        now = datetime.now()
+        db = SessionLocal()
+        try:
+            window = catchup_window(load_last_tick(db), now)
+            if window is None:
+                logger.info("告警引擎无需补评估")
+                return
+            rules = _assign_shard(db, rule_registry.refresh(db))
+            notify_router.refresh(db)
+            rule_cache.refresh_templates(db)
+            silence_store.refresh(db)
+            _sync_instance_store(db, rules)
+        except Exception as e:
+            logger.error(f"告警引擎补评估准备失败: {e}")
+            return
+        finally:
+            db.close()
+        
+        start, end = window
+        logger.info(f"告警引擎开始补评估: {start} ~ {end}, 规则 {len(rules)} 条")
+        write_buffer = StateWriteBuffer()
+        if get_settings().alert_engine_parallel:
+            results = list(_get_query_pool().map(
+                lambda rule: _replay_rule_isolated(rule, start, end, write_buffer), rules
+            ))
+        else:
+            results = [_replay_rule_isolated(rule, start, end, write_buffer) for rule in rules]
+        write_stats = write_buffer.flush()
+        
+        _last_catchup_stats = {
+            "window_start": start.strftime('%Y-%m-%d %H:%M:%S'),
+            "window_end": end.strftime('%Y-%m-%d %H:%M:%S'),
+            "rules": len(rules),
+            "replayed_steps": sum(steps for steps, _ in results),
+            "notifications": sum(notified for _, notified in results),
+            "duration_seconds": round(time.monotonic() - started, 3),
+            "writes": dict(write_stats)
+        }
+        logger.info(f"告警引擎补评估完成: {_last_catchup_stats}")
 
-def process_alert_rule(db: Session, rule: AlertRule):
-    """处理单个告警规则"""
+def _replay_rule_isolated(rule: RuleSnapshot, start: datetime, end: datetime,
+                          write_buffer: StateWriteBuffer) -> tuple:
+    """在独立会话中补评估单条规则，异常不影响其他规则"""
+    db = SessionLocal()
+    try:
+        return replay_alert_rule(db, rule, start, end, write_buffer)
+    except Exception as e:
+        logger.error(f"补评估规则 {rule.id}({rule.name}) 时出错: {e}")
+        return 0, 0
+    finally:
+        db.close()
+
+def replay_alert_rule(db: Session, rule: RuleSnapshot, start: datetime, end: datetime,
+                      write_buffer: Optional[StateWriteBuffer] = None) -> tuple:
+    """
+    用一次 query_range 查询回放规则在时间窗口内的状态机
+    整个结果矩阵一次性检查告警条件，再按评估时刻依次执行各序列的状态机；
+    同一序列在窗口内多次触发时只补发最后一次告警
+    返回 (回放的评估时刻数, 补发的告警数)
+    """
+    compiled = rule_cache.get(db, rule)
+    if compiled is None:
+        return 0, 0
+    step = range_step(start, end, eval_scheduler.effective_interval(rule.eval_interval))
+    times = step_times(start, end, step)
+    if not times:
+        return 0, 0
+    matrix = query_prometheus_range(rule.promql, times[0], times[-1], step)
+    if matrix is None:
+        logger.warning(f"规则 {rule.name} 补评估查询失败，跳过补评估")
+        return 0, 0
+    
+    # 对整个结果矩阵统一检查告警条件
+    flags = compiled.evaluate([value for item in matrix for value in item['values']])
+    
+    # 按评估时刻分组：(序列列表, 是否触发列表)
+    position = {ts: index for index, ts in enumerate(times)}
+    grouped = [([], []) for _ in times]
+    offset = 0
+    for item in matrix:
+        for ts, value in zip(item['timestamps'], item['values']):
+            index = position.get(ts)
+            if index is not None:
+                grouped[index][0].append({'labels': item['labels'], 'value': value})
+                grouped[index][1].append(flags[offset])
+            offset += 1
+    
+    instances = instance_store.get_rule_instances(rule.id)
+    latest = {}
+    for ts, (series, triggered_flags) in zip(times, grouped):
+        current_time = datetime.fromtimestamp(ts)
+        for instance, value, alert_state in evaluate_rule_series(
+                db, compiled, instances, series, triggered_flags, current_time):
+            latest[instance.fingerprint] = (instance, value, alert_state, current_time)
+    
+    update_rule_state(db, rule, instances, write_buffer)
+    instance_store.prune(rule.id)
+    
+    for instance, value, alert_state, trigger_time in latest.values():
+        logger.debug("补发告警通知: 规则=%s, 序列=%s, 值=%s, 触发时间=%s", rule.name, instance.labels, value, trigger_time)
+        send_alert_and_record(db, compiled, value, trigger_time, alert_state, instance.labels, write_buffer)
+    return len(times), len(latest)
+
+def _evaluate_rule_isolated(rule: RuleSnapshot, query_plan: Optional[QueryPlan] = None,
+                            write_buffer: Optional[StateWriteBuffer] = None,
+                            inhibition: Optional[InhibitionIndex] = None):
+    """在独立会话中评估单条规则，异常不影响其他规则"""
+    rule_id = rule.id
+    started = time.monotonic()
+    db = SessionLocal()
+    try:
+        process_alert_rule(db, rule, query_plan=query_plan, write_buffer=write_buffer, inhibition=inhibition)
+    except Exception as e:
+        logger.error(f"处理规则 {rule_id} 时出错: {e}")
+    finally:
+        db.close()
+        if inhibition is not None:
+            inhibition.mark_done(rule_id)
+        _observe_rule(rule, time.monotonic() - started)
+        with _inflight_lock:
+            _inflight_rules.discard(rule_id)
+
+def process_alert_rule(db: Session, rule: RuleSnapshot, query_plan: Optional[QueryPlan] = None,
+                       write_buffer: Optional[StateWriteBuffer] = None,
+                       inhibition: Optional[InhibitionIndex] = None):
+    """
+    处理单个告警规则
+    rule: 注册表中的规则快照（也兼容AlertRule记录）
+    query_plan: 可选的本轮查询计划，相同PromQL的规则共享一次查询结果
+    write_buffer: 可选的本轮写缓冲，状态变更和告警历史在轮次结束时批量写库
+    inhibition: 可选的本轮抑制索引，父规则告警中时抑制匹配的序列
+    """
     try:
-        logger.info(f"开始处理告警规则: {rule.name}")
-        logger.info(f"PromQL: {rule.promql}")
-        logger.info(f"告警条件: {rule.condition}")
-        logger.info(f"当前规则状态: {rule.alert_state}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("开始处理告警规则: %s, PromQL: %s, 告警条件: %s, 当前状态: %s", rule.name, rule.promql,
+                         rule.condition, instance_store.get_aggregate(rule.id)[0])
         
-        # 查询Prometheus
-        query_result = query_prometheus(rule.promql)
-        if query_result is None:
-            logger.warning(f"规则 {rule.name} 查询无结果")
+        compiled = rule_cache.get(db, rule)
+        if compiled is None:
             return
         
-        current_value = query_result['value']
-        metric_labels = query_result['labels']
-        current_time = datetime.now()
+        if inhibition is not None and inhibition.skip_evaluation(rule):
+            logger.debug("规则 %s 的父规则 %s 告警中，跳过评估", rule.name, rule.parent_rule_id)
+            inhibit_rule_instances(db, rule, write_buffer)
+            return
         
-        logger.info(f"Prometheus查询结果: 值={current_value}, 标签={metric_labels}")
+        # 查询Prometheus
+        stage_started = time.monotonic()
+        if query_plan is not None:
+            series = query_plan.query(rule.promql)
+        else:
+            series = query_prometheus(rule.promql)
+        stage_started = _observe_stage(rule, 'query', stage_started)
+        if series is None:
+            log_sampled("rule_query_failed", logging.WARNING, "规则 %s 查询失败，保持当前状态", rule.name)
+            return
         
-        # 检查告警条件
-        is_triggered = check_alert_condition(current_value, rule.condition)
-        logger.info(f"告警条件检查: 值={current_value}, 条件={rule.condition}, 触发={is_triggered}")
+        current_time = datetime.now()
         
-        # 确定告警状态
-        previous_state = rule.alert_state
-        new_state = determine_alert_state(previous_state, is_triggered, rule, current_time)
-        logger.info(f"状态转换: {previous_state} -> {new_state}")
+        # 对整个结果向量统一检查告警条件（条件只解析一次）
+        values = [item['value'] for item in series]
+        triggered_flags = compiled.evaluate(values)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("规则 %s 查询结果: %s 条序列, 满足条件 %s 条", rule.name, len(series), sum(triggered_flags))
+        engine_metrics.observe_series(rule.id, rule.name, len(series))
         
-        # 检查是否需要发送通知
-        should_send = should_send_notification(db, rule, previous_state, new_state, current_time, current_value)
-        logger.info(f"是否需要发送通知: {should_send}")
+        instances = instance_store.get_rule_instances(rule.id)
+        inhibited = inhibition.series_filter(rule) if inhibition is not None else None
+        notifications = evaluate_rule_series(db, compiled, instances, series, triggered_flags, current_time,
+                                             inhibited)
+        stage_started = _observe_stage(rule, 'evaluate', stage_started)
         
-        # 更新规则状态
-        update_rule_state(db, rule, new_state, current_time if new_state == 'alerting' else None)
+        # 更新规则汇总状态
+        update_rule_state(db, rule, instances, write_buffer)
+        instance_store.prune(rule.id)
+        stage_started = _observe_stage(rule, 'write', stage_started)
         
         # 如果需要发送通知
-        if should_send:
-            logger.info(f"准备发送告警通知: 规则={rule.name}, 值={current_value}")
-            send_alert_and_record(db, rule, current_value, current_time, new_state, metric_labels)
-        else:
-            logger.info(f"不发送通知: 规则={rule.name}, 原因可能是状态未变化或处于静默期")
+        for instance, value, alert_state in notifications:
+            logger.debug("准备发送告警通知: 规则=%s, 序列=%s, 值=%s", rule.name, instance.labels, value)
+            send_alert_and_record(db, compiled, value, current_time, alert_state, instance.labels, write_buffer)
+        if notifications:
+            _observe_stage(rule, 'notify', stage_started)
         
-        logger.info(f"规则 {rule.name} 处理完成: 值={current_value}, 状态={new_state}, 发送={should_send}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("规则 %s 处理完成: 状态=%s, 告警实例=%s, 发送=%s", rule.name, aggregate_rule_state(instances),
+                         len(instances), len(notifications))
         
     except Exception as e:
-        logger.error(f"处理告警规则 {rule.name} 失败: {e}")
-        import traceback
-        logger.error(f"详细错误信息: {traceback.format_exc()}")
+        logger.exception(f"处理告警规则 {rule.name} 失败: {e}")
+
+def _observe_stage(rule: RuleSnapshot, stage: str, stage_started: float) -> float:
+    """记录规则一个评估阶段的耗时，返回下一阶段的开始时间"""
+    now = time.monotonic()
+    engine_metrics.observe_rule(rule.id, rule.name, stage, now - stage_started)
+    return now
 
-def determine_alert_state(previous_state: str, is_triggered: bool, rule: AlertRule, current_time: datetime) -> str:
+def evaluate_rule_series(db: Session, compiled: CompiledRule, instances: Dict[str, AlertInstance],
+                         series: List[dict], triggered_flags: List[bool], current_time: datetime,
+                         inhibited: Optional[Callable[[dict], bool]] = None) -> List[tuple]:
+    """
+    对一个评估时刻的查询结果执行各序列的状态机
+    inhibited: 可选，判断序列是否被父规则抑制；被抑制的序列不发送通知
+    命中生效静默的序列进入 muted 状态，不发送通知
+    返回需要发送通知的 (实例, 当前值, 告警状态) 列表
+    """
+    notifications = []
+    seen = set()
+    silenced = silence_store.series_filter(compiled, current_time)
+    
+    for item, is_triggered in zip(series, triggered_flags):
+        fingerprint = label_fingerprint(item['labels'])
+        seen.add(fingerprint)
+        instance = instances.get(fingerprint)
+        if instance is None:
+            if not is_triggered:
+                continue  # 正常且没有历史状态的序列无需跟踪
+            instance = instance_store.create_instance(compiled, fingerprint, item['labels'])
+        instance.rule = compiled
+        instance.record_value(item['value'])
+        if is_triggered and silenced is not None:
+            silence_id = silenced(item['labels'])
+            if silence_id is not None:
+                suppress_alert_instance(instance, 'muted', current_time, f"命中静默 {silence_id}")
+                continue
+        if is_triggered and inhibited is not None and inhibited(item['labels']):
+            suppress_alert_instance(instance, 'inhibited', current_time, "父规则告警中")
+            continue
+        if evaluate_alert_instance(db, compiled, instance, is_triggered, current_time):
+            notifications.append((instance, instance.last_value, instance.alert_state))
+    
+    # 从结果中消失的序列视为恢复
+    for fingerprint, instance in list(instances.items()):
+        if fingerprint not in seen:
+            instance.rule = compiled
+            evaluate_alert_instance(db, compiled, instance, False, current_time)
+    return notifications
+
+def suppress_alert_instance(instance: AlertInstance, state: str, current_time: datetime, reason: str):
+    """
+    满足条件但不通知的序列进入 inhibited（父规则告警中）或 muted（命中静默）状态，
+    不发送通知，保留条件首次满足的时间
+    """
+    if instance.alert_state != state:
+        logger.debug("实例 %s 状态转换: %s -> %s（%s）", instance.name, instance.alert_state, state, reason)
+        instance.alert_state = state
+    if not instance.alert_start_time:
+        instance.alert_start_time = current_time
+
+def inhibit_rule_instances(db: Session, rule: RuleSnapshot, write_buffer: Optional[StateWriteBuffer] = None):
+    """整条规则被抑制且跳过评估时，把仍在跟踪的实例转为被抑制状态"""
+    instances = instance_store.get_rule_instances(rule.id)
+    current_time = datetime.now()
+    for instance in instances.values():
+        if instance.alert_state != 'ok':
+            suppress_alert_instance(instance, 'inhibited', current_time, "父规则告警中")
+    update_rule_state(db, rule, instances, write_buffer)
+
+def evaluate_alert_instance(db: Session, rule: CompiledRule, instance: AlertInstance,
+                            is_triggered: bool, current_time: datetime) -> bool:
+    """对单个告警实例执行状态机，返回是否需要发送通知"""
+    previous_state = instance.alert_state
+    new_state = determine_alert_state(previous_state, is_triggered, instance, current_time)
+    should_send = should_send_notification(db, rule, previous_state, new_state, current_time, instance.last_value)
+    if previous_state != new_state:
+        logger.debug("实例 %s 状态转换: %s -> %s, 发送=%s", instance.name, previous_state, new_state, should_send)
+    update_instance_state(instance, new_state, current_time if new_state == 'alerting' else None)
+    return should_send
+
+def determine_alert_state(previous_state: str, is_triggered: bool, rule: AlertInstance, current_time: datetime) -> str:
     """
     确定新的告警状态
+    rule 为告警实例（AlertInstance），状态按序列维护，时间间隔使用编译规则中预解析的值
     状态转换规则：
-    - ok -> alerting: 触发条件
+    - inhibited/muted: 父规则恢复或静默结束后按 ok 处理
+    - ok -> pending: 触发条件且规则配置了 for_duration
+    - pending -> alerting: 条件持续满足 for_duration
+    - pending -> ok: 等待期内条件不再满足
+    - ok -> alerting: 触发条件且未配置 for_duration
     - alerting -> ok: 恢复条件
     - alerting -> silenced: 在抑制期内或达到发送限制
     - silenced -> alerting: 超过抑制期且仍触发
     """
     if not is_triggered:
         # 告警恢复，重置计数器
-        if previous_state in ['alerting', 'silenced']:
+        if previous_state in ['pending', 'inhibited', 'muted', 'alerting', 'silenced']:
             reset_alert_counters(rule)
         return 'ok'  # 不满足触发条件，状态为正常
     
+    if previous_state == 'pending':
+        # alert_start_time 为条件首次满足的时间
+        if rule.alert_start_time and current_time < rule.alert_start_time + rule.for_delta:
+            return 'pending'  # 持续时间不足，继续等待
+        return 'alerting'  # 条件持续满足 for_duration，开始告警
+    
     # 检查是否是新一天，如果是则重置计数器
     check_and_reset_daily_counters(rule, current_time)
     
-    if previous_state == 'ok':
-        # 从正常转为告警，设置告警开始时间
+    if previous_state in ['ok', 'inhibited', 'muted']:
+        # 条件首次满足（或父规则恢复后仍满足），设置告警开始时间
         if not rule.alert_start_time:
             rule.alert_start_time = current_time
+        if rule.for_delta:
+            return 'pending'  # 等待条件持续满足 for_duration
         return 'alerting'  # 从正常转为告警
     
     if previous_state == 'alerting':
         # 检查持续时间限制
-        if rule.duration and rule.alert_start_time:
-            if current_time >= rule.alert_start_time + timedelta(seconds=rule.duration):
+        if rule.duration_delta and rule.alert_start_time:
+            if current_time >= rule.alert_start_time + rule.duration_delta:
                 return 'silenced'  # 超过持续时间，进入静默
         
         # 检查发送次数限制
@@ -147,23 +710,21 @@ def determine_alert_state(previous_state: str, is_triggered: bool, rule: AlertRu
             return 'silenced'  # 达到最大发送次数，进入静默
         
         # 检查是否需要进入静默期
-        if rule.suppress and rule.last_alert_time:
-            suppress_duration = parse_time_duration(rule.suppress)
-            if suppress_duration and current_time < rule.last_alert_time + suppress_duration:
+        if rule.suppress_delta and rule.last_alert_time:
+            if current_time < rule.last_alert_time + rule.suppress_delta:
                 return 'silenced'  # 进入静默期
         
         # 检查重复通知间隔
-        if rule.repeat and rule.repeat > 0 and rule.last_alert_time:
-            repeat_interval = timedelta(seconds=rule.repeat)
-            if current_time < rule.last_alert_time + repeat_interval:
+        if rule.repeat_delta and rule.last_alert_time:
+            if current_time < rule.last_alert_time + rule.repeat_delta:
                 return 'silenced'  # 在重复间隔内，保持静默
         
         return 'alerting'  # 继续告警状态
     
     if previous_state == 'silenced':
         # 检查持续时间限制
-        if rule.duration and rule.alert_start_time:
-            if current_time >= rule.alert_start_time + timedelta(seconds=rule.duration):
+        if rule.duration_delta and rule.alert_start_time:
+            if current_time >= rule.alert_start_time + rule.duration_delta:
                 return 'silenced'  # 仍在持续时间限制内
         
         # 检查发送次数限制
@@ -171,31 +732,30 @@ def determine_alert_state(previous_state: str, is_triggered: bool, rule: AlertRu
             return 'silenced'  # 仍达到最大发送次数
         
         # 检查是否可以退出静默期
-        if rule.suppress and rule.last_alert_time:
-            suppress_duration = parse_time_duration(rule.suppress)
-            if suppress_duration and current_time >= rule.last_alert_time + suppress_duration:
+        if rule.suppress_delta and rule.last_alert_time:
+            if current_time >= rule.last_alert_time + rule.suppress_delta:
                 return 'alerting'  # 退出静默期，重新告警
         
-        if rule.repeat and rule.repeat > 0 and rule.last_alert_time:
-            repeat_interval = timedelta(seconds=rule.repeat)
-            if current_time >= rule.last_alert_time + repeat_interval:
+        if rule.repeat_delta and rule.last_alert_time:
+            if current_time >= rule.last_alert_time + rule.repeat_delta:
                 return 'alerting'  # 超过重复间隔，可以重新告警
         
         return 'silenced'  # 继续静默
     
     return 'alerting'  # 默认返回告警状态
 
-def should_send_notification(db: Session, rule: AlertRule, previous_state: str, 
+def should_send_notification(db: Session, rule: CompiledRule, previous_state: str, 
                            new_state: str, current_time: datetime, current_value: float) -> bool:
     """
     判断是否应该发送通知
     发送条件：
-    1. 状态从 ok -> alerting (新告警)
+    1. 状态从 ok/pending/inhibited/muted -> alerting (新告警)
     2. 状态从 silenced -> alerting (重新告警)
     3. 状态从 alerting -> ok (恢复通知，可选)
+    pending 状态下条件尚未持续满足 for_duration，不发送通知
     """
     # 新触发的告警
-    if previous_state in ['ok', 'silenced'] and new_state == 'alerting':
+    if previous_state in ['ok', 'pending', 'inhibited', 'muted', 'silenced'] and new_state == 'alerting':
         return True
     
     # 告警恢复通知（可配置是否启用）
@@ -206,26 +766,18 @@ def should_send_notification(db: Session, rule: AlertRule, previous_state: str,
     
     return False
 
-def send_alert_and_record(db: Session, rule: AlertRule, current_value: float, 
-                         current_time: datetime, alert_state: str, metric_labels: dict = None):
-    """发送告警并记录历史"""
-    logger.info(f"规则 {rule.name} 触发告警，当前值: {current_value}, 状态: {alert_state}")
-    
-    # 获取通知模板
-    if not rule.notify_template_id:
-        logger.warning(f"规则 {rule.name} 未配置通知模板")
-        return
-    
-    logger.info(f"查找通知模板 ID: {rule.notify_template_id}")
-    template = db.query(AlertNotifyTemplate).filter(
-        AlertNotifyTemplate.id == rule.notify_template_id
-    ).first()
-    
-    if not template:
-        logger.error(f"规则 {rule.name} 的通知模板 {rule.notify_template_id} 不存在")
-        return
-    
-    logger.info(f"找到通知模板: {template.name}, 类型: {template.type}")
+def send_alert_and_record(db: Session, rule: CompiledRule, current_value: float, 
+                         current_time: datetime, alert_state: str, metric_labels: dict = None,
+                         write_buffer: Optional[StateWriteBuffer] = None):
+    """
+    发送告警并记录历史
+    通知模板按通知路由选择（可能有多个），没有路由命中时使用规则自身的通知模板；
+    告警历史和发件箱记录在同一事务中写入（提供写缓冲时在轮次结束批量写入），
+    由发件箱线程异步发送，发送成功后回填告警历史的通知结果
+    """
+    # 告警风暴时同一规则大量序列同时触发，每条规则按间隔只输出一条（告警历史中有完整记录）
+    log_sampled(f"alert_fired:{rule.id}", logging.INFO, "规则 %s 触发告警，当前值: %s, 状态: %s, 序列: %s",
+                rule.name, current_value, alert_state, metric_labels)
     
     # 合并规则标签和指标标签
     rule_labels = rule.labels or {}
@@ -234,12 +786,18 @@ def send_alert_and_record(db: Session, rule: AlertRule, current_value: float,
     # 指标标签优先级高于规则标签
     merged_labels = {**rule_labels, **metric_labels}
     
-    logger.info(f"规则标签: {rule_labels}")
-    logger.info(f"指标标签: {metric_labels}")
-    logger.info(f"合并后标签: {merged_labels}")
+    # 获取通知模板
+    templates = resolve_notify_templates(db, rule, metric_labels)
+    if not templates:
+        logger.warning(f"规则 {rule.name} 未配置通知模板，且没有命中带模板的通知路由")
+        return
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("规则 %s 的通知模板: %s", rule.name, ', '.join(f'{t.name}({t.type})' for t in templates))
     
     # 构建告警上下文
     alert_context = {
+        'rule_id': rule.id,
         'rule_name': rule.name,
         'category': rule.category,
         'level': rule.level,
@@ -257,38 +815,129 @@ def send_alert_and_record(db: Session, rule: AlertRule, current_value: float,
     for key, value in metric_labels.items():
         alert_context[key] = str(value)
     
-    logger.info(f"告警上下文: {alert_context}")
+    logger.debug("告警上下文: %s", alert_context)
     
-    # 发送通知
-    logger.info(f"开始发送告警通知...")
-    send_result = send_alert_notification(template, alert_context)
-    logger.info(f"告警发送结果: {send_result}")
+    # 每个通知模板一条发件箱记录
+    # 幂等键：同一序列同一触发时间的告警对同一模板只发送一次，也提供给模板供下游去重
+    # 分组键：模板开启分组时同组告警等待 group_wait 后合并发送
+    fingerprint = label_fingerprint(metric_labels)
+    max_attempts = max(get_settings().alert_notify_max_attempts, 1)
+    labels = alert_labels(rule, metric_labels)
+    now = datetime.now()
+    outboxes = []
+    for template in templates:
+        idempotency_key = make_idempotency_key(rule.id, fingerprint, current_time, template.id)
+        group_key, send_after = notify_group(template, labels, now)
+        outboxes.append({
+            'idempotency_key': idempotency_key,
+            'rule_id': rule.id,
+            'template_id': template.id,
+            'channel': template.type,
+            'payload': {**alert_context, 'idempotency_key': idempotency_key},
+            'max_attempts': max_attempts,
+            'group_key': group_key,
+            'next_attempt_at': send_after
+        })
+    create_alert_history(db, rule, alert_context, current_value, outboxes, write_buffer, trigger_time=current_time)
+
+def resolve_notify_templates(db: Session, rule: CompiledRule, metric_labels: dict) -> List[CompiledTemplate]:
+    """
+    按通知路由选择告警的通知模板（匹配标签见 alert_labels）；
+    没有路由命中或命中路由链上没有模板时使用规则自身的通知模板
+    """
+    routed = notify_router.route(alert_labels(rule, metric_labels))
+    if routed:
+        template_ids = [template_id or rule.notify_template_id for _, template_id in routed]
+    else:
+        template_ids = [rule.notify_template_id]
     
-    # 记录历史
-    logger.info(f"开始记录告警历史...")
-    create_alert_history(db, rule, alert_context, send_result, current_value)
-    logger.info(f"告警历史记录完成")
+    templates = []
+    for template_id in dict.fromkeys(template_ids):
+        if not template_id:
+            continue
+        # 规则自身的模板在编译时已解析
+        template = rule.template if template_id == rule.notify_template_id else rule_cache.get_template(db, template_id)
+        if template is None:
+            logger.error(f"规则 {rule.name} 的通知模板 {template_id} 不存在")
+            continue
+        templates.append(template)
+    return templates
+
+def update_instance_state(instance: AlertInstance, new_state: str, alert_time: Optional[datetime]):
+    """更新告警实例状态"""
+    instance.alert_state = new_state
+    if alert_time:
+        instance.last_alert_time = alert_time
+        # 如果发送了告警，增加发送计数
+        if new_state == 'alerting':
+            instance.send_count = (instance.send_count or 0) + 1
 
-def update_rule_state(db: Session, rule: AlertRule, new_state: str, alert_time: Optional[datetime]):
-    """更新规则状态"""
+def update_rule_state(db: Session, rule: RuleSnapshot, instances: Dict[str, AlertInstance],
+                      write_buffer: Optional[StateWriteBuffer] = None):
+    """
+    将变化的告警实例和规则汇总状态写入状态表（alert_rule_state），不修改规则定义表；
+    状态未变化时不写库，提供写缓冲时延迟到轮次结束批量写入。
+    状态未变化的实例按检查点间隔写入最近监控值，重启后 pending 计时和最近值都能恢复
+    """
     try:
-        rule.alert_state = new_state
-        if alert_time:
-            rule.last_alert_time = alert_time
-            # 如果发送了告警，增加发送计数
-            if new_state == 'alerting':
-                rule.send_count = (rule.send_count or 0) + 1
-        db.commit()
-        logger.debug(f"规则 {rule.name} 状态更新为: {new_state}, 发送次数: {rule.send_count}")
+        checkpoint_interval = get_settings().alert_engine_checkpoint_interval
+        change = StateChange(rule.id)
+        for instance in instances.values():
+            if instance.alert_state == 'ok':
+                if instance.persisted is not None:
+                    change.deletes.append((rule.id, instance.fingerprint))
+                    change.instances.append(instance)
+            elif instance.state_tuple() != instance.persisted or instance.checkpoint_due(checkpoint_interval):
+                change.upserts.append(_state_row(rule.id, instance.fingerprint, instance.labels,
+                                                 instance.state_tuple(), instance.last_value,
+                                                 instance.recent.to_list()))
+                change.instances.append(instance)
+        
+        previous = instance_store.get_aggregate(rule.id)
+        start_times = [i.alert_start_time for i in instances.values() if i.alert_start_time]
+        alert_times = [i.last_alert_time for i in instances.values() if i.last_alert_time]
+        aggregate = (
+            aggregate_rule_state(instances),
+            sum(instance.send_count or 0 for instance in instances.values()),
+            min(start_times) if start_times else None,
+            max(alert_times) if alert_times else previous[3]
+        )
+        if aggregate != previous:
+            change.aggregate = aggregate
+            change.upserts.append(_state_row(rule.id, '', None, aggregate, None))
+        
+        if not change:
+            return
+        if write_buffer is not None:
+            write_buffer.stage_state_change(change)
+            return
+        write_state_changes(db, [change])
+        logger.debug("规则 %s 状态更新为: %s, 发送次数: %s", rule.name, aggregate[0], aggregate[1])
     except Exception as e:
         logger.error(f"更新规则状态失败: {e}")
         db.rollback()
 
+def _state_row(rule_id: int, fingerprint: str, labels: Optional[dict], state: tuple, last_value,
+               recent_values: Optional[List[float]] = None) -> dict:
+    """构造状态表记录"""
+    alert_state, send_count, alert_start_time, last_alert_time = state
+    return {
+        'rule_id': rule_id,
+        'fingerprint': fingerprint,
+        'labels': labels,
+        'alert_state': alert_state,
+        'send_count': send_count,
+        'alert_start_time': alert_start_time,
+        'last_alert_time': last_alert_time,
+        'last_value': str(last_value) if last_value is not None else None,
+        'recent_values': recent_values
+    }
+
 def reset_alert_counters(rule: AlertRule):
     """重置告警计数器"""
     rule.send_count = 0
     rule.alert_start_time = None
-    logger.debug(f"规则 {rule.name} 计数器已重置")
+    logger.debug("规则 %s 计数器已重置", rule.name)
 
 def check_and_reset_daily_counters(rule: AlertRule, current_time: datetime):
     """检查并重置每日计数器"""
@@ -298,142 +947,133 @@ def check_and_reset_daily_counters(rule: AlertRule, current_time: datetime):
         current_date = current_time.date()
         if current_date > last_date:
             reset_alert_counters(rule)
-            logger.debug(f"规则 {rule.name} 日期切换，计数器已重置")
+            logger.debug("规则 %s 日期切换，计数器已重置", rule.name)
 
-def parse_time_duration(duration_str: str) -> Optional[timedelta]:
+def query_prometheus(promql: str, eval_time: Optional[float] = None) -> Optional[List[dict]]:
     """
-    解析时间间隔字符串
-    支持格式: 5m, 1h, 30s, 2d
+    查询Prometheus数据，返回即时向量中每条序列的值和标签
+    查询失败返回None，查询成功但无数据返回空列表
+    eval_time: 评估时间戳(秒)，为空时使用Prometheus服务端当前时间
     """
-    if not duration_str:
-        return None
-    
-    duration_str = duration_str.strip().lower()
-    try:
-        if duration_str.endswith('s'):
-            return timedelta(seconds=int(duration_str[:-1]))
-        elif duration_str.endswith('m'):
-            return timedelta(minutes=int(duration_str[:-1]))
-        elif duration_str.endswith('h'):
-            return timedelta(hours=int(duration_str[:-1]))
-        elif duration_str.endswith('d'):
-            return timedelta(days=int(duration_str[:-1]))
-        else:
-            # 默认当作秒处理
-            return timedelta(seconds=int(duration_str))
-    except (ValueError, TypeError):
-        logger.error(f"无法解析时间间隔: {duration_str}")
-        return None
-
-def query_prometheus(promql: str) -> Optional[dict]:
-    """查询Prometheus数据，返回包含值和标签的完整结果"""
     try:
         url = f"{PROMETHEUS_URL}/api/v1/query"
         params = {'query': promql}
+        if eval_time is not None:
+            params['time'] = eval_time
         
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
+        # 共享连接池，长连接复用，网络错误时带抖动重试
+        data = prometheus_http.get_json(url, params)
         
         if data['status'] != 'success':
-            logger.error(f"Prometheus查询失败: {data}")
+            log_sampled("prometheus_query_failed", logging.ERROR, "Prometheus查询失败: %s", data)
             return None
         
+        result_type = data['data'].get('resultType')
         result = data['data']['result']
+        if result_type == 'scalar':
+            # 标量结果没有标签，视为一条序列
+            return [{'value': float(result[1]), 'labels': {}, 'timestamp': result[0]}]
         if not result:
-            logger.warning(f"Prometheus查询无结果: {promql}")
+            log_sampled("prometheus_query_empty", logging.WARNING, "Prometheus查询无结果: %s", promql)
+            return []
+        
+        return [
+            {
+                'value': float(item['value'][1]),
+                'labels': item.get('metric', {}),
+                'timestamp': item['value'][0]
+            }
+            for item in result
+        ]
+        
+    except Exception as e:
+        log_sampled("prometheus_query_error", logging.ERROR, "查询Prometheus异常: %s", e)
+        return None
+
+def query_prometheus_range(promql: str, start: float, end: float, step: int) -> Optional[List[dict]]:
+    """
+    Prometheus范围查询（用于补评估）
+    返回 [{'labels': 标签, 'timestamps': [时间戳], 'values': [值]}]，查询失败返回None
+    """
+    try:
+        url = f"{PROMETHEUS_URL}/api/v1/query_range"
+        params = {'query': promql, 'start': start, 'end': end, 'step': step}
+        data = prometheus_http.get_json(url, params)
+        
+        if data['status'] != 'success':
+            logger.error(f"Prometheus范围查询失败: {data}")
             return None
         
-        # 返回第一个结果的完整信息
-        first_result = result[0]
-        return {
-            'value': float(first_result['value'][1]),
-            'labels': first_result.get('metric', {}),
-            'timestamp': first_result['value'][0]
-        }
+        return [
+            {
+                'labels': item.get('metric', {}),
+                'timestamps': [float(point[0]) for point in item['values']],
+                'values': [float(point[1]) for point in item['values']]
+            }
+            for item in data['data']['result']
+        ]
         
     except Exception as e:
-        logger.error(f"查询Prometheus异常: {e}")
+        logger.error(f"Prometheus范围查询异常: {e}")
         return None
 
 def check_alert_condition(value: float, condition: str) -> bool:
     """检查告警条件是否满足"""
-    try:
-        # 解析条件，如 "> 80", "< 0.5", "== 100", "= 0"
-        condition = condition.strip()
-        
-        if condition.startswith('>='):
-            threshold = float(condition[2:].strip())
-            return value >= threshold
-        elif condition.startswith('<='):
-            threshold = float(condition[2:].strip())
-            return value <= threshold
-        elif condition.startswith('>'):
-            threshold = float(condition[1:].strip())
-            return value > threshold
-        elif condition.startswith('<'):
-            threshold = float(condition[1:].strip())
-            return value < threshold
-        elif condition.startswith('=='):
-            threshold = float(condition[2:].strip())
-            return value == threshold
-        elif condition.startswith('='):
-            threshold = float(condition[1:].strip())
-            return value == threshold
-        elif condition.startswith('!='):
-            threshold = float(condition[2:].strip())
-            return value != threshold
-        else:
-            logger.error(f"不支持的条件格式: {condition}")
-            return False
-            
-    except Exception as e:
-        logger.error(f"解析条件失败: {condition}, {e}")
-        return False
+    return check_alert_condition_vector([value], condition)[0]
+
+def check_alert_condition_vector(values: List[float], condition: str) -> List[bool]:
+    """对一组值检查告警条件，条件只解析一次"""
+    parsed = parse_alert_condition(condition)
+    if parsed is None:
+        return [False] * len(values)
+    compare, threshold = parsed
+    return [compare(value, threshold) for value in values]
 
-def send_alert_notification(template: AlertNotifyTemplate, alert_context: dict) -> dict:
+def send_alert_notification(template: CompiledTemplate, alert_context: dict) -> dict:
     """发送告警通知"""
+    started = time.monotonic()
     try:
-        logger.info(f"开始发送 {template.type} 类型告警通知")
-        logger.info(f"模板参数: {template.params}")
+        # 模板参数含SMTP密码等敏感信息，不输出到日志
+        logger.debug("开始发送告警通知: 模板=%s(%s)", template.name, template.type)
         
-        template_params = json.loads(template.params) if isinstance(template.params, str) else template.params
-        logger.info(f"解析后的模板参数: {template_params}")
+        # 编译模板的参数只读且被多个通知共享，渲染前复制一份（渲染函数会修改嵌套字段）
+        if isinstance(template.params, str):
+            template_params = json.loads(template.params)
+        else:
+            template_params = copy.deepcopy(dict(template.params))
         
         if template.type == 'email':
-            logger.info("处理邮件告警通知")
             # 渲染邮件模板
             subject, content = render_email_template(template_params, alert_context)
-            logger.info(f"邮件主题: {subject}")
-            logger.info(f"邮件内容: {content}")
+            logger.debug("邮件主题: %s", subject)
+            rendered = time.monotonic()
             
             # 准备邮件参数
             email_params = template_params.copy()
             email_params['subject'] = subject
             email_params['content'] = content
             
-            logger.info(f"邮件发送参数: {email_params}")
             result = send_email_msg(email_params)
-            logger.info(f"邮件发送结果: {result}")
+            logger.debug("邮件发送结果: %s", result)
+            _observe_notification(alert_context, started, rendered)
             return result
             
         elif template.type == 'http':
-            logger.info("处理HTTP告警通知")
             # 渲染HTTP模板
             http_params = render_http_template(template_params, alert_context)
-            logger.info(f"HTTP发送参数: {http_params}")
+            rendered = time.monotonic()
             result = send_http_msg(http_params)
-            logger.info(f"HTTP发送结果: {result}")
+            logger.debug("HTTP发送结果: %s", result)
+            _observe_notification(alert_context, started, rendered)
             return result
             
         elif template.type == 'lechat':
-            logger.info("处理乐聊告警通知")
             # 渲染乐聊模板
             lechat_params = render_lechat_template(template_params, alert_context)
-            logger.info(f"乐聊发送参数: {lechat_params}")
+            rendered = time.monotonic()
             result = send_lechat_msg(lechat_params)
-            logger.info(f"乐聊发送结果: {result}")
+            logger.debug("乐聊发送结果: %s", result)
+            _observe_notification(alert_context, started, rendered)
             return result
             
         else:
@@ -441,16 +1081,24 @@ def send_alert_notification(template: AlertNotifyTemplate, alert_context: dict)
             return {"success": False, "msg": f"不支持的通知类型: {template.type}"}
             
     except Exception as e:
-        logger.error(f"发送告警通知失败: {e}")
-        import traceback
-        logger.error(f"详细错误信息: {traceback.format_exc()}")
+        logger.exception(f"发送告警通知失败: {e}")
         return {"success": False, "msg": str(e)}
 
-def create_alert_history(db: Session, rule: AlertRule, alert_context: dict, 
-                        send_result: dict, current_value: float):
-    """创建告警历史记录"""
+def _observe_notification(alert_context: dict, started: float, rendered: float):
+    """记录通知渲染和下游调用耗时，合并通知计入组内每条告警的规则"""
+    contexts = alert_context.get('alerts') or [alert_context]
+    engine_metrics.observe_notification((ctx.get('rule_id') for ctx in contexts),
+                                        rendered - started, time.monotonic() - rendered)
+
+def create_alert_history(db: Session, rule: CompiledRule, alert_context: dict, current_value: float,
+                         outboxes: List[dict], write_buffer: Optional[StateWriteBuffer] = None,
+                         trigger_time: Optional[datetime] = None):
+    """
+    创建告警历史记录和对应的发件箱记录（每个通知模板一条，通知结果由发件箱发送后回填）
+    提供写缓冲时在轮次结束批量写入；trigger_time为告警触发时间（默认为写入时间）
+    """
     try:
-        history = AlertHistory(
+        history = dict(
             rule_id=rule.id,
             rule_name=rule.name,
             category=rule.category,
@@ -459,15 +1107,21 @@ def create_alert_history(db: Session, rule: AlertRule, alert_context: dict,
             message=alert_context['message'],
             alert_value=str(current_value),
             condition=rule.condition,
-            labels=rule.labels,
-            notified=send_result.get('success', False),
-            notified_at=datetime.now() if send_result.get('success', False) else None
+            labels=alert_context.get('labels') or (dict(rule.labels) if rule.labels else None),
+            notified=False,
+            notified_at=None
         )
+        if trigger_time is not None:
+            history['created_at'] = trigger_time
         
-        db.add(history)
-        db.commit()
+        if write_buffer is not None:
+            write_buffer.stage_notification(history, outboxes)
+        else:
+            enqueue_notifications(db, [(history, outboxes)])
+            db.commit()
+            notify_outbox.wake()
         
-        logger.info(f"告警历史记录已创建: rule_id={rule.id}, category={rule.category}, notified={history.notified}")
+        logger.debug("告警历史记录已创建: rule_id=%s, 发件箱 %s 条", rule.id, len(outboxes))
         
     except Exception as e:
         logger.error(f"创建告警历史失败: {e}")
@@ -475,6 +1129,7 @@ def create_alert_history(db: Session, rule: AlertRule, alert_context: dict,
 
 def start_alert_engine():
     """启动告警引擎"""
+    global _catchup_pending, _checkpoint_at
     try:
         scheduler = _get_scheduler()
         
@@ -483,11 +1138,20 @@ def start_alert_engine():
             logger.info("告警引擎已在运行中")
             return
         
-        # 添加定时任务
+        notify_dispatcher.reopen()
+        notify_outbox.start(send_alert_notification)
+        
+        # 第一轮评估前补评估停机期间错过的时间段
+        _catchup_pending = True
+        _checkpoint_at = None
+        
+        # 添加定时任务：按时间片运行，每次只评估到期的规则
+        settings = get_settings()
+        resolution = max(settings.alert_engine_resolution, 1)
         scheduler.add_job(
             alert_engine_job, 
             "interval", 
-            seconds=30, 
+            seconds=resolution, 
             id="alert_engine_job",  # 使用更明确的ID
             replace_existing=True
         )
@@ -495,7 +1159,7 @@ def start_alert_engine():
         # 启动调度器
         if not scheduler.running:
             scheduler.start()
-            logger.info("告警引擎定时任务已启动，间隔30秒")
+            logger.info(f"告警引擎定时任务已启动，时间片{resolution}秒，规则默认评估间隔{settings.alert_engine_interval}秒")
         
     except Exception as e:
         logger.error(f"启动告警引擎失败: {e}")
@@ -525,6 +1189,17 @@ def stop_alert_engine():
             
             # 优雅关闭：等待当前正在执行的任务完成，但不再接受新任务
             scheduler.shutdown(wait=True)
+            _shutdown_worker_pools()
+            # 停止领取发件箱记录，并等待已领取的通知发送完成
+            notify_outbox.stop()
+            notify_dispatcher.shutdown(timeout=10)
+            _leave_cluster()
+            rule_registry.reset()
+            notify_router.reset()
+            silence_store.reset()
+            instance_store.reset()
+            eval_scheduler.reset()
+            tick_monitor.reset()
             logger.info("告警引擎已停止")
         else:
             logger.info("告警引擎未在运行")
@@ -544,6 +1219,14 @@ def stop_alert_engine():
             logger.error(f"强制停止告警引擎也失败: {force_e}")
             scheduler = None
 
+def _leave_cluster():
+    """删除本实例的心跳记录，其他实例立即接管本实例负责的规则"""
+    db = SessionLocal()
+    try:
+        engine_cluster.leave(db)
+    finally:
+        db.close()
+
 def get_alert_engine_status() -> dict:
     """获取告警引擎状态"""
     global scheduler
@@ -555,8 +1238,25 @@ def get_alert_engine_status() -> dict:
                 "message": "调度器未初始化"
             }
             
+        with _inflight_lock:
+            inflight_count = len(_inflight_rules)
+            
         return {
             "running": scheduler.running,
+            "inflight_rules": inflight_count,
+            "alert_instances": instance_store.count(),
+            "compiled_rules": rule_cache.stats(),
+            "rule_registry": rule_registry.stats(),
+            "cluster": engine_cluster.stats(),
+            "notify_router": notify_router.stats(),
+            "silences": silence_store.stats(),
+            "eval_scheduler": eval_scheduler.stats(),
+            "tick_budget": tick_monitor.stats(),
+            "last_tick": _last_tick_stats,
+            "catchup": _last_catchup_stats,
+            "notify_queue": notify_dispatcher.stats(),
+            "notify_outbox": notify_outbox.stats(),
+            "notify_rate_limit": notify_rate_limiter.stats(),
             "jobs": [
                 {
                     "id": job.id,
@@ -571,4 +1271,28 @@ def get_alert_engine_status() -> dict:
             "running": False,
             "jobs": [],
             "error": str(e)
-        } 
\ No newline at end of file
+        }
+
+def get_alert_engine_metrics() -> str:
+    """告警引擎指标（Prometheus 文本格式）：各阶段耗时，以及时间片、发件箱的累计计数"""
+    running = scheduler is not None and scheduler.running
+    outbox_stats = notify_outbox.stats()
+    lines = [
+        "# HELP alert_engine_up 告警引擎是否在运行",
+        "# TYPE alert_engine_up gauge",
+        f"alert_engine_up {int(running)}",
+        "# HELP alert_engine_alert_instances 内存中的告警实例数",
+        "# TYPE alert_engine_alert_instances gauge",
+        f"alert_engine_alert_instances {instance_store.count()}",
+    ]
+    lines += counter_lines("alert_engine_ticks_total", "告警引擎时间片累计计数",
+                           tick_monitor.stats()["totals"], "event")
+    lines += counter_lines("alert_engine_notify_outbox_total", "通知发件箱累计计数",
+                           {key: value for key, value in outbox_stats.items()
+                            if isinstance(value, int) and not isinstance(value, bool)}, "event")
+    lines += engine_metrics.exposition()
+    return '\n'.join(lines) + '\n'
+
+def get_slow_rules(limit: int = 10, stage: str = 'total', order_by: str = 'avg') -> List[dict]:
+    """按某阶段耗时排序的最慢规则"""
+    return engine_metrics.slowest(limit, stage, order_by)
@@ -0,0 +1,121 @@
+"""
+规则评估调度器
+引擎按固定的时间片（alert_engine_resolution）运行，每个时间片只评估到期的规则：
+- 每条规则有自己的评估间隔（eval_interval，为空时使用 alert_engine_interval）
+- 到期时间保存在最小堆中，取到期规则的代价与规则总数无关
+- 每条规则按ID散列出固定的相位，到期时间对齐到 相位 + k*间隔，
+  相同间隔的规则分散在整个间隔内，不会集中在同一秒查询Prometheus
+"""
+
+import heapq
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+from app.config import get_settings
+
+
+def rule_phase(rule_id: int, interval: int) -> int:
+    """规则在评估间隔内的固定相位(秒)，跨进程、跨重启保持一致"""
+    return zlib.crc32(str(rule_id).encode('utf-8')) % max(interval, 1)
+
+
+def next_due_time(rule_id: int, interval: int, now: float) -> float:
+    """now之后（不含）第一个对齐到规则相位的评估时间（Unix时间戳）"""
+    phase = rule_phase(rule_id, interval)
+    slots = int((now - phase) // interval) + 1
+    return slots * interval + phase
+
+
+class EvalScheduler:
+    """基于最小堆的规则到期调度，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (到期时间, 规则ID)，规则间隔变化或移除后旧条目惰性丢弃
+        self._heap: List[tuple] = []
+        # rule_id -> (评估间隔, 当前有效的到期时间)
+        self._rules: Dict[int, tuple] = {}
+        self._stats = {"last_due": 0, "last_lag_seconds": 0.0}
+
+    def effective_interval(self, eval_interval: Optional[int]) -> int:
+        """规则实际使用的评估间隔：不小于调度时间片"""
+        settings = get_settings()
+        interval = eval_interval or settings.alert_engine_interval
+        return max(int(interval), settings.alert_engine_resolution, 1)
+
+    def sync(self, rules: Iterable, now: Optional[float] = None):
+        """按当前启用的规则更新调度：新增规则排入下一个对齐时间，间隔变化的规则重新排期"""
+        now = time.time() if now is None else now
+        with self._lock:
+            current = set()
+            for rule in rules:
+                current.add(rule.id)
+                interval = self.effective_interval(getattr(rule, 'eval_interval', None))
+                entry = self._rules.get(rule.id)
+                if entry is not None and entry[0] == interval:
+                    continue
+                due = next_due_time(rule.id, interval, now)
+                self._rules[rule.id] = (interval, due)
+                heapq.heappush(self._heap, (due, rule.id))
+            for rule_id in set(self._rules) - current:
+                del self._rules[rule_id]
+
+    def pop_due(self, now: Optional[float] = None) -> List[int]:
+        """取出到期的规则ID并安排下一次评估；错过多个周期的规则只评估一次"""
+        now = time.time() if now is None else now
+        due_ids = []
+        max_lag = 0.0
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due, rule_id = heapq.heappop(self._heap)
+                entry = self._rules.get(rule_id)
+                if entry is None or entry[1] != due:
+                    continue  # 已移除或已重新排期的旧条目
+                interval = entry[0]
+                next_due = next_due_time(rule_id, interval, now)
+                self._rules[rule_id] = (interval, next_due)
+                heapq.heappush(self._heap, (next_due, rule_id))
+                due_ids.append(rule_id)
+                max_lag = max(max_lag, now - due)
+            self._stats["last_due"] = len(due_ids)
+            self._stats["last_lag_seconds"] = round(max_lag, 3)
+            # 旧条目过多时重建堆
+            if len(self._heap) > 2 * len(self._rules) + 64:
+                self._heap = [(due, rule_id) for rule_id, (_, due) in self._rules.items()]
+                heapq.heapify(self._heap)
+        return due_ids
+
+    def defer(self, rule_ids: Iterable[int], now: Optional[float] = None):
+        """预算不足未评估的规则立即重新到期，下一个时间片优先评估"""
+        now = time.time() if now is None else now
+        with self._lock:
+            for rule_id in rule_ids:
+                entry = self._rules.get(rule_id)
+                if entry is None:
+                    continue
+                self._rules[rule_id] = (entry[0], now)
+                heapq.heappush(self._heap, (now, rule_id))
+
+    def reset(self):
+        with self._lock:
+            self._heap = []
+            self._rules = {}
+
+    def stats(self) -> dict:
+        with self._lock:
+            next_due = min((due for _, due in self._rules.values()), default=None)
+            intervals: Dict[int, int] = {}
+            for interval, _ in self._rules.values():
+                intervals[interval] = intervals.get(interval, 0) + 1
+            return {
+                "rules": len(self._rules),
+                "intervals": intervals,
+                "next_due_in_seconds": round(next_due - time.time(), 3) if next_due is not None else None,
+                **self._stats
+            }
+
+
+# 全局规则评估调度器
+eval_scheduler = EvalScheduler()
@@ -0,0 +1,135 @@
+"""
+告警抑制（规则依赖）
+规则可以配置父规则（parent_rule_id）和匹配标签（inhibit_labels）。父规则有告警中的序列时，
+子规则中匹配标签值相同的序列被抑制：照常检查条件，但不发送通知，实例状态为 inhibited；
+父规则恢复后仍满足条件的序列按正常流程告警。
+- 未配置匹配标签时，父规则任一序列告警即抑制整条子规则；开启 inhibit_skip_eval 的规则
+  此时直接跳过评估，不再查询Prometheus
+- 被抑制或命中静默的序列同样视为告警中，抑制沿依赖链传递（主机宕机 -> DataNode -> 磁盘）
+- 同一轮内父规则先于子规则评估，子规则评估前等待父规则完成，父子同时触发时子规则也不会发出通知
+"""
+
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.alert.services.instance_store import instance_store
+from app.config import get_settings
+from app.utils.logger import logger
+
+# 父规则处于这些状态的序列会抑制子规则
+FIRING_STATES = frozenset({'alerting', 'silenced', 'inhibited', 'muted'})
+
+
+def find_dependency_cycle(rule_id: Optional[int], parent_id: Optional[int],
+                          parents: Dict[int, Optional[int]]) -> bool:
+    """沿父规则链向上查找，判断把 rule_id 的父规则设置为 parent_id 是否会形成环"""
+    seen = set()
+    current = parent_id
+    while current is not None and current not in seen:
+        if current == rule_id:
+            return True
+        seen.add(current)
+        current = parents.get(current)
+    return current is not None
+
+
+class InhibitionIndex:
+    """
+    单轮评估的抑制索引，线程安全
+    子规则第一次查询时等待本轮的父规则评估完成，再按父规则告警中的序列生成匹配集合并缓存
+    """
+
+    def __init__(self, rules: Iterable):
+        self._lock = threading.Lock()
+        self._rules = {rule.id: rule for rule in rules}
+        self._parents = {rule.parent_rule_id for rule in self._rules.values() if rule.parent_rule_id}
+        # 本轮评估的父规则 -> 评估完成事件
+        self._running: Dict[int, threading.Event] = {}
+        # rule_id -> (匹配标签名, 父规则告警中序列的标签值集合)，父规则没有告警时为None
+        self._entries: Dict[int, Optional[Tuple[Tuple[str, ...], Set[tuple]]]] = {}
+        self._stats = {"inhibited_rules": 0, "skipped_rules": 0, "inhibited_series": 0}
+
+    def order(self, rules: List) -> List:
+        """按依赖深度稳定排序，父规则先于子规则评估（同一深度内保持原有优先级顺序）"""
+        return sorted(rules, key=self._depth)
+
+    def expect(self, rules: Iterable):
+        """登记本轮将要评估的规则，其中的父规则完成前子规则等待"""
+        with self._lock:
+            for rule in rules:
+                if rule.id in self._parents:
+                    self._running[rule.id] = threading.Event()
+
+    def mark_done(self, rule_id: int):
+        """规则本轮评估完成（或不再评估）"""
+        event = self._running.get(rule_id)
+        if event is not None:
+            event.set()
+
+    def release(self):
+        """本轮结束，唤醒所有仍在等待的子规则"""
+        for event in list(self._running.values()):
+            event.set()
+
+    def skip_evaluation(self, rule) -> bool:
+        """整条规则被抑制且配置了跳过评估"""
+        if not rule.inhibit_skip_eval or rule.inhibit_labels:
+            return False
+        if self._entry(rule) is None:
+            return False
+        self._count("skipped_rules")
+        return True
+
+    def series_filter(self, rule) -> Optional[Callable[[dict], bool]]:
+        """返回判断序列是否被抑制的函数，规则不受抑制时返回None"""
+        entry = self._entry(rule)
+        if entry is None:
+            return None
+        names, keys = entry
+
+        def inhibited(labels: dict) -> bool:
+            if tuple(labels.get(name) for name in names) in keys:
+                self._count("inhibited_series")
+                return True
+            return False
+        return inhibited
+
+    def _entry(self, rule) -> Optional[Tuple[Tuple[str, ...], Set[tuple]]]:
+        parent_id = rule.parent_rule_id
+        if not parent_id or parent_id not in self._rules:
+            return None
+        with self._lock:
+            if rule.id in self._entries:
+                return self._entries[rule.id]
+            event = self._running.get(parent_id)
+        if event is not None and not event.wait(max(get_settings().alert_engine_tick_budget, 1)):
+            logger.warning(f"等待父规则 {parent_id} 评估超时，规则 {rule.id} 按父规则当前状态判断抑制")
+
+        firing = instance_store.get_labels_in_states(parent_id, FIRING_STATES)
+        entry = None
+        if firing:
+            names = tuple(rule.inhibit_labels or ())
+            entry = (names, {tuple(labels.get(name) for name in names) for labels in firing})
+        with self._lock:
+            if rule.id not in self._entries:
+                self._entries[rule.id] = entry
+                self._stats["inhibited_rules"] += int(entry is not None)
+            return self._entries[rule.id]
+
+    def _depth(self, rule) -> int:
+        depth = 0
+        seen = {rule.id}
+        parent_id = rule.parent_rule_id
+        while parent_id in self._rules and parent_id not in seen:
+            seen.add(parent_id)
+            depth += 1
+            parent_id = self._rules[parent_id].parent_rule_id
+        return depth
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
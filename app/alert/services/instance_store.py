@@ -0,0 +1,299 @@
+"""
+告警实例存储
+一条规则的PromQL可能返回多条序列，每条序列按标签指纹作为一个独立的告警实例，
+拥有各自的状态、发送计数和告警时间，持久化在 alert_rule_state 表中（按规则ID+指纹），
+指纹为空的记录保存所有实例的汇总结果。
+"""
+
+import hashlib
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from app.alert.services import rule_state_service
+from app.alert.services.rule_compiler import CompiledRule
+from app.utils.logger import logger
+
+# 实例状态严重程度，用于汇总规则状态
+STATE_SEVERITY = {'ok': 0, 'pending': 1, 'inhibited': 2, 'muted': 3, 'silenced': 4, 'alerting': 5}
+
+# 每个实例保留的最近监控值个数
+RECENT_VALUES_SIZE = 10
+
+
+def label_fingerprint(labels: Optional[dict]) -> str:
+    """计算标签集合的稳定指纹（与标签顺序无关，跨进程一致）"""
+    if not labels:
+        return '0' * 16
+    digest = hashlib.sha1()
+    for key in sorted(labels):
+        digest.update(str(key).encode('utf-8'))
+        digest.update(b'\x00')
+        digest.update(str(labels[key]).encode('utf-8'))
+        digest.update(b'\x01')
+    return digest.hexdigest()[:16]
+
+
+class RingBuffer:
+    """固定长度的监控值环形缓冲（array存储，按时间从旧到新读取）"""
+
+    __slots__ = ('_values', '_next', '_count', 'dirty')
+
+    def __init__(self, size: int = RECENT_VALUES_SIZE, values: Optional[List[float]] = None):
+        self._values = array('d', [0.0] * size)
+        self._next = 0
+        self._count = 0
+        # 自上次检查点以来是否有新值
+        self.dirty = False
+        for value in values or []:
+            self.append(value)
+        self.dirty = False
+
+    def append(self, value: float):
+        self._values[self._next] = value
+        self._next = (self._next + 1) % len(self._values)
+        self._count = min(self._count + 1, len(self._values))
+        self.dirty = True
+
+    def to_list(self) -> List[float]:
+        size = len(self._values)
+        start = (self._next - self._count) % size
+        return [self._values[(start + i) % size] for i in range(self._count)]
+
+    def __len__(self):
+        return self._count
+
+
+class AlertInstance:
+    """
+    单条序列的告警实例
+    状态字段与AlertRule同名，规则配置通过属性代理到所属的编译规则，
+    因此可以直接传入 determine_alert_state 等状态机函数
+    pending 状态下 alert_start_time 为条件首次满足的时间，满足 for_duration 后转为告警
+    """
+
+    __slots__ = ('rule', 'rule_id', 'fingerprint', 'labels', 'alert_state', 'send_count',
+                 'alert_start_time', 'last_alert_time', 'last_value', 'recent', 'persisted', 'checkpointed_at')
+
+    def __init__(self, rule_id: int, fingerprint: str, labels: dict, rule: Optional[CompiledRule] = None):
+        self.rule = rule
+        self.rule_id = rule_id
+        self.fingerprint = fingerprint
+        self.labels = labels
+        self.alert_state = 'ok'
+        self.send_count = 0
+        self.alert_start_time: Optional[datetime] = None
+        self.last_alert_time: Optional[datetime] = None
+        self.last_value: Optional[float] = None
+        self.recent = RingBuffer()
+        # 状态表中已保存的状态，None表示没有记录
+        self.persisted: Optional[tuple] = None
+        self.checkpointed_at = time.monotonic()
+
+    def state_tuple(self) -> tuple:
+        """需要持久化的状态字段，用于判断是否需要写库"""
+        return (self.alert_state, self.send_count or 0, self.alert_start_time, self.last_alert_time)
+
+    def record_value(self, value: float):
+        self.last_value = value
+        self.recent.append(value)
+
+    def checkpoint_due(self, interval: float) -> bool:
+        """最近监控值有变化且距上次检查点超过间隔"""
+        return self.recent.dirty and time.monotonic() - self.checkpointed_at >= interval
+
+    @property
+    def name(self) -> str:
+        return f"{self.rule.name}[{self.fingerprint}]"
+
+    @property
+    def for_delta(self):
+        return self.rule.for_delta
+
+    @property
+    def duration(self):
+        return self.rule.duration
+
+    @property
+    def max_send_count(self):
+        return self.rule.max_send_count
+
+    @property
+    def suppress(self):
+        return self.rule.suppress
+
+    @property
+    def repeat(self):
+        return self.rule.repeat
+
+    @property
+    def duration_delta(self):
+        return self.rule.duration_delta
+
+    @property
+    def suppress_delta(self):
+        return self.rule.suppress_delta
+
+    @property
+    def repeat_delta(self):
+        return self.rule.repeat_delta
+
+
+# 没有汇总记录时的规则状态
+EMPTY_AGGREGATE = ('ok', 0, None, None)
+
+
+class InstanceStore:
+    """
+    按规则ID组织的告警实例内存存储
+    引擎启动时从 alert_rule_state 表恢复一次，之后以内存为准，只把变化的实例写回状态表
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._instances: Dict[int, Dict[str, AlertInstance]] = {}
+        # 状态表中规则汇总记录的当前值 (alert_state, send_count, alert_start_time, last_alert_time)
+        self._aggregates: Dict[int, tuple] = {}
+        self._loaded = False
+
+    def ensure_loaded(self, db: Session):
+        """首次评估前从状态表恢复告警实例（兼容重启）"""
+        with self._lock:
+            if self._loaded:
+                return
+            rows = rule_state_service.load_states(db)
+            for row in rows:
+                self._restore(row)
+            self._loaded = True
+        logger.info(f"从状态表恢复告警实例: {len(rows)} 条记录")
+
+    def reload_rules(self, db: Session, rule_ids: List[int]):
+        """规则从其他引擎实例迁入时，用状态表中的最新状态替换内存中的实例"""
+        rows = rule_state_service.load_states(db, rule_ids)
+        with self._lock:
+            if not self._loaded:
+                # 尚未恢复，首次评估前统一加载
+                return
+            for rule_id in rule_ids:
+                self._instances.pop(rule_id, None)
+                self._aggregates.pop(rule_id, None)
+            for row in rows:
+                self._restore(row)
+        logger.info(f"从状态表重新加载规则 {len(rule_ids)} 条的告警实例: {len(rows)} 条记录")
+
+    def _restore(self, row):
+        """按状态表记录恢复实例或汇总状态，调用方持有锁"""
+        state = (row.alert_state or 'ok', row.send_count or 0, row.alert_start_time, row.last_alert_time)
+        if row.fingerprint == rule_state_service.RULE_AGGREGATE_FINGERPRINT:
+            self._aggregates[row.rule_id] = state
+            return
+        instance = AlertInstance(row.rule_id, row.fingerprint, row.labels or {})
+        instance.alert_state, instance.send_count, instance.alert_start_time, instance.last_alert_time = state
+        instance.recent = RingBuffer(values=row.recent_values)
+        instance.persisted = state
+        self._instances.setdefault(row.rule_id, {})[row.fingerprint] = instance
+
+    def apply_manual_requests(self, db: Session, rule_ids: Optional[Set[int]] = None):
+        """
+        应用界面上的确认(silenced)/解决(ok)请求到告警中的实例，并清除已应用的请求
+        rule_ids: 本实例负责的规则，多实例部署时只应用这些规则的请求，其余由负责的实例应用
+        """
+        requests = rule_state_service.fetch_manual_requests(db)
+        if rule_ids is not None:
+            requests = {rule_id: state for rule_id, state in requests.items() if rule_id in rule_ids}
+        if not requests:
+            return
+        with self._lock:
+            for rule_id, state in requests.items():
+                logger.info(f"规则 {rule_id} 状态被界面修改为 {state}，同步到告警实例")
+                for instance in self._instances.get(rule_id, {}).values():
+                    if instance.alert_state != 'alerting':
+                        continue
+                    instance.alert_state = state
+                    if state == 'ok':
+                        instance.send_count = 0
+                        instance.alert_start_time = None
+                # 界面已直接修改汇总记录
+                aggregate = self._aggregates.get(rule_id, EMPTY_AGGREGATE)
+                self._aggregates[rule_id] = (state,) + aggregate[1:]
+        rule_state_service.clear_manual_requests(db, requests)
+        db.commit()
+
+    def get_rule_instances(self, rule_id: int) -> Dict[str, AlertInstance]:
+        """获取规则的全部实例"""
+        with self._lock:
+            return self._instances.setdefault(rule_id, {})
+
+    def get_labels_in_states(self, rule_id: int, states) -> List[dict]:
+        """规则中处于指定状态的实例标签（副本，可在其他线程评估该规则时安全使用）"""
+        with self._lock:
+            return [
+                dict(instance.labels) for instance in self._instances.get(rule_id, {}).values()
+                if instance.alert_state in states
+            ]
+
+    def create_instance(self, compiled: CompiledRule, fingerprint: str, labels: dict) -> AlertInstance:
+        """为新出现的序列创建实例"""
+        instance = AlertInstance(compiled.id, fingerprint, labels, compiled)
+        with self._lock:
+            self._instances.setdefault(compiled.id, {})[fingerprint] = instance
+        return instance
+
+    def prune(self, rule_id: int):
+        """移除已恢复正常的实例，只保留需要继续跟踪的序列"""
+        with self._lock:
+            instances = self._instances.get(rule_id)
+            if not instances:
+                return
+            for fingerprint in [fp for fp, inst in instances.items() if inst.alert_state == 'ok']:
+                del instances[fingerprint]
+
+    def get_aggregate(self, rule_id: int) -> tuple:
+        """状态表中规则汇总记录的当前值"""
+        with self._lock:
+            return self._aggregates.get(rule_id, EMPTY_AGGREGATE)
+
+    def mark_persisted(self, rule_id: int, aggregate: Optional[tuple], instances: List[AlertInstance]):
+        """状态写库成功后记录已保存的值"""
+        with self._lock:
+            if aggregate is not None:
+                self._aggregates[rule_id] = aggregate
+            checkpointed_at = time.monotonic()
+            for instance in instances:
+                instance.persisted = instance.state_tuple() if instance.alert_state != 'ok' else None
+                instance.recent.dirty = False
+                instance.checkpointed_at = checkpointed_at
+
+    def remove_rule(self, rule_id: int):
+        """规则删除或禁用时清理实例"""
+        with self._lock:
+            self._instances.pop(rule_id, None)
+            self._aggregates.pop(rule_id, None)
+
+    def reset(self):
+        """清空内存状态，下次评估重新从状态表恢复"""
+        with self._lock:
+            self._instances = {}
+            self._aggregates = {}
+            self._loaded = False
+
+    def count(self) -> int:
+        with self._lock:
+            return sum(len(instances) for instances in self._instances.values())
+
+
+def aggregate_rule_state(instances: Dict[str, AlertInstance]) -> str:
+    """汇总实例状态：任一实例告警则规则告警，其次为静默、维护静默(muted)、被抑制(inhibited)、等待(pending)"""
+    state = 'ok'
+    for instance in instances.values():
+        if STATE_SEVERITY.get(instance.alert_state, 0) > STATE_SEVERITY[state]:
+            state = instance.alert_state
+    return state
+
+
+# 全局实例存储
+instance_store = InstanceStore()
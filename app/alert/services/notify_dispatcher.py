@@ -0,0 +1,185 @@
+"""
+告警通知分发队列
+规则评估只把通知任务放入队列即返回，由独立的发送线程完成投递：
+- 每个通知渠道（email/http/lechat）有自己的队列和发送线程，线程数即该渠道的并发上限，
+  慢的SMTP服务器不会占用其他渠道的发送能力
+- 队列总容量有上限，队列满时任务直接以失败结果回调，并记录溢出次数
+- 投递完成（成功或失败）后调用结果回调，由回调写入告警历史的通知结果
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from app.config import get_settings
+from app.utils.logger import logger
+
+# 停止发送线程的哨兵
+_STOP = object()
+
+
+class NotifyJob:
+    """一条待发送的通知"""
+
+    __slots__ = ('channel', 'send', 'callback', 'description', 'enqueued_at')
+
+    def __init__(self, channel: str, send: Callable[[], dict], callback: Optional[Callable[[dict], None]],
+                 description: str = ''):
+        self.channel = channel
+        self.send = send
+        self.callback = callback
+        self.description = description
+        self.enqueued_at = time.monotonic()
+
+
+class _ChannelLane:
+    """单个通知渠道的队列和发送线程"""
+
+    def __init__(self, channel: str, concurrency: int, capacity: int):
+        self.channel = channel
+        self.queue: queue.Queue = queue.Queue(maxsize=capacity)
+        self.threads = [
+            threading.Thread(target=self._worker, name=f"alert-notify-{channel}-{i}", daemon=True)
+            for i in range(concurrency)
+        ]
+        self._lock = threading.Lock()
+        self.stats = {
+            "concurrency": concurrency,
+            "capacity": capacity,
+            "enqueued": 0,
+            "delivered": 0,
+            "failed": 0,
+            "overflow": 0,
+            "in_flight": 0,
+            "max_queue_depth": 0,
+            "max_wait_seconds": 0.0
+        }
+        for thread in self.threads:
+            thread.start()
+
+    def offer(self, job: NotifyJob) -> bool:
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            self._count("overflow")
+            return False
+        with self._lock:
+            self.stats["enqueued"] += 1
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.queue.qsize())
+        return True
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            if job is _STOP:
+                return
+            wait_seconds = time.monotonic() - job.enqueued_at
+            with self._lock:
+                self.stats["in_flight"] += 1
+                self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], round(wait_seconds, 3))
+            try:
+                result = job.send()
+            except Exception as e:
+                logger.error(f"发送告警通知异常: {job.description}, {e}")
+                result = {"success": False, "msg": str(e)}
+            with self._lock:
+                self.stats["in_flight"] -= 1
+                self.stats["delivered" if result.get("success") else "failed"] += 1
+            _invoke_callback(job, result)
+
+    def stop(self, timeout: float):
+        """发送完已入队的通知后停止，超时仍未完成的线程不再等待"""
+        deadline = time.monotonic() + timeout
+        for _ in self.threads:
+            self.queue.put(_STOP)
+        for thread in self.threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        return sum(1 for thread in self.threads if thread.is_alive())
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "queued": self.queue.qsize()}
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+
+def _invoke_callback(job: NotifyJob, result: dict):
+    if job.callback is None:
+        return
+    try:
+        job.callback(result)
+    except Exception as e:
+        logger.error(f"告警通知结果回调失败: {job.description}, {e}")
+
+
+class NotifyDispatcher:
+    """按渠道分队列的通知分发器，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lanes: Dict[str, _ChannelLane] = {}
+        self._closed = False
+
+    def _channel_concurrency(self, channel: str) -> int:
+        settings = get_settings()
+        limits = {
+            'email': settings.alert_notify_email_concurrency,
+            'http': settings.alert_notify_http_concurrency,
+            'lechat': settings.alert_notify_lechat_concurrency,
+        }
+        return max(limits.get(channel, 1), 1)
+
+    def _get_lane(self, channel: str) -> _ChannelLane:
+        with self._lock:
+            lane = self._lanes.get(channel)
+            if lane is None:
+                capacity = max(get_settings().alert_notify_queue_size, 1)
+                lane = _ChannelLane(channel, self._channel_concurrency(channel), capacity)
+                self._lanes[channel] = lane
+            return lane
+
+    def submit(self, channel: str, send: Callable[[], dict],
+               callback: Optional[Callable[[dict], None]] = None, description: str = '') -> bool:
+        """
+        提交一条通知，立即返回
+        send: 实际发送函数，返回 {"success": bool, "msg": str}
+        callback: 投递完成后以发送结果调用；队列已满或分发器已停止时以带 rejected 标记的失败结果立即调用，
+                  调用方可据此重新排期而不计为一次发送失败
+        返回是否成功入队
+        """
+        job = NotifyJob(channel, send, callback, description)
+        with self._lock:
+            closed = self._closed
+        if not closed and self._get_lane(channel).offer(job):
+            return True
+
+        reason = "通知分发器已停止" if closed else f"{channel} 通知队列已满"
+        logger.warning(f"{reason}，放弃发送: {job.description}")
+        _invoke_callback(job, {"success": False, "rejected": True, "msg": reason})
+        return False
+
+    def shutdown(self, timeout: float = 10):
+        """停止接收新通知，等待已入队通知发送完成"""
+        with self._lock:
+            self._closed = True
+            lanes, self._lanes = list(self._lanes.values()), {}
+        alive = sum(lane.stop(timeout) for lane in lanes)
+        if alive:
+            logger.warning(f"{alive} 个通知发送线程在 {timeout} 秒内未结束，转入后台继续发送")
+
+    def reopen(self):
+        """引擎重新启动时恢复接收通知"""
+        with self._lock:
+            self._closed = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            lanes = dict(self._lanes)
+        return {channel: lane.snapshot() for channel, lane in lanes.items()}
+
+
+# 全局通知分发器
+notify_dispatcher = NotifyDispatcher()
@@ -0,0 +1,105 @@
+"""
+告警通知分组
+同一通知模板（可按 group_by 标签细分）的告警合并为一条通知发送，减少下游调用次数和邮件数量：
+- group_wait: 分组内第一条告警入箱后等待的时间，期间到达的同组告警一起发送
+- group_interval: 同一分组两次发送的最小间隔，间隔内新到达的告警等到下一次一起发送
+分组参数在模板 params 中配置（group_by/group_wait/group_interval），未配置时使用全局配置，group_wait 为0表示不分组。
+分组在发件箱中完成（记录 group_key 和到期时间），进程重启不丢失；合并后的通知保留组内每条告警的详情，
+组内只有一条告警时按原格式发送。
+"""
+
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from app.alert.services.rule_compiler import CompiledTemplate
+from app.config import get_settings
+
+# 合并通知时按最高等级显示
+LEVEL_ORDER = {'critical': 6, 'error': 5, 'high': 4, 'warning': 3, 'medium': 2, 'low': 1, 'info': 0}
+
+# 合并通知的规则名称最多列出的规则数
+MAX_LISTED_RULES = 5
+
+# 合并通知的当前值、消息最多列出的告警数，其余显示为 "+N条告警"
+MAX_LISTED_ALERTS = 20
+
+
+def group_settings(template: Optional[CompiledTemplate]) -> Optional[Tuple[Tuple[str, ...], int, int]]:
+    """模板的分组参数 (group_by, group_wait, group_interval)，不分组时返回None"""
+    if template is None:
+        return None
+    settings = get_settings()
+    params = template.params
+    wait = params.get('group_wait', settings.alert_notify_group_wait)
+    interval = params.get('group_interval', settings.alert_notify_group_interval)
+    try:
+        wait, interval = int(wait), int(interval)
+    except (TypeError, ValueError):
+        return None
+    if wait <= 0:
+        return None
+    return tuple(params.get('group_by') or ()), wait, max(interval, 0)
+
+
+def notify_group(template: Optional[CompiledTemplate], labels: Dict[str, str],
+                 now: datetime) -> Tuple[Optional[str], Optional[datetime]]:
+    """
+    告警在该模板下的分组，返回 (group_key, 最早发送时间)；模板不分组时返回 (None, None)
+    labels 为告警标签（alert_labels）
+    """
+    settings = group_settings(template)
+    if settings is None:
+        return None, None
+    group_by, wait, _ = settings
+    values = [template.id] + [labels.get(name, '') for name in group_by]
+    key = hashlib.md5(json.dumps(values, ensure_ascii=False).encode('utf-8')).hexdigest()
+    return key, now + timedelta(seconds=wait)
+
+
+def merge_contexts(contexts: List[dict]) -> dict:
+    """
+    把同组告警的上下文合并为一条通知的上下文，字段与单条告警相同，模板无需修改：
+    rule_name/current_value/message/description 汇总组内全部告警，level 取最高等级，
+    另提供 alerts（每条告警的上下文）和 alert_count 供模板使用
+    """
+    if len(contexts) == 1:
+        return contexts[0]
+    contexts = sorted(contexts, key=lambda ctx: ctx.get('trigger_time', ''))
+    first = contexts[0]
+    rule_names = list(dict.fromkeys(ctx.get('rule_name', '') for ctx in contexts))
+    rule_name = ', '.join(rule_names[:MAX_LISTED_RULES])
+    if len(rule_names) > MAX_LISTED_RULES:
+        rule_name += f" 等{len(rule_names)}条规则"
+    first_time, last_time = first.get('trigger_time', ''), contexts[-1].get('trigger_time', '')
+
+    merged = dict(first)
+    merged.update({
+        'rule_name': f"{rule_name}（{len(contexts)}条告警）",
+        'level': max((ctx.get('level') or '' for ctx in contexts), key=lambda level: LEVEL_ORDER.get(level.lower(), -1)),
+        'current_value': ', '.join(_listed(f"{ctx.get('current_value')}{_label_suffix(ctx)}" for ctx in contexts)),
+        'trigger_time': first_time if first_time == last_time else f"{first_time} ~ {last_time}",
+        'message': '\n'.join(_listed(f"{ctx.get('message', '')}{_label_suffix(ctx)}" for ctx in contexts)),
+        'description': '\n'.join(dict.fromkeys(ctx.get('description') or '' for ctx in contexts)).strip(),
+        'idempotency_key': hashlib.md5(
+            ','.join(ctx.get('idempotency_key', '') for ctx in contexts).encode('utf-8')
+        ).hexdigest(),
+        'alert_count': len(contexts),
+        'alerts': contexts,
+    })
+    return merged
+
+
+def _listed(items) -> List[str]:
+    """最多列出 MAX_LISTED_ALERTS 条，其余汇总为一项"""
+    items = list(items)
+    if len(items) <= MAX_LISTED_ALERTS:
+        return items
+    return items[:MAX_LISTED_ALERTS] + [f"+{len(items) - MAX_LISTED_ALERTS}条告警"]
+
+
+def _label_suffix(context: dict) -> str:
+    labels = context.get('labels') or {}
+    text = ', '.join(f"{key}={value}" for key, value in labels.items() if not str(key).startswith('__'))
+    return f" ({text})" if text else ''
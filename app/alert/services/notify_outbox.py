@@ -0,0 +1,408 @@
+"""
+告警通知发件箱
+需要发送的通知先与告警历史在同一事务中写入 alert_notify_outbox 表，再由发件箱线程分批领取、
+交给通知分发队列发送：
+- 领取使用 SELECT ... FOR UPDATE SKIP LOCKED，多个进程可以同时消费而不会重复领取
+- 领取时记录租约，进程重启后租约过期的记录会被重新领取，待发送的通知不会丢失
+- 发送失败按指数退避重试，超过最大次数标记为failed；分发队列已满或分发器已停止时未实际发送，
+  短暂延迟后重新领取，不计入发送次数
+- 幂等键由 规则+序列+触发时间+模板 生成，同一条告警重复入箱时只保留一条
+- 带分组键的记录（见 notify_grouping）按组领取，同组记录合并为一条通知发送，
+  距同组上次发送不足 group_interval 时推迟到间隔结束
+- 每个模板按令牌桶限流（见 notify_rate_limiter），令牌不足时超出的通知合并为一条汇总通知，
+  没有令牌时推迟到下一个令牌可用
+"""
+
+import hashlib
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from app.models import SessionLocal, AlertHistory, AlertNotifyOutbox
+from app.alert.services.engine_cluster import engine_cluster
+from app.alert.services.notify_dispatcher import notify_dispatcher
+from app.alert.services.notify_grouping import group_settings, merge_contexts
+from app.alert.services.notify_rate_limiter import notify_rate_limiter
+from app.alert.services.rule_compiler import CompiledTemplate, rule_cache
+from app.config import get_settings
+from app.utils.logger import logger
+
+# 分发队列拒绝（队列已满、分发器已停止）后重新领取的等待时间(秒)
+REJECTED_RETRY_DELAY = 5
+
+
+def make_idempotency_key(rule_id: int, fingerprint: str, trigger_time: datetime, template_id: int) -> str:
+    """同一规则、同一序列、同一触发时间发往同一模板的通知只发送一次"""
+    raw = f"{rule_id}|{fingerprint}|{trigger_time.isoformat()}|{template_id}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """第attempts次失败后的重试等待时间：指数退避，上限封顶，并加入±20%抖动避免集中重试"""
+    settings = get_settings()
+    base = max(settings.alert_notify_retry_base, 1)
+    delay = min(base * (2 ** max(attempts - 1, 0)), max(settings.alert_notify_retry_max, base))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def enqueue_notifications(db: Session, items: List[Tuple[dict, List[dict]]]) -> Tuple[int, int]:
+    """
+    写入告警历史和发件箱记录，items为 (告警历史字段, 发件箱字段列表) 列表，
+    一条告警按通知路由发送到多个模板时对应多条发件箱记录
+    幂等键已存在的发件箱记录直接跳过，全部重复时不写告警历史；调用方负责提交事务
+    发件箱字段可以带 next_attempt_at（分组等待结束时间），未提供时立即发送
+    返回 (写入条数, 重复跳过条数)
+    """
+    if not items:
+        return 0, 0
+    keys = [outbox['idempotency_key'] for _, outboxes in items for outbox in outboxes]
+    existing = {
+        row.idempotency_key for row in
+        db.query(AlertNotifyOutbox.idempotency_key).filter(AlertNotifyOutbox.idempotency_key.in_(keys)).all()
+    }
+
+    accepted = []
+    for history, outboxes in items:
+        fresh = [outbox for outbox in outboxes if outbox['idempotency_key'] not in existing]
+        if not fresh:
+            continue
+        existing.update(outbox['idempotency_key'] for outbox in fresh)
+        accepted.append((AlertHistory(**history), fresh))
+
+    # 需要告警历史的ID关联发件箱记录
+    db.add_all([history for history, _ in accepted])
+    db.flush()
+    now = datetime.now()
+    db.bulk_insert_mappings(AlertNotifyOutbox, [
+        {
+            **outbox,
+            'history_id': history.id,
+            'status': 'pending',
+            'attempts': 0,
+            'next_attempt_at': outbox.get('next_attempt_at') or now
+        }
+        for history, outboxes in accepted
+        for outbox in outboxes
+    ])
+    return len(accepted), len(items) - len(accepted)
+
+
+class NotifyOutboxWorker:
+    """发件箱消费线程：分批领取待发送记录并交给通知分发队列"""
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._sender: Optional[Callable[[CompiledTemplate, dict], dict]] = None
+        self._last_cleanup = 0.0
+        self._stats = {"claimed": 0, "sent": 0, "retried": 0, "failed": 0, "rejected": 0,
+                       "grouped_notifications": 0, "grouped_alerts": 0, "postponed": 0,
+                       "throttled": 0, "coalesced_notifications": 0, "coalesced_alerts": 0}
+
+    def start(self, sender: Callable[[CompiledTemplate, dict], dict]):
+        """启动消费线程，sender为实际发送函数 (模板, 告警上下文) -> 发送结果"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._sender = sender
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="alert-outbox", daemon=True)
+            self._thread.start()
+        logger.info(f"告警通知发件箱已启动: {self.worker_id}")
+
+    def stop(self, timeout: float = 10):
+        """停止领取新记录；已领取未发送完的记录在租约过期后由其他进程或重启后重新领取"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        self._wakeup.set()
+        thread.join(timeout)
+
+    def wake(self):
+        """有新通知入箱时唤醒消费线程，不必等到下一个轮询周期"""
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                # 一批领满说明还有积压，继续领取
+                while not self._stop.is_set() and self.drain_once() >= get_settings().alert_notify_outbox_batch_size:
+                    pass
+                self._cleanup_if_due()
+            except Exception as e:
+                logger.error(f"告警通知发件箱处理异常: {e}")
+            self._wakeup.wait(max(get_settings().alert_notify_outbox_poll_interval, 1))
+            self._wakeup.clear()
+
+    def drain_once(self) -> int:
+        """领取一批到期的记录并按组提交发送，返回本批处理的到期记录条数"""
+        settings = get_settings()
+        db = SessionLocal()
+        try:
+            now = datetime.now()
+            rows = db.query(AlertNotifyOutbox).filter(or_(
+                and_(AlertNotifyOutbox.status == 'pending', AlertNotifyOutbox.next_attempt_at <= now),
+                # 租约过期的发送中记录（进程在发送过程中退出）
+                and_(AlertNotifyOutbox.status == 'sending', AlertNotifyOutbox.locked_until < now)
+            )).order_by(AlertNotifyOutbox.next_attempt_at).limit(
+                settings.alert_notify_outbox_batch_size
+            ).with_for_update(skip_locked=True).all()
+
+            # 不分组的记录各自成组
+            groups: Dict[str, List[AlertNotifyOutbox]] = {}
+            for row in rows:
+                groups.setdefault(row.group_key or f"#{row.id}", []).append(row)
+            postponed = self._postpone_groups(db, groups, now)
+            self._claim_group_members(db, groups)
+            units, throttled = self._rate_limit(db, groups, now)
+
+            lease_until = now + timedelta(seconds=settings.alert_notify_outbox_lease)
+            claimed = []
+            for members in units:
+                items = []
+                for row in members:
+                    row.status = 'sending'
+                    row.attempts = (row.attempts or 0) + 1
+                    row.locked_by = self.worker_id
+                    row.locked_until = lease_until
+                    items.append((row.id, row.attempts, row.max_attempts, dict(row.payload or {})))
+                claimed.append((members[0].template_id, members[0].channel, items))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        if postponed:
+            self._count("postponed", postponed)
+        if throttled:
+            self._count("throttled", throttled)
+        if claimed:
+            self._count("claimed", sum(len(items) for _, _, items in claimed))
+        for template_id, channel, items in claimed:
+            self._dispatch(template_id, channel, items)
+        return len(rows)
+
+    def _postpone_groups(self, db: Session, groups: Dict[str, List[AlertNotifyOutbox]], now: datetime) -> int:
+        """距上次发送不足 group_interval 的分组推迟到间隔结束，从groups中移除，返回推迟条数"""
+        keys = [members[0].group_key for members in groups.values() if members[0].group_key]
+        if not keys:
+            return 0
+        last_sent = dict(db.query(AlertNotifyOutbox.group_key, func.max(AlertNotifyOutbox.sent_at)).filter(
+            AlertNotifyOutbox.group_key.in_(keys), AlertNotifyOutbox.status == 'sent'
+        ).group_by(AlertNotifyOutbox.group_key).all())
+
+        postponed = 0
+        for key in keys:
+            if last_sent.get(key) is None:
+                continue
+            members = groups[key]
+            grouping = group_settings(rule_cache.get_template(db, members[0].template_id))
+            if grouping is None:
+                continue
+            due = last_sent[key] + timedelta(seconds=grouping[2])
+            if due <= now:
+                continue
+            _reschedule(members, due)
+            postponed += len(members)
+            del groups[key]
+        return postponed
+
+    def _claim_group_members(self, db: Session, groups: Dict[str, List[AlertNotifyOutbox]]):
+        """分组发送时一并领取同组尚未到期的待发送记录（仍在 group_wait 内的告警）"""
+        keys = [members[0].group_key for members in groups.values() if members[0].group_key]
+        if not keys:
+            return
+        seen = {row.id for key in keys for row in groups[key]}
+        rows = db.query(AlertNotifyOutbox).filter(
+            AlertNotifyOutbox.group_key.in_(keys),
+            AlertNotifyOutbox.status == 'pending',
+            AlertNotifyOutbox.id.notin_(seen)
+        ).with_for_update(skip_locked=True).all()
+        for row in rows:
+            groups[row.group_key].append(row)
+
+    def _rate_limit(self, db: Session, groups: Dict[str, List[AlertNotifyOutbox]],
+                    now: datetime) -> Tuple[List[List[AlertNotifyOutbox]], int]:
+        """
+        按模板申请令牌，每个分组（一条通知）消耗一个令牌，返回 (待发送的通知列表, 推迟条数)：
+        令牌不足时用最后一个令牌把剩余分组合并为一条汇总通知，没有令牌时推迟到下一个令牌可用
+        """
+        by_template: Dict[int, List[List[AlertNotifyOutbox]]] = {}
+        for members in groups.values():
+            by_template.setdefault(members[0].template_id, []).append(members)
+
+        units = []
+        throttled = 0
+        for template_id, template_units in by_template.items():
+            template = rule_cache.get_template(db, template_id)
+            if template is None:
+                # 模板已删除，由发送时返回失败
+                units.extend(template_units)
+                continue
+            granted, wait = notify_rate_limiter.acquire(template, len(template_units))
+            if granted >= len(template_units):
+                units.extend(template_units)
+                continue
+            if granted == 0:
+                rows = [row for members in template_units for row in members]
+                _reschedule(rows, now + timedelta(seconds=wait))
+                throttled += len(rows)
+                continue
+            coalesced = [row for members in template_units[granted - 1:] for row in members]
+            units.extend(template_units[:granted - 1])
+            units.append(coalesced)
+            self._count("coalesced_notifications", 1)
+            self._count("coalesced_alerts", len(coalesced))
+            logger.warning(f"通知模板 {template.name} 发送超出限流，{len(coalesced)} 条告警合并为一条通知")
+        return units, throttled
+
+    def _dispatch(self, template_id: int, channel: str, items: List[Tuple[int, int, int, dict]]):
+        """提交一组记录的发送任务，items为 (记录ID, 尝试次数, 最大次数, 告警上下文) 列表，多条时合并为一条通知"""
+        contexts = [alert_context for _, _, _, alert_context in items]
+        alert_context = merge_contexts(contexts)
+
+        def send() -> dict:
+            db = SessionLocal()
+            try:
+                template = rule_cache.get_template(db, template_id)
+            finally:
+                db.close()
+            if template is None:
+                return {"success": False, "msg": f"通知模板 {template_id} 不存在"}
+            return self._sender(template, alert_context)
+
+        def on_result(result: dict):
+            self._complete([item[:3] for item in items], result)
+
+        if len(items) > 1:
+            self._count("grouped_notifications", 1)
+            self._count("grouped_alerts", len(items))
+        outbox_id, attempts = items[0][0], items[0][1]
+        description = f"发件箱 {outbox_id} ({alert_context.get('rule_name')}, 第{attempts}次, " \
+                      f"{alert_context.get('idempotency_key', '')[:8]})"
+        notify_dispatcher.submit(channel, send, callback=on_result, description=description)
+
+    def _complete(self, items: List[Tuple[int, int, int]], result: dict):
+        """
+        记录一组记录的发送结果，items为 (记录ID, 尝试次数, 最大次数) 列表：
+        成功回填告警历史，失败按退避重新排期或标记为failed，被分发队列拒绝的短暂延迟后重新领取
+        """
+        now = datetime.now()
+        db = SessionLocal()
+        try:
+            rows = {
+                row.id: row for row in db.query(AlertNotifyOutbox).filter(
+                    AlertNotifyOutbox.id.in_([outbox_id for outbox_id, _, _ in items]),
+                    AlertNotifyOutbox.locked_by == self.worker_id,
+                    AlertNotifyOutbox.status == 'sending'
+                ).all()
+            }
+            counts = {}
+            for outbox_id, attempts, max_attempts in items:
+                row = rows.get(outbox_id)
+                if row is None:
+                    # 租约已过期并被其他进程领取
+                    logger.warning(f"发件箱记录 {outbox_id} 已不属于当前进程，忽略发送结果: {result}")
+                    continue
+
+                row.locked_by = None
+                row.locked_until = None
+                if result.get('success'):
+                    row.status = 'sent'
+                    row.sent_at = now
+                    row.last_error = None
+                    if row.history_id:
+                        db.query(AlertHistory).filter(AlertHistory.id == row.history_id).update(
+                            {'notified': True, 'notified_at': now}, synchronize_session=False
+                        )
+                    stat = "sent"
+                elif result.get('rejected'):
+                    # 未实际发送，退回领取时增加的次数，不走失败退避
+                    row.attempts = max((row.attempts or 0) - 1, 0)
+                    row.status = 'pending'
+                    row.next_attempt_at = now + timedelta(seconds=REJECTED_RETRY_DELAY * random.uniform(1, 2))
+                    stat = "rejected"
+                else:
+                    row.last_error = str(result.get('msg'))[:2000]
+                    if attempts >= max_attempts:
+                        row.status = 'failed'
+                        stat = "failed"
+                        logger.error(f"发件箱记录 {outbox_id} 发送失败已达 {attempts} 次，不再重试: {row.last_error}")
+                    else:
+                        row.status = 'pending'
+                        row.next_attempt_at = now + retry_delay(attempts)
+                        stat = "retried"
+                        logger.warning(
+                            f"发件箱记录 {outbox_id} 第 {attempts} 次发送失败，{row.next_attempt_at} 重试: {row.last_error}"
+                        )
+                counts[stat] = counts.get(stat, 0) + 1
+            db.commit()
+            for stat, value in counts.items():
+                self._count(stat, value)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"更新发件箱记录 {[item[0] for item in items]} 失败: {e}")
+        finally:
+            db.close()
+
+    def _cleanup_if_due(self):
+        """每小时清理一次超过保留期的已发送记录（多实例部署时只由主实例清理）"""
+        if time.monotonic() - self._last_cleanup < 3600 or not engine_cluster.is_leader():
+            return
+        self._last_cleanup = time.monotonic()
+        retention_days = get_settings().alert_notify_outbox_retention_days
+        if retention_days <= 0:
+            return
+        db = SessionLocal()
+        try:
+            deleted = db.query(AlertNotifyOutbox).filter(
+                AlertNotifyOutbox.status == 'sent',
+                AlertNotifyOutbox.sent_at < datetime.now() - timedelta(days=retention_days)
+            ).delete(synchronize_session=False)
+            db.commit()
+            if deleted:
+                logger.info(f"清理已发送的发件箱记录 {deleted} 条")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"清理发件箱记录失败: {e}")
+        finally:
+            db.close()
+
+    def _count(self, key: str, value: int):
+        with self._lock:
+            self._stats[key] += value
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "worker_id": self.worker_id,
+                "running": self._thread is not None and self._thread.is_alive(),
+                **self._stats
+            }
+
+
+def _reschedule(rows: List[AlertNotifyOutbox], due: datetime):
+    """把已锁定的记录放回待发送状态，到due时再领取（不计入发送次数）"""
+    for row in rows:
+        row.status = 'pending'
+        row.locked_by = None
+        row.locked_until = None
+        row.next_attempt_at = due
+
+
+# 全局发件箱消费者
+notify_outbox = NotifyOutboxWorker()
@@ -0,0 +1,112 @@
+"""
+告警通知限流
+每个通知模板（对应一个下游地址）一个令牌桶，告警风暴时避免被乐聊网关、Webhook等下游限流或封禁：
+- rate_limit: 每分钟补充的令牌数（每条通知消耗一个令牌），0表示不限流
+- rate_burst: 桶容量，空闲后允许的突发发送条数
+限流参数在模板 params 中配置，未配置时使用全局配置。令牌不足时发件箱不丢弃通知，
+而是把超出的通知合并为一条汇总通知（"+N条告警"），没有令牌时推迟到下一个令牌可用时再发送。
+令牌桶在进程内维护，多个进程同时消费发件箱时各自限流。
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from app.alert.services.rule_compiler import CompiledTemplate
+from app.config import get_settings
+
+
+def rate_settings(template: Optional[CompiledTemplate]) -> Optional[Tuple[float, int]]:
+    """模板的限流参数 (每秒令牌数, 桶容量)，不限流时返回None"""
+    if template is None:
+        return None
+    settings = get_settings()
+    params = template.params
+    try:
+        limit = int(params.get('rate_limit', settings.alert_notify_rate_limit))
+        burst = int(params.get('rate_burst', settings.alert_notify_rate_burst))
+    except (TypeError, ValueError):
+        return None
+    if limit <= 0:
+        return None
+    return limit / 60.0, max(burst, 1)
+
+
+class TokenBucket:
+    """令牌桶，调用方负责加锁"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def configure(self, rate: float, capacity: int):
+        """模板限流参数修改后调整速率和容量，已有令牌不超过新容量"""
+        self._refill()
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = min(self.tokens, capacity)
+
+    def take(self, count: int) -> int:
+        """最多取count个令牌，返回实际取到的个数"""
+        self._refill()
+        taken = min(int(self.tokens), count)
+        self.tokens -= taken
+        return taken
+
+    def wait_seconds(self) -> float:
+        """距下一个令牌可用的秒数"""
+        self._refill()
+        return max(1 - self.tokens, 0) / self.rate
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class NotifyRateLimiter:
+    """按通知模板维护令牌桶，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._stats = {"granted": 0, "denied": 0}
+
+    def acquire(self, template: CompiledTemplate, count: int) -> Tuple[int, float]:
+        """
+        为模板的count条通知申请令牌，返回 (取到的令牌数, 距下一个令牌可用的秒数)；
+        模板不限流时全部放行
+        """
+        limit = rate_settings(template)
+        if limit is None:
+            return count, 0.0
+        rate, capacity = limit
+        with self._lock:
+            bucket = self._buckets.get(template.id)
+            if bucket is None:
+                bucket = self._buckets[template.id] = TokenBucket(rate, capacity)
+            elif (bucket.rate, bucket.capacity) != limit:
+                bucket.configure(rate, capacity)
+            granted = bucket.take(count)
+            self._stats["granted"] += granted
+            self._stats["denied"] += count - granted
+            return granted, bucket.wait_seconds()
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "buckets": {template_id: round(bucket.tokens, 2) for template_id, bucket in self._buckets.items()}
+            }
+
+
+# 全局通知限流器
+notify_rate_limiter = NotifyRateLimiter()
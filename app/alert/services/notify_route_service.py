@@ -0,0 +1,83 @@
+from app.models import AlertNotifyRoute, AlertNotifyTemplate
+from sqlalchemy.orm import Session
+from typing import List, Optional, Dict, Any
+from fastapi import HTTPException
+from app.alert.services.inhibition import find_dependency_cycle
+from app.alert.services.notify_router import build_route_tree, notify_router, parse_matchers, walk_routes
+
+# 允许修改的路由字段
+ROUTE_FIELDS = ('parent_id', 'name', 'matchers', 'notify_template_id', 'continue_matching',
+                'sort_order', 'enabled', 'description')
+
+def _validate_route(db: Session, route_id: Optional[int], data: Dict[str, Any]):
+    """校验匹配器格式、通知模板和父路由（存在且不形成环）"""
+    if 'matchers' in data:
+        try:
+            parse_matchers(data['matchers'])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    template_id = data.get('notify_template_id')
+    if template_id is not None:
+        if not db.query(AlertNotifyTemplate).filter(AlertNotifyTemplate.id == template_id).first():
+            raise HTTPException(status_code=400, detail="通知模板不存在")
+    parent_id = data.get('parent_id')
+    if parent_id:
+        parents = dict(db.query(AlertNotifyRoute.id, AlertNotifyRoute.parent_id).all())
+        if parent_id not in parents:
+            raise HTTPException(status_code=400, detail="父路由不存在")
+        if find_dependency_cycle(route_id, parent_id, parents):
+            raise HTTPException(status_code=400, detail="父路由设置会形成循环")
+
+def get_routes(db: Session) -> List[AlertNotifyRoute]:
+    """按 父路由、匹配顺序 返回全部路由"""
+    return db.query(AlertNotifyRoute).order_by(
+        AlertNotifyRoute.parent_id, AlertNotifyRoute.sort_order, AlertNotifyRoute.id
+    ).all()
+
+def get_route(db: Session, route_id: int) -> Optional[AlertNotifyRoute]:
+    return db.query(AlertNotifyRoute).filter(AlertNotifyRoute.id == route_id).first()
+
+def create_route(db: Session, data: Dict[str, Any]) -> AlertNotifyRoute:
+    if not data.get('name'):
+        raise HTTPException(status_code=400, detail="路由名称不能为空")
+    values = {key: data[key] for key in ROUTE_FIELDS if key in data}
+    _validate_route(db, None, values)
+    route = AlertNotifyRoute(**values)
+    db.add(route)
+    db.commit()
+    db.refresh(route)
+    notify_router.invalidate()
+    return route
+
+def update_route(db: Session, route_id: int, data: Dict[str, Any]) -> Optional[AlertNotifyRoute]:
+    route = get_route(db, route_id)
+    if not route:
+        return None
+    values = {key: data[key] for key in ROUTE_FIELDS if key in data}
+    _validate_route(db, route_id, values)
+    for key, value in values.items():
+        setattr(route, key, value)
+    db.commit()
+    db.refresh(route)
+    notify_router.invalidate()
+    return route
+
+def delete_route(db: Session, route_id: int) -> bool:
+    """删除路由，子路由一并删除"""
+    route = get_route(db, route_id)
+    if not route:
+        return False
+    db.delete(route)
+    db.commit()
+    notify_router.invalidate()
+    return True
+
+def match_routes(db: Session, labels: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """用当前路由表匹配一组告警标签，返回命中的路由和通知模板，便于配置时预览"""
+    rows = db.query(AlertNotifyRoute).filter(AlertNotifyRoute.enabled == True).all()
+    roots, _ = build_route_tree(rows)
+    labels = {key: str(value) for key, value in (labels or {}).items() if value is not None}
+    return [
+        {"route_id": node.id, "route_name": node.name, "notify_template_id": template_id}
+        for node, template_id in walk_routes(roots, labels)
+    ]
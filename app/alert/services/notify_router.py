@@ -0,0 +1,296 @@
+"""
+告警通知路由
+路由表组成一棵树，按告警标签（规则标签 + 指标标签，另含 alertname/level/category）选择通知模板：
+- 从顶层路由开始，同级路由按 sort_order 依次匹配，命中后继续匹配其子路由，子路由都不命中时使用该路由本身
+- 命中的路由未开启 continue_matching 时不再匹配后续同级路由，开启时可同时命中多条路由（发送到多个模板）
+- 路由未配置通知模板时继承父路由的模板；没有任何路由命中（或命中路由链上都没有模板）时使用规则自身的通知模板
+匹配器支持 =、!=、=~、!~，正则整体匹配（与Prometheus一致），标签不存在按空字符串处理。
+路由表加载时编译为索引：每组同级路由按一个相等匹配器建立 标签名 -> 标签值 -> 路由 的哈希桶，
+只有哈希桶命中的路由和没有相等匹配器的路由才逐个检查，正则预先编译，大量告警同时触发时路由代价近似线性。
+"""
+
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import AlertNotifyRoute
+from app.utils.logger import logger
+
+# 标签名 运算符 值，值两侧的双引号可省略
+MATCHER_PATTERN = re.compile(r'^\s*([A-Za-z_][A-Za-z0-9_]*)\s*(=~|!~|!=|=)\s*(.*?)\s*$')
+
+
+class Matcher:
+    """单个标签匹配器"""
+
+    __slots__ = ('name', 'op', 'value', '_regex')
+
+    def __init__(self, name: str, op: str, value: str):
+        self.name = name
+        self.op = op
+        self.value = value
+        self._regex = None
+        if op in ('=~', '!~'):
+            try:
+                self._regex = re.compile(value)
+            except re.error as e:
+                raise ValueError(f"正则表达式不正确: {value}, {e}")
+
+    def matches(self, labels: Dict[str, str]) -> bool:
+        actual = labels.get(self.name, '')
+        if self.op == '=':
+            return actual == self.value
+        if self.op == '!=':
+            return actual != self.value
+        if self.op == '=~':
+            return self._regex.fullmatch(actual) is not None
+        return self._regex.fullmatch(actual) is None
+
+    def __str__(self) -> str:
+        return f'{self.name}{self.op}"{self.value}"'
+
+
+def parse_matcher(text: str) -> Matcher:
+    """解析匹配器，如 level=critical、instance=~"dn.*"，格式不正确时抛出ValueError"""
+    if not isinstance(text, str):
+        raise ValueError(f"匹配器必须是字符串: {text}")
+    matched = MATCHER_PATTERN.match(text)
+    if not matched:
+        raise ValueError(f"匹配器格式不正确: {text}")
+    name, op, value = matched.groups()
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        value = value[1:-1]
+    return Matcher(name, op, value)
+
+
+def parse_matchers(items) -> List[Matcher]:
+    """解析匹配器列表，为空表示匹配所有告警"""
+    if not items:
+        return []
+    if not isinstance(items, list):
+        raise ValueError("matchers 必须是字符串列表")
+    return [parse_matcher(item) for item in items]
+
+
+def alert_labels(rule, metric_labels: Optional[dict] = None) -> Dict[str, str]:
+    """
+    告警用于路由和静默匹配的标签：规则标签 + 指标标签（指标标签优先），
+    另含 alertname/level/category（告警标签中同名标签优先），值统一转为字符串
+    """
+    labels = {'alertname': rule.name, 'level': rule.level, 'category': rule.category,
+              **(rule.labels or {}), **(metric_labels or {})}
+    return {key: str(value) for key, value in labels.items() if value is not None}
+
+
+class MatcherSet:
+    """一组需要同时满足的匹配器，相等匹配器单独保存，用于建立哈希索引"""
+
+    __slots__ = ('equals', 'others')
+
+    def __init__(self, matchers: List[Matcher]):
+        self.equals = tuple((m.name, m.value) for m in matchers if m.op == '=')
+        self.others = tuple(m for m in matchers if m.op != '=')
+
+    def matches(self, labels: Dict[str, str]) -> bool:
+        for name, value in self.equals:
+            if labels.get(name, '') != value:
+                return False
+        for matcher in self.others:
+            if not matcher.matches(labels):
+                return False
+        return True
+
+
+class MatcherIndex:
+    """
+    一组匹配器集合的索引：每个集合选一个相等匹配器按 标签名 -> 标签值 哈希分桶，
+    查找时只需检查桶命中的集合和没有相等匹配器的集合
+    """
+
+    __slots__ = ('entries', '_buckets', '_scan')
+
+    def __init__(self, entries: List[MatcherSet]):
+        self.entries = entries
+        # 标签名 -> 标签值 -> 下标（升序）
+        self._buckets: Dict[str, Dict[str, List[int]]] = {}
+        # 没有相等匹配器、每次都要检查的下标
+        self._scan: List[int] = []
+
+        # 选同组中最常用的标签名建索引，查找时需要探测的标签名最少
+        usage = Counter(name for entry in entries for name in {name for name, _ in entry.equals})
+        for position, entry in enumerate(entries):
+            if not entry.equals:
+                self._scan.append(position)
+                continue
+            name, value = max(entry.equals, key=lambda item: usage[item[0]])
+            self._buckets.setdefault(name, {}).setdefault(value, []).append(position)
+
+    def candidates(self, labels: Dict[str, str]) -> List[int]:
+        """可能匹配的下标（升序），调用方需再用 matches 检查"""
+        positions = self._scan
+        sources = 1 if positions else 0
+        for name, values in self._buckets.items():
+            hit = values.get(labels.get(name, ''))
+            if hit:
+                positions = positions + hit if positions else hit
+                sources += 1
+        if sources > 1:
+            # 多个来源合并后恢复原有顺序（合并结果是新列表，不影响索引）
+            positions.sort()
+        return positions
+
+    def first(self, labels: Dict[str, str]) -> Optional[MatcherSet]:
+        """第一个匹配的集合，没有时返回None"""
+        for position in self.candidates(labels):
+            entry = self.entries[position]
+            if entry.matches(labels):
+                return entry
+        return None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class RouteNode(MatcherSet):
+    """编译后的路由节点"""
+
+    __slots__ = ('id', 'name', 'template_id', 'continue_matching', 'children')
+
+    def __init__(self, route_id: int, name: str, matchers: List[Matcher], template_id: Optional[int],
+                 continue_matching: bool):
+        super().__init__(matchers)
+        self.id = route_id
+        self.name = name
+        self.template_id = template_id
+        self.continue_matching = bool(continue_matching)
+        self.children = RouteIndex([])
+
+
+class RouteIndex(MatcherIndex):
+    """一组同级路由的匹配索引"""
+
+    __slots__ = ()
+
+    @property
+    def nodes(self) -> List[RouteNode]:
+        return self.entries
+
+    def match(self, labels: Dict[str, str]) -> List[RouteNode]:
+        """按顺序返回命中的同级路由，遇到未开启 continue_matching 的路由停止"""
+        matched = []
+        for position in self.candidates(labels):
+            node = self.entries[position]
+            if node.matches(labels):
+                matched.append(node)
+                if not node.continue_matching:
+                    break
+        return matched
+
+
+def build_route_tree(rows: List[AlertNotifyRoute]) -> Tuple[RouteIndex, int]:
+    """把启用的路由记录编译为路由树，返回 (顶层路由索引, 非法路由数)；非法路由及其子路由被忽略"""
+    children = defaultdict(list)
+    for row in rows:
+        children[row.parent_id].append(row)
+
+    invalid = 0
+
+    def build(parent_id: Optional[int], path: frozenset) -> RouteIndex:
+        nonlocal invalid
+        nodes = []
+        for row in sorted(children.get(parent_id, []), key=lambda item: (item.sort_order or 0, item.id)):
+            if row.id in path:
+                continue
+            try:
+                node = RouteNode(row.id, row.name, parse_matchers(row.matchers), row.notify_template_id,
+                                 row.continue_matching)
+            except ValueError as e:
+                invalid += 1
+                logger.error(f"通知路由 {row.id}({row.name}) 匹配器不正确，已忽略该路由及其子路由: {e}")
+                continue
+            node.children = build(row.id, path | {row.id})
+            nodes.append(node)
+        return RouteIndex(nodes)
+
+    return build(None, frozenset()), invalid
+
+
+def walk_routes(index: RouteIndex, labels: Dict[str, str], inherited: Optional[int] = None,
+                out: Optional[list] = None) -> List[Tuple[RouteNode, Optional[int]]]:
+    """从index开始匹配，返回命中的最深层路由及其通知模板ID（继承父路由） [(路由, 模板ID)]"""
+    if out is None:
+        out = []
+    _walk(index, labels, inherited, out)
+    return out
+
+
+def _walk(index: RouteIndex, labels: Dict[str, str], inherited: Optional[int], out: list) -> bool:
+    matched = index.match(labels)
+    for node in matched:
+        template_id = node.template_id or inherited
+        if not node.children.nodes or not _walk(node.children, labels, template_id, out):
+            out.append((node, template_id))
+    return bool(matched)
+
+
+class NotifyRouter:
+    """通知路由树，线程安全；路由表变化时重新编译"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._roots: Optional[RouteIndex] = None
+        self._version = None
+        self._stats = {"routes": 0, "invalid_routes": 0, "reloads": 0, "routed": 0, "fallback": 0}
+
+    def refresh(self, db: Session):
+        """按 (路由数, 最大updated_at) 检查路由表是否变化，变化时重新加载；加载失败时保留原路由树"""
+        try:
+            version = tuple(db.query(func.count(AlertNotifyRoute.id), func.max(AlertNotifyRoute.updated_at)).one())
+            with self._lock:
+                if self._roots is not None and version == self._version:
+                    return
+            rows = db.query(AlertNotifyRoute).filter(AlertNotifyRoute.enabled == True).all()
+            roots, invalid = build_route_tree(rows)
+        except Exception as e:
+            logger.error(f"加载通知路由失败: {e}")
+            return
+        with self._lock:
+            self._roots = roots
+            self._version = version
+            self._stats["routes"] = len(rows)
+            self._stats["invalid_routes"] = invalid
+            self._stats["reloads"] += 1
+        logger.info(f"通知路由已加载: {len(rows)} 条, 非法 {invalid} 条")
+
+    def invalidate(self):
+        """路由修改后调用，下一次刷新时重新加载"""
+        with self._lock:
+            self._version = None
+
+    def route(self, labels: Dict[str, str]) -> List[Tuple[RouteNode, Optional[int]]]:
+        """匹配告警标签（alert_labels），返回命中的路由及通知模板ID，没有路由命中时返回空列表"""
+        with self._lock:
+            roots = self._roots
+        if not roots:
+            return []
+        matched = walk_routes(roots, labels)
+        with self._lock:
+            self._stats["routed" if matched else "fallback"] += 1
+        return matched
+
+    def reset(self):
+        with self._lock:
+            self._roots = None
+            self._version = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+# 全局通知路由
+notify_router = NotifyRouter()
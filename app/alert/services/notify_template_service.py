@@ -2,6 +2,7 @@ from app.models import SessionLocal, AlertNotifyTemplate
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import json
+from app.alert.services.rule_compiler import rule_cache
 
 def get_templates(db: Session, type: Optional[str] = None) -> List[AlertNotifyTemplate]:
     query = db.query(AlertNotifyTemplate)
@@ -32,6 +33,7 @@ def update_template(db: Session, template_id: int, name: str, params: dict) -> O
     tpl.params = json.dumps(params, sort_keys=True)
     db.commit()
     db.refresh(tpl)
+    rule_cache.invalidate_template(template_id)
     return tpl
 
 def delete_template(db: Session, template_id: int) -> bool:
@@ -40,4 +42,5 @@ def delete_template(db: Session, template_id: int) -> bool:
         return False
     db.delete(tpl)
     db.commit()
+    rule_cache.invalidate_template(template_id)
     return True 
\ No newline at end of file
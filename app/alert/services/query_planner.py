@@ -0,0 +1,114 @@
+"""
+告警引擎查询计划
+同一轮评估中，PromQL相同（忽略空白和注释差异）的规则只查询一次Prometheus，
+所有查询使用同一个评估时间戳，结果在本轮内共享；规范化后的表达式只用于分组，发送给Prometheus的是规则原始的PromQL
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, Optional, Any
+
+
+def normalize_promql(promql: str) -> str:
+    """
+    规范化PromQL：去掉首尾空白和 # 注释（到行尾），字符串字面量以外的连续空白压缩为一个空格
+    PromQL中空白和注释不影响语义，规范化后相同的表达式可以共用一次查询（只作为分组键，不能发送给Prometheus）
+    """
+    if not promql:
+        return ''
+
+    parts = []
+    quote = None
+    pending_space = False
+    escaped = False
+    comment = False
+    for ch in promql.strip():
+        if comment:
+            # 注释到行尾，整体视为空白
+            if ch == '\n':
+                comment = False
+            continue
+        if quote:
+            parts.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == quote:
+                quote = None
+            continue
+
+        if ch.isspace():
+            pending_space = True
+            continue
+        if ch == '#':
+            comment = True
+            pending_space = True
+            continue
+
+        if pending_space:
+            if parts:
+                parts.append(' ')
+            pending_space = False
+        if ch in ('"', "'", '`'):
+            quote = ch
+        parts.append(ch)
+
+    return ''.join(parts)
+
+
+class QueryPlan:
+    """
+    单轮评估的查询计划
+    - 按规范化PromQL分组，每个不同的表达式最多查询一次
+    - 并发安全：多个线程同时请求同一表达式时，只有第一个线程发起查询，其余线程等待结果
+    """
+
+    def __init__(self, promqls: Iterable[str], query_func: Callable[[str, float], Any],
+                 eval_time: Optional[float] = None):
+        self.eval_time = eval_time if eval_time is not None else time.time()
+        self._query_func = query_func
+        self._lock = threading.Lock()
+        self._results: Dict[str, Future] = {}
+
+        # 统计本轮每个表达式被多少条规则引用
+        self._groups: Dict[str, int] = {}
+        for promql in promqls:
+            key = normalize_promql(promql)
+            self._groups[key] = self._groups.get(key, 0) + 1
+
+        self.requests = 0
+        self.executed = 0
+
+    def query(self, promql: str) -> Any:
+        """获取表达式在本轮评估时间点的查询结果"""
+        key = normalize_promql(promql)
+        with self._lock:
+            self.requests += 1
+            future = self._results.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._results[key] = future
+                self.executed += 1
+
+        if owner:
+            try:
+                # 发送本组第一条规则的原始表达式，规范化结果只用于分组
+                future.set_result(self._query_func(promql, self.eval_time))
+            except Exception as e:
+                future.set_exception(e)
+
+        return future.result()
+
+    def summary(self) -> dict:
+        """本轮查询计划统计"""
+        with self._lock:
+            return {
+                "eval_time": self.eval_time,
+                "rules": sum(self._groups.values()),
+                "distinct_queries": len(self._groups),
+                "executed_queries": self.executed,
+                "saved_round_trips": max(self.requests - self.executed, 0)
+            }
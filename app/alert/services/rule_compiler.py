@@ -0,0 +1,306 @@
+"""
+告警规则编译缓存
+每条AlertRule编译为不可变的CompiledRule：条件、时间间隔、标签和通知模板都在编译时解析一次，
+评估时直接使用。缓存按 (规则ID, updated_at, 规则内容摘要) 命中，规则或模板修改时主动失效；
+updated_at 精度只到秒，且独立进程模式下API进程的主动失效到不了引擎子进程，同一秒内的修改靠内容摘要发现。
+模板在其他进程中修改时按模板表的内容摘要整体失效。
+"""
+
+import hashlib
+import json
+import operator
+import threading
+from datetime import datetime, timedelta
+from itertools import repeat
+from types import MappingProxyType
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models import AlertRule, AlertNotifyTemplate
+from app.utils.logger import logger
+
+# 条件运算符，按前缀匹配顺序排列（长运算符在前）
+CONDITION_OPERATORS = (
+    ('>=', operator.ge),
+    ('<=', operator.le),
+    ('!=', operator.ne),
+    ('==', operator.eq),
+    ('>', operator.gt),
+    ('<', operator.lt),
+    ('=', operator.eq),
+)
+
+# 参与编译的规则字段，内容摘要只覆盖这些字段
+COMPILED_FIELDS = ('name', 'category', 'level', 'promql', 'condition', 'description', 'labels', 'suppress',
+                   'repeat', 'duration', 'max_send_count', 'for_duration', 'notify_template_id')
+
+
+def rule_digest(rule: AlertRule) -> str:
+    """规则编译字段的内容摘要"""
+    content = json.dumps([getattr(rule, field) for field in COMPILED_FIELDS], sort_keys=True, default=str)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def template_table_digest(rows: List[tuple]) -> str:
+    """模板表内容摘要，rows为 (id, name, type, params) 列表"""
+    content = json.dumps(sorted(rows, key=lambda row: row[0]), default=str)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def parse_alert_condition(condition: str) -> Optional[tuple]:
+    """
+    解析告警条件，如 "> 80", "< 0.5", "== 100", "= 0"
+    返回 (比较函数, 阈值)，格式不支持时返回None
+    """
+    try:
+        condition = condition.strip()
+        for symbol, compare in CONDITION_OPERATORS:
+            if condition.startswith(symbol):
+                return compare, float(condition[len(symbol):].strip())
+        logger.error(f"不支持的条件格式: {condition}")
+        return None
+    except Exception as e:
+        logger.error(f"解析条件失败: {condition}, {e}")
+        return None
+
+
+def parse_time_duration(duration_str: str) -> Optional[timedelta]:
+    """
+    解析时间间隔字符串
+    支持格式: 5m, 1h, 30s, 2d
+    """
+    if not duration_str:
+        return None
+
+    duration_str = duration_str.strip().lower()
+    try:
+        if duration_str.endswith('s'):
+            return timedelta(seconds=int(duration_str[:-1]))
+        elif duration_str.endswith('m'):
+            return timedelta(minutes=int(duration_str[:-1]))
+        elif duration_str.endswith('h'):
+            return timedelta(hours=int(duration_str[:-1]))
+        elif duration_str.endswith('d'):
+            return timedelta(days=int(duration_str[:-1]))
+        else:
+            # 默认当作秒处理
+            return timedelta(seconds=int(duration_str))
+    except (ValueError, TypeError):
+        logger.error(f"无法解析时间间隔: {duration_str}")
+        return None
+
+
+def _seconds_delta(value: Optional[int]) -> Optional[timedelta]:
+    """秒数转时间间隔，0或空返回None"""
+    if not value or value <= 0:
+        return None
+    return timedelta(seconds=value)
+
+
+def validate_rule_definition(rule_data: Dict[str, Any]) -> List[str]:
+    """校验规则定义，返回错误信息列表（为空表示合法）"""
+    errors = []
+    condition = rule_data.get('condition')
+    if condition is not None and parse_alert_condition(str(condition)) is None:
+        errors.append(f"告警条件格式不正确: {condition}，示例: > 80, <= 0.5, != 1")
+    suppress = rule_data.get('suppress')
+    if suppress and parse_time_duration(str(suppress)) is None:
+        errors.append(f"抑制条件格式不正确: {suppress}，示例: 30s, 5m, 1h, 2d")
+    for field in ('repeat', 'duration', 'for_duration', 'max_send_count', 'eval_interval'):
+        value = rule_data.get(field)
+        if value is None:
+            continue
+        try:
+            if int(value) < 0:
+                errors.append(f"{field} 不能为负数")
+        except (TypeError, ValueError):
+            errors.append(f"{field} 必须为整数: {value}")
+    inhibit_labels = rule_data.get('inhibit_labels')
+    if inhibit_labels is not None and (
+            not isinstance(inhibit_labels, list) or not all(isinstance(name, str) and name for name in inhibit_labels)):
+        errors.append(f"inhibit_labels 必须为标签名列表: {inhibit_labels}")
+    return errors
+
+
+class _Frozen:
+    """__slots__ 不可变对象基类"""
+
+    __slots__ = ()
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"{type(self).__name__} 不可修改")
+
+    def __delattr__(self, key):
+        raise AttributeError(f"{type(self).__name__} 不可修改")
+
+
+class CompiledTemplate(_Frozen):
+    """编译后的通知模板，params已解析为字典"""
+
+    __slots__ = ('id', 'name', 'type', 'params', 'updated_at')
+
+    def __init__(self, template: AlertNotifyTemplate):
+        params = template.params
+        if isinstance(params, str):
+            params = json.loads(params) if params else {}
+        object.__setattr__(self, 'id', template.id)
+        object.__setattr__(self, 'name', template.name)
+        object.__setattr__(self, 'type', template.type)
+        object.__setattr__(self, 'params', MappingProxyType(params or {}))
+        object.__setattr__(self, 'updated_at', template.updated_at)
+
+
+class CompiledRule(_Frozen):
+    """编译后的告警规则（只包含规则定义，不包含运行时状态）"""
+
+    __slots__ = ('id', 'updated_at', 'name', 'category', 'level', 'promql', 'condition',
+                 'compare', 'threshold', 'description', 'labels', 'suppress', 'suppress_delta',
+                 'repeat', 'repeat_delta', 'duration', 'duration_delta', 'max_send_count',
+                 'for_duration', 'for_delta', 'notify_template_id', 'template')
+
+    def __init__(self, rule: AlertRule, template: Optional[CompiledTemplate]):
+        parsed = parse_alert_condition(rule.condition or '')
+        if parsed is None:
+            raise ValueError(f"告警条件格式不正确: {rule.condition}")
+        suppress_delta = parse_time_duration(rule.suppress) if rule.suppress else None
+        if rule.suppress and suppress_delta is None:
+            raise ValueError(f"抑制条件格式不正确: {rule.suppress}")
+
+        values = {
+            'id': rule.id,
+            'updated_at': rule.updated_at,
+            'name': rule.name,
+            'category': rule.category or 'other',
+            'level': rule.level,
+            'promql': rule.promql,
+            'condition': rule.condition,
+            'compare': parsed[0],
+            'threshold': parsed[1],
+            'description': rule.description,
+            'labels': MappingProxyType(dict(rule.labels or {})),
+            'suppress': rule.suppress,
+            'suppress_delta': suppress_delta,
+            'repeat': rule.repeat or 0,
+            'repeat_delta': _seconds_delta(rule.repeat),
+            'duration': rule.duration,
+            'duration_delta': _seconds_delta(rule.duration),
+            'max_send_count': rule.max_send_count,
+            'for_duration': rule.for_duration or 0,
+            'for_delta': _seconds_delta(rule.for_duration),
+            'notify_template_id': rule.notify_template_id,
+            'template': template,
+        }
+        for key, value in values.items():
+            object.__setattr__(self, key, value)
+
+    def evaluate(self, values: List[float]) -> List[bool]:
+        """对一组值检查告警条件"""
+        return list(map(self.compare, values, repeat(self.threshold, len(values))))
+
+
+class RuleCache:
+    """编译规则缓存，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # rule_id -> ((rule_id, updated_at, 内容摘要), CompiledRule 或 None(编译失败))
+        self._rules: Dict[int, Tuple[tuple, Optional[CompiledRule]]] = {}
+        self._templates: Dict[int, CompiledTemplate] = {}
+        # 模板表内容摘要，其他进程修改模板后据此失效缓存
+        self._template_version = None
+
+    def get(self, db: Session, rule: AlertRule) -> Optional[CompiledRule]:
+        """获取规则的编译结果，规则更新后自动重新编译；规则非法时返回None"""
+        key = (rule.id, rule.updated_at, rule_digest(rule))
+        with self._lock:
+            cached = self._rules.get(rule.id)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        compiled = None
+        try:
+            template = self.get_template(db, rule.notify_template_id)
+            compiled = CompiledRule(rule, template)
+        except Exception as e:
+            logger.error(f"编译告警规则 {rule.id}({rule.name}) 失败，规则修正前将跳过评估: {e}")
+
+        with self._lock:
+            self._rules[rule.id] = (key, compiled)
+        return compiled
+
+    def get_cached(self, rule_id: int) -> Optional[CompiledRule]:
+        """仅从缓存获取编译规则，不访问数据库"""
+        with self._lock:
+            cached = self._rules.get(rule_id)
+        return cached[1] if cached else None
+
+    def get_template(self, db: Session, template_id: Optional[int]) -> Optional[CompiledTemplate]:
+        """获取编译后的通知模板（缓存）"""
+        if not template_id:
+            return None
+        with self._lock:
+            template = self._templates.get(template_id)
+        if template is not None:
+            return template
+
+        row = db.query(AlertNotifyTemplate).filter(AlertNotifyTemplate.id == template_id).first()
+        if row is None:
+            return None
+        template = CompiledTemplate(row)
+        with self._lock:
+            self._templates[template_id] = template
+        return template
+
+    def refresh_templates(self, db: Session):
+        """
+        按模板表的内容摘要检查模板是否变化，变化时清空模板缓存和编译规则
+        模板可能在其他进程（API进程、其他引擎实例）中修改，进程内的 invalidate_template 无法覆盖；
+        updated_at 精度只到秒，同一秒内的修改或修改非最新的模板只能通过内容发现（模板数量少，每轮读取代价很小）
+        """
+        try:
+            version = template_table_digest([tuple(row) for row in db.query(
+                AlertNotifyTemplate.id, AlertNotifyTemplate.name, AlertNotifyTemplate.type, AlertNotifyTemplate.params
+            ).all()])
+        except Exception as e:
+            logger.error(f"检查通知模板版本失败: {e}")
+            return
+        with self._lock:
+            if version == self._template_version:
+                return
+            if self._template_version is not None:
+                logger.info("通知模板已修改，清空编译缓存")
+                self._rules.clear()
+                self._templates.clear()
+            self._template_version = version
+
+    def invalidate_rule(self, rule_id: int):
+        """规则修改或删除后失效"""
+        with self._lock:
+            self._rules.pop(rule_id, None)
+
+    def invalidate_template(self, template_id: int):
+        """模板修改或删除后失效，同时失效引用该模板的规则"""
+        with self._lock:
+            self._templates.pop(template_id, None)
+            for rule_id in [rid for rid, (_, compiled) in self._rules.items()
+                            if compiled is None or compiled.notify_template_id == template_id]:
+                del self._rules[rule_id]
+
+    def clear(self):
+        with self._lock:
+            self._rules.clear()
+            self._templates.clear()
+            self._template_version = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rules": len(self._rules),
+                "invalid_rules": sum(1 for _, compiled in self._rules.values() if compiled is None),
+                "templates": len(self._templates)
+            }
+
+
+# 全局编译规则缓存
+rule_cache = RuleCache()
@@ -0,0 +1,167 @@
+"""
+告警规则注册表
+引擎启动时全量加载一次启用的规则，之后每轮只拉取 updated_at 晚于水位线的记录；
+规则删除通过 (数量, ID之和) 校验查询发现，只有校验不一致时才读取ID列表。
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import AlertRule
+from app.alert.services import rule_state_service
+from app.alert.services.instance_store import instance_store
+from app.alert.services.rule_compiler import rule_cache
+from app.config import get_settings
+from app.utils.logger import logger
+
+# 增量同步时水位线回退的时间
+WATERMARK_OVERLAP = timedelta(seconds=1)
+
+# 快照保存的规则字段（与AlertRule列一致）
+RULE_COLUMNS = tuple(column.key for column in AlertRule.__table__.columns)
+
+
+class RuleSnapshot:
+    """规则表记录的轻量快照，脱离数据库会话使用"""
+
+    __slots__ = RULE_COLUMNS
+
+    def __init__(self, row: AlertRule):
+        for key in RULE_COLUMNS:
+            setattr(self, key, getattr(row, key))
+
+
+class RuleRegistry:
+    """启用规则的内存注册表，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rules: Dict[int, RuleSnapshot] = {}
+        self._watermark: Optional[datetime] = None
+        self._last_full_sync = 0.0
+        self._stats = {
+            "full_syncs": 0,
+            "incremental_syncs": 0,
+            "last_fetched_rows": 0,
+            "last_removed_rules": 0
+        }
+
+    def refresh(self, db: Session) -> List[RuleSnapshot]:
+        """同步规则变更并返回当前启用的规则"""
+        full_sync_interval = get_settings().alert_engine_rule_full_sync_interval
+        with self._lock:
+            if self._watermark is None or time.monotonic() - self._last_full_sync >= full_sync_interval:
+                self._full_sync(db)
+            else:
+                self._incremental_sync(db)
+            return sorted(self._rules.values(), key=lambda rule: rule.id)
+
+    def _full_sync(self, db: Session):
+        """全量加载（首次启动和定期兜底）"""
+        rows = db.query(AlertRule).filter(AlertRule.enabled == True).all()
+        rules = {row.id: RuleSnapshot(row) for row in rows}
+        removed = set(self._rules) - set(rules)
+        self._rules = rules
+        self._watermark = db.query(func.max(AlertRule.updated_at)).scalar() or datetime.min
+        self._last_full_sync = time.monotonic()
+        self._forget(db, removed)
+        self._stats["full_syncs"] += 1
+        self._stats["last_fetched_rows"] = len(rows)
+        self._stats["last_removed_rules"] = len(removed)
+        logger.info(f"告警规则全量加载: {len(rules)} 条, 水位线 {self._watermark}")
+
+    def _incremental_sync(self, db: Session):
+        """增量加载水位线之后修改的规则，并校验是否有规则被删除"""
+        # 回退1秒，避免与水位线同一秒内的后续修改被漏掉（DATETIME精度为秒）
+        since = self._watermark - WATERMARK_OVERLAP if self._watermark != datetime.min else datetime.min
+        # 回退窗口总会再次查到设置水位线的记录，先只查版本列，跳过与快照相同的记录
+        candidates = db.query(AlertRule.id, AlertRule.updated_at, AlertRule.enabled).filter(
+            AlertRule.updated_at >= since
+        ).all()
+        changed = [
+            rule_id for rule_id, updated_at, enabled in candidates
+            if not self._unchanged(rule_id, updated_at, enabled)
+        ]
+        rows = db.query(AlertRule).filter(AlertRule.id.in_(changed)).all() if changed else []
+        removed = set()
+        for row in rows:
+            if row.enabled:
+                self._rules[row.id] = RuleSnapshot(row)
+            elif self._rules.pop(row.id, None) is not None:
+                removed.add(row.id)
+        for _, updated_at, _ in candidates:
+            if updated_at and updated_at > self._watermark:
+                self._watermark = updated_at
+
+        removed |= self._detect_deleted(db)
+        self._forget(db, removed)
+        self._stats["incremental_syncs"] += 1
+        self._stats["last_fetched_rows"] = len(rows)
+        self._stats["last_removed_rules"] = len(removed)
+        if rows or removed:
+            logger.info(f"告警规则增量同步: 变更 {len(rows)} 条, 移除 {len(removed)} 条")
+        else:
+            logger.debug("告警规则增量同步: 无变更")
+
+    def _unchanged(self, rule_id: int, updated_at: Optional[datetime], enabled: bool) -> bool:
+        """记录与内存中的快照一致（启用且updated_at相同，或禁用且不在注册表中）"""
+        snapshot = self._rules.get(rule_id)
+        if not enabled:
+            return snapshot is None
+        return snapshot is not None and snapshot.updated_at == updated_at
+
+    def _detect_deleted(self, db: Session) -> set:
+        """通过数量和ID之和校验启用规则集合，不一致时读取ID列表找出差异"""
+        count, id_sum = db.query(
+            func.count(AlertRule.id), func.coalesce(func.sum(AlertRule.id), 0)
+        ).filter(AlertRule.enabled == True).one()
+        if count == len(self._rules) and int(id_sum) == sum(self._rules):
+            return set()
+
+        ids = {row.id for row in db.query(AlertRule.id).filter(AlertRule.enabled == True).all()}
+        removed = set(self._rules) - ids
+        for rule_id in removed:
+            del self._rules[rule_id]
+
+        missing = ids - set(self._rules)
+        if missing:
+            # 未通过水位线发现的规则（如直接修改数据库且未更新updated_at）
+            for row in db.query(AlertRule).filter(AlertRule.id.in_(missing)).all():
+                self._rules[row.id] = RuleSnapshot(row)
+        return removed
+
+    def _forget(self, db: Session, rule_ids):
+        """清理已删除/禁用规则的实例状态、状态表记录和编译缓存"""
+        for rule_id in rule_ids:
+            instance_store.remove_rule(rule_id)
+            rule_cache.invalidate_rule(rule_id)
+        if rule_ids:
+            try:
+                rule_state_service.delete_rule_states(db, rule_ids)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"清理规则状态记录失败: {e}")
+
+    def reset(self):
+        """清空注册表，下一轮重新全量加载"""
+        with self._lock:
+            self._rules = {}
+            self._watermark = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rules": len(self._rules),
+                "watermark": self._watermark.isoformat() if self._watermark and self._watermark != datetime.min else None,
+                **self._stats
+            }
+
+
+# 全局规则注册表
+rule_registry = RuleRegistry()
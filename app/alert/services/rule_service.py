@@ -1,8 +1,27 @@
-from app.models import SessionLocal, AlertRule, AlertNotifyTemplate
+from app.models import SessionLocal, AlertRule, AlertNotifyTemplate, AlertRuleState
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, and_, case
 from typing import List, Optional, Dict, Any
 from fastapi import HTTPException
+from app.alert.services import rule_state_service
+from app.alert.services.inhibition import find_dependency_cycle
+from app.alert.services.rule_compiler import rule_cache, validate_rule_definition
+
+def _validate_rule(rule_data: Dict[str, Any]):
+    """保存前校验规则定义，避免非法条件在每轮评估时才暴露"""
+    errors = validate_rule_definition(rule_data)
+    if errors:
+        raise HTTPException(status_code=400, detail="；".join(errors))
+
+def _validate_parent_rule(db: Session, rule_id: Optional[int], parent_rule_id: Optional[int]):
+    """校验父规则存在且不会形成依赖环"""
+    if not parent_rule_id:
+        return
+    parents = dict(db.query(AlertRule.id, AlertRule.parent_rule_id).all())
+    if parent_rule_id not in parents:
+        raise HTTPException(status_code=400, detail="父规则不存在")
+    if find_dependency_cycle(rule_id, parent_rule_id, parents):
+        raise HTTPException(status_code=400, detail="父规则设置会形成循环依赖")
 
 # 获取所有规则
 def get_rules(db: Session) -> List[AlertRule]:
@@ -21,7 +40,11 @@ def get_rules_with_filter(db: Session, page: int, size: int,
     """
     获取告警规则列表，支持分页和多条件筛选
     """
-    query = db.query(AlertRule)
+    # 告警状态来自状态表中的规则汇总记录
+    state_column = func.coalesce(AlertRuleState.alert_state, 'ok')
+    query = db.query(AlertRule, AlertRuleState).outerjoin(
+        AlertRuleState, rule_state_service.aggregate_join_condition(AlertRule.id)
+    )
     
     # 组件分组筛选
     if category:
@@ -37,7 +60,7 @@ def get_rules_with_filter(db: Session, page: int, size: int,
     
     # 告警状态筛选
     if alert_state:
-        query = query.filter(AlertRule.alert_state == alert_state)
+        query = query.filter(state_column == alert_state)
     
     # 规则名称搜索
     if name:
@@ -52,7 +75,8 @@ def get_rules_with_filter(db: Session, page: int, size: int,
     
     # 格式化返回数据
     rule_list = []
-    for rule in rules:
+    for rule, state in rules:
+        last_alert_time = state.last_alert_time if state else None
         rule_dict = {
             "id": rule.id,
             "name": rule.name,
@@ -64,9 +88,13 @@ def get_rules_with_filter(db: Session, page: int, size: int,
             "labels": rule.labels,
             "suppress": rule.suppress,
             "repeat": rule.repeat,
+            "eval_interval": rule.eval_interval,
+            "parent_rule_id": rule.parent_rule_id,
+            "inhibit_labels": rule.inhibit_labels,
+            "inhibit_skip_eval": rule.inhibit_skip_eval,
             "enabled": rule.enabled,
-            "alert_state": rule.alert_state,
-            "last_alert_time": rule.last_alert_time.isoformat() if rule.last_alert_time else None,
+            "alert_state": state.alert_state if state and state.alert_state else 'ok',
+            "last_alert_time": last_alert_time.isoformat() if last_alert_time else None,
             "notify_template_id": rule.notify_template_id,
             "created_at": rule.created_at.isoformat(),
             "updated_at": rule.updated_at.isoformat()
@@ -93,14 +121,19 @@ def get_rule_stats(db: Session) -> Dict[str, Any]:
     # 总体统计
     total_rules = db.query(AlertRule).count()
     enabled_rules = db.query(AlertRule).filter(AlertRule.enabled == True).count()
-    alerting_rules = db.query(AlertRule).filter(AlertRule.alert_state == 'alerting').count()
+    alerting_rules = db.query(AlertRuleState).filter(
+        AlertRuleState.fingerprint == rule_state_service.RULE_AGGREGATE_FINGERPRINT,
+        AlertRuleState.alert_state == 'alerting'
+    ).count()
     
     # 按分组统计
     category_stats = db.query(
         AlertRule.category,
         func.count(AlertRule.id).label('total_count'),
         func.sum(case((AlertRule.enabled == True, 1), else_=0)).label('enabled_count'),
-        func.sum(case((AlertRule.alert_state == 'alerting', 1), else_=0)).label('alerting_count')
+        func.sum(case((AlertRuleState.alert_state == 'alerting', 1), else_=0)).label('alerting_count')
+    ).outerjoin(
+        AlertRuleState, rule_state_service.aggregate_join_condition(AlertRule.id)
     ).group_by(AlertRule.category).all()
     
     # 按等级统计
@@ -151,6 +184,8 @@ def create_rule(db: Session, rule: Dict[str, Any]) -> AlertRule:
         tpl = db.query(AlertNotifyTemplate).filter(AlertNotifyTemplate.id == notify_template_id).first()
         if not tpl:
             raise HTTPException(status_code=400, detail="请选择需要发送的下游告警（通知模板不存在）")
+    _validate_rule(rule)
+    _validate_parent_rule(db, None, rule.get('parent_rule_id'))
     
     db_rule = AlertRule(**rule)
     db.add(db_rule)
@@ -173,11 +208,15 @@ def update_rule(db: Session, rule_id: int, rule_data: Dict[str, Any]) -> Optiona
         tpl = db.query(AlertNotifyTemplate).filter(AlertNotifyTemplate.id == notify_template_id).first()
         if not tpl:
             raise HTTPException(status_code=400, detail="通知模板不存在")
+    _validate_rule(rule_data)
+    if 'parent_rule_id' in rule_data:
+        _validate_parent_rule(db, rule_id, rule_data['parent_rule_id'])
     
     for k, v in rule_data.items():
         setattr(db_rule, k, v)
     db.commit()
     db.refresh(db_rule)
+    rule_cache.invalidate_rule(rule_id)
     return db_rule
 
 # 删除规则
@@ -190,6 +229,7 @@ def delete_rule(db: Session, rule_id: int) -> bool:
         return False
     db.delete(db_rule)
     db.commit()
+    rule_cache.invalidate_rule(rule_id)
     return True
 
 # 批量更新分组
@@ -204,4 +244,6 @@ def batch_update_category(db: Session, rule_ids: List[int], category: str) -> in
         synchronize_session=False
     )
     db.commit()
+    for rule_id in rule_ids:
+        rule_cache.invalidate_rule(rule_id)
     return updated_count 
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""
+告警运行状态表读写
+告警引擎的运行时状态（告警状态、发送计数、告警时间）保存在 alert_rule_state 表中，
+按 (规则ID, 序列指纹) 存储；fingerprint 为空字符串的记录是规则的汇总状态。
+规则定义表 alert_rule 只由界面修改，引擎不再写入。
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from app.models import AlertRuleState
+
+# 规则汇总状态记录使用的指纹
+RULE_AGGREGATE_FINGERPRINT = ''
+
+# 引擎写入的状态字段（不包含界面请求的 manual_state）
+STATE_COLUMNS = ('labels', 'alert_state', 'send_count', 'alert_start_time', 'last_alert_time', 'last_value',
+                 'recent_values')
+
+
+def load_states(db: Session, rule_ids: Optional[Iterable[int]] = None) -> List[AlertRuleState]:
+    """加载运行状态（引擎启动时恢复告警实例，或从其他引擎实例接管规则时重新加载）"""
+    query = db.query(AlertRuleState)
+    if rule_ids is not None:
+        query = query.filter(AlertRuleState.rule_id.in_(list(rule_ids)))
+    return query.all()
+
+
+def get_aggregate_states(db: Session, rule_ids: Optional[Iterable[int]] = None) -> Dict[int, AlertRuleState]:
+    """获取规则汇总状态，返回 {rule_id: AlertRuleState}"""
+    query = db.query(AlertRuleState).filter(AlertRuleState.fingerprint == RULE_AGGREGATE_FINGERPRINT)
+    if rule_ids is not None:
+        query = query.filter(AlertRuleState.rule_id.in_(list(rule_ids)))
+    return {state.rule_id: state for state in query.all()}
+
+
+def aggregate_join_condition(rule_id_column):
+    """规则表与汇总状态记录的关联条件"""
+    return and_(
+        AlertRuleState.rule_id == rule_id_column,
+        AlertRuleState.fingerprint == RULE_AGGREGATE_FINGERPRINT
+    )
+
+
+def request_manual_state(db: Session, rule_id: int, state: str):
+    """
+    界面确认(silenced)/解决(ok)告警：写入汇总记录的 manual_state，由告警引擎下一轮应用到告警中的实例
+    同时更新汇总状态，界面立即可见；调用方负责提交事务
+    """
+    record = db.query(AlertRuleState).filter(
+        AlertRuleState.rule_id == rule_id,
+        AlertRuleState.fingerprint == RULE_AGGREGATE_FINGERPRINT
+    ).first()
+    if record is None:
+        record = AlertRuleState(rule_id=rule_id, fingerprint=RULE_AGGREGATE_FINGERPRINT, send_count=0)
+        db.add(record)
+    record.alert_state = state
+    record.manual_state = state
+
+
+def fetch_manual_requests(db: Session) -> Dict[int, str]:
+    """获取待引擎应用的界面状态请求"""
+    rows = db.query(AlertRuleState.rule_id, AlertRuleState.manual_state).filter(
+        AlertRuleState.fingerprint == RULE_AGGREGATE_FINGERPRINT,
+        AlertRuleState.manual_state.isnot(None)
+    ).all()
+    return {row.rule_id: row.manual_state for row in rows}
+
+
+def clear_manual_requests(db: Session, requests: Dict[int, str]):
+    """清除已应用的界面请求（只清除未被再次修改的请求）；调用方负责提交事务"""
+    for rule_id, state in requests.items():
+        db.query(AlertRuleState).filter(
+            AlertRuleState.rule_id == rule_id,
+            AlertRuleState.fingerprint == RULE_AGGREGATE_FINGERPRINT,
+            AlertRuleState.manual_state == state
+        ).update({'manual_state': None}, synchronize_session=False)
+
+
+def upsert_states(db: Session, rows: List[dict]):
+    """
+    批量写入运行状态，已存在的记录只更新引擎字段，保留界面写入的 manual_state
+    MySQL使用 INSERT ... ON DUPLICATE KEY UPDATE，其他数据库逐条合并；调用方负责提交事务
+    """
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect in ('mysql', 'sqlite'):
+        if dialect == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(AlertRuleState.__table__).values(rows)
+        if dialect == 'mysql':
+            update = {column: stmt.inserted[column] for column in STATE_COLUMNS if column in rows[0]}
+            update['updated_at'] = func.now()
+            stmt = stmt.on_duplicate_key_update(update)
+        else:
+            update = {column: stmt.excluded[column] for column in STATE_COLUMNS if column in rows[0]}
+            update['updated_at'] = func.now()
+            stmt = stmt.on_conflict_do_update(index_elements=['rule_id', 'fingerprint'], set_=update)
+        db.execute(stmt)
+        return
+
+    for row in rows:
+        db.merge(AlertRuleState(**row))
+
+
+def delete_states(db: Session, keys: List[tuple]):
+    """删除已恢复的告警实例记录，keys为 (rule_id, fingerprint) 列表；调用方负责提交事务"""
+    if not keys:
+        return
+    db.query(AlertRuleState).filter(or_(*[
+        and_(AlertRuleState.rule_id == rule_id, AlertRuleState.fingerprint == fingerprint)
+        for rule_id, fingerprint in keys
+    ])).delete(synchronize_session=False)
+
+
+def delete_rule_states(db: Session, rule_ids: Iterable[int]):
+    """删除规则的全部状态记录（规则删除或禁用时）；调用方负责提交事务"""
+    db.query(AlertRuleState).filter(
+        AlertRuleState.rule_id.in_(list(rule_ids))
+    ).delete(synchronize_session=False)
+
+
+def get_rule_alert_state(db: Session, rule_id: int) -> str:
+    """获取规则当前的汇总告警状态"""
+    state = db.query(AlertRuleState.alert_state).filter(
+        AlertRuleState.rule_id == rule_id,
+        AlertRuleState.fingerprint == RULE_AGGREGATE_FINGERPRINT
+    ).scalar()
+    return state or 'ok'
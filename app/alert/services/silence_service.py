@@ -0,0 +1,109 @@
+from app.models import AlertSilence
+from sqlalchemy.orm import Session
+from typing import List, Optional, Dict, Any
+from datetime import datetime
+from fastapi import HTTPException
+from app.alert.services.notify_router import parse_matchers
+from app.alert.services.silence_store import silence_store
+
+# 允许修改的静默字段
+SILENCE_FIELDS = ('matchers', 'starts_at', 'ends_at', 'comment', 'created_by')
+
+def _parse_time(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"时间格式不正确: {value}")
+
+def _validate_silence(values: Dict[str, Any]):
+    """校验匹配器（不能为空，避免静默全部告警）和时间范围"""
+    if not values.get('matchers'):
+        raise HTTPException(status_code=400, detail="静默匹配器不能为空")
+    try:
+        parse_matchers(values['matchers'])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if values['ends_at'] <= values['starts_at']:
+        raise HTTPException(status_code=400, detail="静默结束时间必须晚于开始时间")
+
+def silence_status(silence: AlertSilence, now: Optional[datetime] = None) -> str:
+    """静默状态: pending(未开始)/active(生效中)/expired(已结束)"""
+    now = now or datetime.now()
+    if silence.ends_at <= now:
+        return 'expired'
+    return 'active' if silence.starts_at <= now else 'pending'
+
+def get_silences(db: Session, status: Optional[str] = None) -> List[AlertSilence]:
+    """查询静默，可按状态筛选，按开始时间倒序"""
+    now = datetime.now()
+    query = db.query(AlertSilence)
+    if status == 'active':
+        query = query.filter(AlertSilence.starts_at <= now, AlertSilence.ends_at > now)
+    elif status == 'pending':
+        query = query.filter(AlertSilence.starts_at > now)
+    elif status == 'expired':
+        query = query.filter(AlertSilence.ends_at <= now)
+    return query.order_by(AlertSilence.starts_at.desc()).all()
+
+def get_silence(db: Session, silence_id: int) -> Optional[AlertSilence]:
+    return db.query(AlertSilence).filter(AlertSilence.id == silence_id).first()
+
+def create_silence(db: Session, data: Dict[str, Any]) -> AlertSilence:
+    """创建静默，开始时间默认为当前时间"""
+    values = {key: data[key] for key in SILENCE_FIELDS if key in data}
+    values['starts_at'] = _parse_time(values.get('starts_at') or datetime.now())
+    if not values.get('ends_at'):
+        raise HTTPException(status_code=400, detail="静默结束时间不能为空")
+    values['ends_at'] = _parse_time(values['ends_at'])
+    _validate_silence(values)
+    silence = AlertSilence(**values)
+    db.add(silence)
+    db.commit()
+    db.refresh(silence)
+    silence_store.invalidate()
+    return silence
+
+def update_silence(db: Session, silence_id: int, data: Dict[str, Any]) -> Optional[AlertSilence]:
+    silence = get_silence(db, silence_id)
+    if not silence:
+        return None
+    values = {key: data[key] for key in SILENCE_FIELDS if key in data}
+    for key in ('starts_at', 'ends_at'):
+        if values.get(key):
+            values[key] = _parse_time(values[key])
+    _validate_silence({
+        'matchers': values.get('matchers', silence.matchers),
+        'starts_at': values.get('starts_at') or silence.starts_at,
+        'ends_at': values.get('ends_at') or silence.ends_at
+    })
+    for key, value in values.items():
+        if value is not None:
+            setattr(silence, key, value)
+    db.commit()
+    db.refresh(silence)
+    silence_store.invalidate()
+    return silence
+
+def expire_silence(db: Session, silence_id: int) -> Optional[AlertSilence]:
+    """提前结束静默（保留记录）"""
+    silence = get_silence(db, silence_id)
+    if not silence:
+        return None
+    now = datetime.now()
+    if silence.ends_at > now:
+        silence.ends_at = max(now, silence.starts_at)
+        db.commit()
+        db.refresh(silence)
+        silence_store.invalidate()
+    return silence
+
+def delete_silence(db: Session, silence_id: int) -> bool:
+    silence = get_silence(db, silence_id)
+    if not silence:
+        return False
+    db.delete(silence)
+    db.commit()
+    silence_store.invalidate()
+    return True
@@ -0,0 +1,151 @@
+"""
+告警静默（维护窗口）
+静默在 [starts_at, ends_at) 内按标签匹配器匹配告警（标签见 notify_router.alert_labels），
+命中静默的序列进入 muted 状态：不渲染模板、不调用下游；静默结束后仍满足条件的序列按新告警处理。
+- 时间索引：全部静默的开始/结束时间排序为分界点，相邻分界点之间生效的静默集合不变，
+  按时间二分查找所在时间段，该时间段的标签索引首次查询时构建并缓存（补评估回放历史时刻同样适用）
+- 标签索引：与通知路由相同，相等匹配器按标签值哈希分桶，只检查桶命中的静默和没有相等匹配器的静默
+检查一条告警的代价为一次二分加上标签数和候选静默数，与静默总数基本无关。
+"""
+
+import bisect
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import AlertSilence
+from app.alert.services.notify_router import Matcher, MatcherIndex, MatcherSet, alert_labels, parse_matchers
+from app.config import get_settings
+from app.utils.logger import logger
+
+
+class Silence(MatcherSet):
+    """编译后的静默"""
+
+    __slots__ = ('id', 'starts_at', 'ends_at')
+
+    def __init__(self, silence_id: int, matchers: List[Matcher], starts_at: datetime, ends_at: datetime):
+        super().__init__(matchers)
+        self.id = silence_id
+        self.starts_at = starts_at
+        self.ends_at = ends_at
+
+
+class SilenceIndex:
+    """按时间段和标签索引的静默集合（构建后只读，时间段索引惰性构建）"""
+
+    def __init__(self, silences: List[Silence]):
+        self._silences = silences
+        self._points = sorted({s.starts_at for s in silences} | {s.ends_at for s in silences})
+        # 时间段下标 -> 该时间段生效静默的标签索引，没有生效静默时为None
+        self._segments: Dict[int, Optional[MatcherIndex]] = {}
+
+    def active(self, at: datetime) -> Optional[MatcherIndex]:
+        """at时刻生效静默的标签索引"""
+        segment = bisect.bisect_right(self._points, at)
+        if segment in self._segments:
+            return self._segments[segment]
+        # 同一时间段内生效的静默集合相同，按时间段缓存（并发构建结果相同，无需加锁）
+        active = [s for s in self._silences if s.starts_at <= at < s.ends_at]
+        index = MatcherIndex(active) if active else None
+        self._segments[segment] = index
+        return index
+
+    def __len__(self) -> int:
+        return len(self._silences)
+
+
+class SilenceStore:
+    """静默存储，线程安全；静默表变化时重新加载"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index: Optional[SilenceIndex] = None
+        self._version = None
+        self._stats = {"silences": 0, "invalid_silences": 0, "reloads": 0, "muted_series": 0}
+
+    def refresh(self, db: Session):
+        """
+        按 (静默数, 最大updated_at) 检查静默表是否变化，变化时重新加载；加载失败时保留原索引
+        结束时间早于补评估窗口的静默不再加载
+        """
+        try:
+            version = tuple(db.query(func.count(AlertSilence.id), func.max(AlertSilence.updated_at)).one())
+            with self._lock:
+                if self._index is not None and version == self._version:
+                    return
+            since = datetime.now() - timedelta(seconds=max(get_settings().alert_engine_catchup_max_window, 0))
+            rows = db.query(AlertSilence).filter(AlertSilence.ends_at > since).all()
+        except Exception as e:
+            logger.error(f"加载告警静默失败: {e}")
+            return
+
+        silences = []
+        invalid = 0
+        for row in rows:
+            try:
+                silences.append(Silence(row.id, parse_matchers(row.matchers), row.starts_at, row.ends_at))
+            except ValueError as e:
+                invalid += 1
+                logger.error(f"告警静默 {row.id} 匹配器不正确，已忽略: {e}")
+        with self._lock:
+            self._index = SilenceIndex(silences)
+            self._version = version
+            self._stats["silences"] = len(silences)
+            self._stats["invalid_silences"] = invalid
+            self._stats["reloads"] += 1
+        logger.info(f"告警静默已加载: {len(silences)} 条, 非法 {invalid} 条")
+
+    def invalidate(self):
+        """静默修改后调用，下一次刷新时重新加载"""
+        with self._lock:
+            self._version = None
+
+    def match(self, labels: Dict[str, str], at: datetime) -> Optional[int]:
+        """at时刻匹配告警标签（alert_labels）的静默ID，没有时返回None"""
+        with self._lock:
+            index = self._index
+        active = index.active(at) if index is not None else None
+        if active is None:
+            return None
+        silence = active.first(labels)
+        return silence.id if silence is not None else None
+
+    def series_filter(self, rule, at: datetime) -> Optional[Callable[[dict], Optional[int]]]:
+        """
+        返回判断规则的序列在at时刻是否被静默的函数（参数为指标标签，返回静默ID）；
+        at时刻没有生效的静默时返回None，评估时无需额外开销
+        """
+        with self._lock:
+            index = self._index
+        active = index.active(at) if index is not None else None
+        if active is None:
+            return None
+
+        def silenced(metric_labels: dict) -> Optional[int]:
+            silence = active.first(alert_labels(rule, metric_labels))
+            if silence is None:
+                return None
+            self._count("muted_series")
+            return silence.id
+        return silenced
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def reset(self):
+        with self._lock:
+            self._index = None
+            self._version = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+# 全局静默存储
+silence_store = SilenceStore()
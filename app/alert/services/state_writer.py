@@ -0,0 +1,158 @@
+"""
+告警引擎状态写缓冲
+一轮评估中的实例状态变更和待发送通知先在内存中收集，轮次结束时一次性写库：
+状态表批量UPSERT/DELETE，告警历史与发件箱记录在同一事务中写入。
+批量写入失败时回滚并按规则逐条重试，单条记录的问题不会导致整批丢失。
+"""
+
+import threading
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models import SessionLocal
+from app.alert.services import rule_state_service
+from app.alert.services.instance_store import AlertInstance, instance_store
+from app.alert.services.notify_outbox import enqueue_notifications, notify_outbox
+from app.utils.logger import logger
+
+
+class StateChange:
+    """一条规则在本轮需要写入状态表的变更"""
+
+    __slots__ = ('rule_id', 'upserts', 'deletes', 'aggregate', 'instances')
+
+    def __init__(self, rule_id: int):
+        self.rule_id = rule_id
+        # 需要写入的状态行（实例行和汇总行）
+        self.upserts: List[dict] = []
+        # 需要删除的已恢复实例 (rule_id, fingerprint)
+        self.deletes: List[tuple] = []
+        # 新的汇总状态，未变化时为None
+        self.aggregate: Optional[tuple] = None
+        # 本次写入涉及的实例，写库成功后更新其已保存状态
+        self.instances: List[AlertInstance] = []
+
+    def __bool__(self):
+        return bool(self.upserts or self.deletes)
+
+    def merge(self, other: 'StateChange'):
+        """合并同一规则的后续变更（后者覆盖前者）"""
+        keys = {(row['rule_id'], row['fingerprint']) for row in other.upserts} | set(other.deletes)
+        self.upserts = [row for row in self.upserts if (row['rule_id'], row['fingerprint']) not in keys]
+        self.deletes = [key for key in self.deletes if key not in keys]
+        self.upserts.extend(other.upserts)
+        self.deletes.extend(other.deletes)
+        self.aggregate = other.aggregate if other.aggregate is not None else self.aggregate
+        self.instances.extend(other.instances)
+
+
+def write_state_changes(db: Session, changes: List[StateChange]):
+    """在一个事务中写入状态变更，成功后同步内存中的已保存状态"""
+    rows = [row for change in changes for row in change.upserts]
+    deletes = [key for change in changes for key in change.deletes]
+    rule_state_service.upsert_states(db, rows)
+    rule_state_service.delete_states(db, deletes)
+    db.commit()
+    for change in changes:
+        instance_store.mark_persisted(change.rule_id, change.aggregate, change.instances)
+    return len(rows), len(deletes)
+
+
+class StateWriteBuffer:
+    """单轮评估的写缓冲，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # rule_id -> StateChange
+        self._state_changes: Dict[int, StateChange] = {}
+        # (告警历史字段, 发件箱字段)
+        self._notifications: List[tuple] = []
+        self._closed = False
+        self.stats = {"state_upserts": 0, "state_deletes": 0, "histories": 0, "duplicate_notifications": 0,
+                      "fallback_rows": 0, "failed_rows": 0}
+
+    def stage_state_change(self, change: StateChange):
+        """登记规则状态变更（同一规则多次变更时合并）"""
+        with self._lock:
+            if not self._closed:
+                existing = self._state_changes.get(change.rule_id)
+                if existing is None:
+                    self._state_changes[change.rule_id] = change
+                else:
+                    existing.merge(change)
+                return
+        # 轮次已结束（超时规则在后台完成），直接写库
+        self._write_state_changes([change])
+
+    def stage_notification(self, history: dict, outboxes: List[dict]):
+        """登记一条待发送通知（告警历史和对应的发件箱记录）"""
+        with self._lock:
+            if not self._closed:
+                self._notifications.append((history, outboxes))
+                return
+        self._write_notifications([(history, outboxes)])
+
+    def flush(self):
+        """写入本轮收集的全部变更，之后登记的变更直接写库"""
+        with self._lock:
+            self._closed = True
+            state_changes, self._state_changes = list(self._state_changes.values()), {}
+            notifications, self._notifications = self._notifications, []
+
+        if state_changes:
+            self._write_state_changes(state_changes)
+        if notifications:
+            self._write_notifications(notifications)
+        return self.stats
+
+    def _write_state_changes(self, changes: List[StateChange]):
+        db = SessionLocal()
+        try:
+            upserts, deletes = write_state_changes(db, changes)
+            self._count("state_upserts", upserts)
+            self._count("state_deletes", deletes)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"批量写入告警状态失败，改为按规则逐条写入: {e}")
+            for change in changes:
+                try:
+                    write_state_changes(db, [change])
+                    self._count("fallback_rows", len(change.upserts) + len(change.deletes))
+                except Exception as row_e:
+                    db.rollback()
+                    self._count("failed_rows", len(change.upserts) + len(change.deletes))
+                    logger.error(f"写入规则 {change.rule_id} 告警状态失败: {row_e}")
+        finally:
+            db.close()
+
+    def _write_notifications(self, notifications: List[tuple]):
+        db = SessionLocal()
+        try:
+            written, duplicates = enqueue_notifications(db, notifications)
+            db.commit()
+            self._count("histories", written)
+            self._count("duplicate_notifications", duplicates)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"批量写入告警通知失败，改为逐条写入: {e}")
+            written = 0
+            for item in notifications:
+                try:
+                    count, duplicates = enqueue_notifications(db, [item])
+                    db.commit()
+                    written += count
+                    self._count("fallback_rows", count)
+                    self._count("duplicate_notifications", duplicates)
+                except Exception as row_e:
+                    db.rollback()
+                    self._count("failed_rows", 1)
+                    logger.error(f"写入告警通知失败: rule_id={item[0].get('rule_id')}, {row_e}")
+        finally:
+            db.close()
+        if written:
+            notify_outbox.wake()
+
+    def _count(self, key: str, value: int):
+        with self._lock:
+            self.stats[key] += value
@@ -0,0 +1,131 @@
+"""
+告警引擎时间预算与过载监控
+- 每个时间片有固定的评估预算（alert_engine_tick_budget），规则按优先级（告警等级）评估，
+  预算用完时尚未开始的规则推迟到下一个时间片，保证重要规则总能被评估
+- 按单条规则评估耗时的指数移动平均估算本时间片能评估的规则数，超出部分直接推迟，
+  不再排队等待注定超时的评估
+- 记录每轮耗时、推迟/跳过的规则和调度器错过的时间片，通过引擎状态接口查看评估能力是否成为瓶颈
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+# 告警等级优先级，数值越小越先评估
+LEVEL_PRIORITY = {
+    'critical': 0,
+    'high': 1,
+    'error': 1,
+    'warning': 2,
+    'medium': 2,
+    'low': 3,
+    'info': 4,
+}
+
+# 单条规则评估耗时的平滑系数
+EWMA_ALPHA = 0.2
+
+# 状态接口中最多列出的推迟/跳过规则数
+MAX_LISTED_RULES = 50
+
+
+def rule_priority(rule) -> tuple:
+    """规则评估顺序：告警等级优先，同等级按规则ID"""
+    return LEVEL_PRIORITY.get((rule.level or '').lower(), len(LEVEL_PRIORITY)), rule.id
+
+
+def prioritize(rules: Iterable) -> List:
+    """按优先级排序规则"""
+    return sorted(rules, key=rule_priority)
+
+
+class TickMonitor:
+    """评估时间片监控，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rule_cost: Optional[float] = None
+        self._durations = deque(maxlen=120)
+        self._last_tick: Dict = {}
+        self._totals = {"ticks": 0, "overruns": 0, "deferred": 0, "skipped": 0, "missed_ticks": 0}
+
+    def observe_rule(self, seconds: float):
+        """记录一条规则的评估耗时"""
+        with self._lock:
+            if self._rule_cost is None:
+                self._rule_cost = seconds
+            else:
+                self._rule_cost += EWMA_ALPHA * (seconds - self._rule_cost)
+
+    def capacity(self, budget: float, workers: int) -> Optional[int]:
+        """估算预算内可评估的规则数，尚无耗时数据时返回None（不限制）"""
+        with self._lock:
+            cost = self._rule_cost
+        if not cost or cost <= 0:
+            return None
+        return max(int(budget * max(workers, 1) / cost), 1)
+
+    def record_tick(self, started: float, budget: float, due: int, evaluated: int,
+                    deferred: List, skipped: List, isolated: List):
+        """
+        记录一个时间片的评估结果
+        deferred: 预算不足推迟到下一时间片的规则
+        skipped: 上一次评估尚未完成而跳过的规则
+        isolated: 超出预算仍在后台执行的规则
+        """
+        duration = time.monotonic() - started
+        overrun = duration > budget or bool(deferred) or bool(isolated)
+        with self._lock:
+            self._durations.append(duration)
+            self._totals["ticks"] += 1
+            self._totals["overruns"] += int(overrun)
+            self._totals["deferred"] += len(deferred)
+            self._totals["skipped"] += len(skipped)
+            self._last_tick = {
+                "finished_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+                "duration_seconds": round(duration, 3),
+                "budget_seconds": budget,
+                "overrun": overrun,
+                "due_rules": due,
+                "evaluated_rules": evaluated,
+                "deferred_rules": _describe(deferred),
+                "skipped_rules": _describe(skipped),
+                "isolated_rules": _describe(isolated),
+            }
+        return overrun
+
+    def missed_tick(self):
+        """调度器因上一时间片仍在执行而跳过了一次运行"""
+        with self._lock:
+            self._totals["missed_ticks"] += 1
+
+    def reset(self):
+        with self._lock:
+            self._rule_cost = None
+            self._durations.clear()
+            self._last_tick = {}
+
+    def stats(self) -> dict:
+        with self._lock:
+            durations = sorted(self._durations)
+            return {
+                "rule_cost_seconds": round(self._rule_cost, 4) if self._rule_cost is not None else None,
+                "recent_ticks": len(durations),
+                "avg_duration_seconds": round(sum(durations) / len(durations), 3) if durations else None,
+                "max_duration_seconds": round(durations[-1], 3) if durations else None,
+                "totals": dict(self._totals),
+                "last_tick": dict(self._last_tick),
+            }
+
+
+def _describe(rules: List) -> dict:
+    """推迟/跳过的规则摘要：总数和前若干条规则"""
+    return {
+        "count": len(rules),
+        "rules": [{"id": rule.id, "name": rule.name, "level": rule.level} for rule in rules[:MAX_LISTED_RULES]],
+    }
+
+
+# 全局时间片监控
+tick_monitor = TickMonitor()
@@ -0,0 +1,7 @@
+-- 告警引擎检查点表（记录最近一次成功评估的时间，重启后据此补评估停机期间的规则）
+CREATE TABLE IF NOT EXISTS `alert_engine_checkpoint` (
+  `name` VARCHAR(64) NOT NULL COMMENT '检查点名称',
+  `last_tick_at` DATETIME NOT NULL COMMENT '最近一次成功评估的时间',
+  `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  PRIMARY KEY (`name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='告警引擎检查点表';
@@ -0,0 +1,11 @@
+-- 告警引擎实例表（多实例部署时的心跳租约，存活实例按一致性哈希分担规则评估）
+CREATE TABLE IF NOT EXISTS `alert_engine_instance` (
+  `instance_id` VARCHAR(128) NOT NULL COMMENT '引擎实例ID(主机名-进程号-随机串)',
+  `hostname` VARCHAR(128) DEFAULT NULL COMMENT '主机名',
+  `pid` INT DEFAULT NULL COMMENT '进程号',
+  `started_at` DATETIME NOT NULL COMMENT '实例启动时间',
+  `heartbeat_at` DATETIME NOT NULL COMMENT '最近一次心跳时间，超过租约未更新视为下线',
+  `owned_rules` INT DEFAULT 0 COMMENT '当前负责评估的规则数',
+  PRIMARY KEY (`instance_id`),
+  INDEX `idx_heartbeat_at` (`heartbeat_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='告警引擎实例表';
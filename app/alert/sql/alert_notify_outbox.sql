@@ -0,0 +1,25 @@
+-- 告警通知发件箱（持久化待发送通知，失败后按退避策略重试）
+CREATE TABLE IF NOT EXISTS `alert_notify_outbox` (
+  `id` INT AUTO_INCREMENT PRIMARY KEY COMMENT '主键',
+  `idempotency_key` VARCHAR(64) NOT NULL COMMENT '幂等键(规则+序列+触发时间+模板)',
+  `rule_id` INT NOT NULL COMMENT '规则ID',
+  `history_id` INT DEFAULT NULL COMMENT '关联的告警历史ID',
+  `template_id` INT NOT NULL COMMENT '通知模板ID',
+  `channel` VARCHAR(32) NOT NULL COMMENT '通知渠道(email/http/lechat)',
+  `payload` JSON NOT NULL COMMENT '告警上下文(JSON格式)',
+  `group_key` VARCHAR(32) DEFAULT NULL COMMENT '通知分组键(模板+group_by标签)，同组记录合并发送，为空表示不分组',
+  `status` VARCHAR(16) NOT NULL DEFAULT 'pending' COMMENT '状态(pending/sending/sent/failed)',
+  `attempts` INT NOT NULL DEFAULT 0 COMMENT '已尝试次数',
+  `max_attempts` INT NOT NULL DEFAULT 5 COMMENT '最大尝试次数',
+  `next_attempt_at` DATETIME NOT NULL COMMENT '下次尝试时间',
+  `locked_by` VARCHAR(128) DEFAULT NULL COMMENT '领取该记录的发送进程',
+  `locked_until` DATETIME DEFAULT NULL COMMENT '领取租约到期时间，过期后可被重新领取',
+  `last_error` TEXT DEFAULT NULL COMMENT '最近一次失败原因',
+  `sent_at` DATETIME DEFAULT NULL COMMENT '发送成功时间',
+  `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  UNIQUE KEY `uk_idempotency_key` (`idempotency_key`),
+  INDEX `idx_status_next_attempt` (`status`, `next_attempt_at`),
+  INDEX `idx_group_key_status` (`group_key`, `status`),
+  INDEX `idx_history_id` (`history_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='告警通知发件箱';
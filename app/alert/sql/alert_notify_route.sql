@@ -0,0 +1,22 @@
+-- 告警通知路由表（按标签把告警路由到通知模板，树形结构，父路由先匹配）
+CREATE TABLE IF NOT EXISTS `alert_notify_route` (
+  `id` INT AUTO_INCREMENT PRIMARY KEY COMMENT '主键',
+  `parent_id` INT DEFAULT NULL COMMENT '父路由ID，为空表示顶层路由',
+  `name` VARCHAR(128) NOT NULL COMMENT '路由名称',
+  `matchers` JSON DEFAULT NULL COMMENT '标签匹配器列表(JSON格式)',
+  `notify_template_id` INT DEFAULT NULL COMMENT '通知模板ID，为空时继承父路由',
+  `continue_matching` BOOLEAN DEFAULT FALSE COMMENT '命中后是否继续匹配后续同级路由',
+  `sort_order` INT DEFAULT 0 COMMENT '同级路由匹配顺序(从小到大)',
+  `enabled` BOOLEAN DEFAULT TRUE COMMENT '是否启用',
+  `description` TEXT DEFAULT NULL COMMENT '路由描述',
+  `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  
+  -- 外键约束
+  FOREIGN KEY (`parent_id`) REFERENCES `alert_notify_route`(`id`) ON DELETE CASCADE,
+  FOREIGN KEY (`notify_template_id`) REFERENCES `alert_notify_template`(`id`) ON DELETE SET NULL,
+  
+  -- 索引
+  INDEX `idx_parent_id` (`parent_id`),
+  INDEX `idx_updated_at` (`updated_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='告警通知路由表';
@@ -5,6 +5,7 @@ CREATE TABLE IF NOT EXISTS `alert_rule` (
   `category` VARCHAR(64) DEFAULT 'other' COMMENT '组件分组(hdfs/hive/spark/mysql/kafka/zookeeper/yarn/hbase/elasticsearch/prometheus/grafana/other)',
   `promql` TEXT NOT NULL COMMENT 'PromQL查询表达式',
   `condition` VARCHAR(64) NOT NULL COMMENT '触发条件(如: > 80, < 0.5)',
+  `eval_interval` INT DEFAULT NULL COMMENT '评估间隔(秒)，为空时使用引擎默认间隔',
   `level` VARCHAR(32) NOT NULL DEFAULT 'medium' COMMENT '告警等级(low/medium/high/critical)',
   `description` TEXT DEFAULT NULL COMMENT '规则描述',
   `labels` JSON DEFAULT NULL COMMENT '规则标签(JSON格式，用于分组和过滤)',
@@ -14,11 +15,15 @@ CREATE TABLE IF NOT EXISTS `alert_rule` (
   `alert_state` VARCHAR(32) DEFAULT 'ok' COMMENT '当前告警状态(ok/alerting/silenced)',
   `last_alert_time` DATETIME DEFAULT NULL COMMENT '最后一次告警时间',
   `notify_template_id` INT DEFAULT NULL COMMENT '通知模板ID',
+  `parent_rule_id` INT DEFAULT NULL COMMENT '父规则ID，父规则告警中时抑制本规则',
+  `inhibit_labels` JSON DEFAULT NULL COMMENT '抑制匹配标签名列表，为空时父规则告警即抑制整条规则',
+  `inhibit_skip_eval` TINYINT(1) DEFAULT 0 COMMENT '整条规则被抑制时是否跳过评估',
   `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
   
   -- 外键约束
   FOREIGN KEY (`notify_template_id`) REFERENCES `alert_notify_template`(`id`) ON DELETE SET NULL,
+  FOREIGN KEY (`parent_rule_id`) REFERENCES `alert_rule`(`id`) ON DELETE SET NULL,
   
   -- 索引
   INDEX `idx_category` (`category`),
@@ -26,6 +31,7 @@ CREATE TABLE IF NOT EXISTS `alert_rule` (
   INDEX `idx_enabled` (`enabled`),
   INDEX `idx_alert_state` (`alert_state`),
   INDEX `idx_last_alert_time` (`last_alert_time`),
+  INDEX `idx_parent_rule_id` (`parent_rule_id`),
   INDEX `idx_created_at` (`created_at`),
   INDEX `idx_category_level` (`category`, `level`),
   INDEX `idx_enabled_state` (`enabled`, `alert_state`)
@@ -0,0 +1,18 @@
+-- 告警运行状态表（告警引擎写入，与规则定义表分离）
+CREATE TABLE IF NOT EXISTS `alert_rule_state` (
+  `rule_id` INT NOT NULL COMMENT '规则ID',
+  `fingerprint` VARCHAR(32) NOT NULL DEFAULT '' COMMENT '序列标签指纹，空字符串表示规则汇总状态',
+  `labels` JSON DEFAULT NULL COMMENT '序列标签(JSON格式)',
+  `alert_state` VARCHAR(32) DEFAULT 'ok' COMMENT '当前告警状态(ok/pending/inhibited/muted/alerting/silenced)',
+  `send_count` INT DEFAULT 0 COMMENT '当前已发送次数',
+  `alert_start_time` DATETIME DEFAULT NULL COMMENT '告警开始时间(pending状态为条件首次满足时间)',
+  `last_alert_time` DATETIME DEFAULT NULL COMMENT '最后一次告警时间',
+  `last_value` VARCHAR(64) DEFAULT NULL COMMENT '最近一次监控值',
+  `recent_values` JSON DEFAULT NULL COMMENT '最近的监控值(检查点，按时间从旧到新)',
+  `manual_state` VARCHAR(32) DEFAULT NULL COMMENT '界面确认/解决请求的状态，引擎应用后清空',
+  `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  PRIMARY KEY (`rule_id`, `fingerprint`),
+  FOREIGN KEY (`rule_id`) REFERENCES `alert_rule`(`id`) ON DELETE CASCADE,
+  INDEX `idx_alert_state` (`alert_state`),
+  INDEX `idx_manual_state` (`manual_state`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='告警运行状态表';
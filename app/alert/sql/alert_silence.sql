@@ -0,0 +1,15 @@
+-- 告警静默表（维护窗口：时间段内按标签匹配的告警不发送通知）
+CREATE TABLE IF NOT EXISTS `alert_silence` (
+  `id` INT AUTO_INCREMENT PRIMARY KEY COMMENT '主键',
+  `matchers` JSON NOT NULL COMMENT '标签匹配器列表(JSON格式)',
+  `starts_at` DATETIME NOT NULL COMMENT '静默开始时间',
+  `ends_at` DATETIME NOT NULL COMMENT '静默结束时间',
+  `comment` TEXT DEFAULT NULL COMMENT '静默原因，如维护说明',
+  `created_by` VARCHAR(128) DEFAULT NULL COMMENT '创建人',
+  `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  
+  -- 索引
+  INDEX `idx_ends_at` (`ends_at`),
+  INDEX `idx_updated_at` (`updated_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='告警静默表';
@@ -0,0 +1,22 @@
+-- 告警引擎升级脚本（已有数据库升级到当前版本时执行，新建数据库直接使用 docs/database_schema.sql）
+-- 执行前先执行本目录下新增表的建表脚本（均为 CREATE TABLE IF NOT EXISTS，可重复执行）；
+-- 本脚本中的 ALTER TABLE 只需执行一次，重复执行会报 Duplicate column / Duplicate key name，可忽略
+
+-- 规则独立评估间隔
+ALTER TABLE `alert_rule`
+  ADD COLUMN `eval_interval` INT DEFAULT NULL COMMENT '评估间隔(秒)，为空时使用引擎默认间隔' AFTER `condition`;
+
+-- 父子规则告警抑制
+ALTER TABLE `alert_rule`
+  ADD COLUMN `parent_rule_id` INT DEFAULT NULL COMMENT '父规则ID，父规则告警中时抑制本规则' AFTER `notify_template_id`,
+  ADD COLUMN `inhibit_labels` JSON DEFAULT NULL COMMENT '抑制匹配标签名列表，为空时父规则告警即抑制整条规则' AFTER `parent_rule_id`,
+  ADD COLUMN `inhibit_skip_eval` TINYINT(1) DEFAULT 0 COMMENT '整条规则被抑制时是否跳过评估' AFTER `inhibit_labels`,
+  ADD INDEX `idx_parent_rule_id` (`parent_rule_id`),
+  ADD CONSTRAINT `fk_alert_rule_parent_rule_id` FOREIGN KEY (`parent_rule_id`) REFERENCES `alert_rule`(`id`) ON DELETE SET NULL;
+
+-- 告警运行状态迁移到 alert_rule_state：把 alert_rule 上原有的规则级状态回填为汇总记录（fingerprint为空字符串）
+-- 使用 INSERT IGNORE，已有汇总记录的规则保持不变，可重复执行
+INSERT IGNORE INTO `alert_rule_state` (`rule_id`, `fingerprint`, `alert_state`, `send_count`, `alert_start_time`, `last_alert_time`)
+SELECT `id`, '', IFNULL(`alert_state`, 'ok'), IFNULL(`send_count`, 0), `alert_start_time`, `last_alert_time`
+FROM `alert_rule`
+WHERE IFNULL(`alert_state`, 'ok') <> 'ok' OR IFNULL(`send_count`, 0) > 0 OR `last_alert_time` IS NOT NULL;
@@ -1,44 +1,36 @@
-import aiohttp
 import asyncio
+import functools
 import re
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 from app.config import get_settings
 from app.cluster.config.metrics_config import HOST_METRICS
+from app.utils.http_client import prometheus_http
 from app.utils.logger import logger
 
 class PrometheusService:
     """Prometheus查询服务"""
     
     def __init__(self):
-        self.session: Optional[aiohttp.ClientSession] = None
         self.prometheus_url = get_settings().prometheus_url
     
-    async def _get_session(self) -> aiohttp.ClientSession:
-        """获取HTTP会话"""
-        if self.session is None or self.session.closed:
-            timeout = aiohttp.ClientTimeout(total=10)
-            self.session = aiohttp.ClientSession(timeout=timeout)
-        return self.session
-    
-    async def close_session(self):
-        """关闭HTTP会话"""
-        if self.session and not self.session.closed:
-            await self.session.close()
+    async def _get(self, url: str, params: dict):
+        """通过与告警引擎共享的连接池发送请求（在线程池中执行，不阻塞事件循环）"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(prometheus_http.get, url, params))
     
     async def query_instant(self, query: str) -> Dict:
         """执行即时查询"""
         try:
-            session = await self._get_session()
             url = f"{self.prometheus_url}/api/v1/query"
             params = {'query': query}
             
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    logger.error(f"Prometheus查询失败: {response.status} - {await response.text()}")
-                    return {"status": "error", "error": f"HTTP {response.status}"}
+            response = await self._get(url, params)
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logger.error(f"Prometheus查询失败: {response.status_code} - {response.text}")
+                return {"status": "error", "error": f"HTTP {response.status_code}"}
                     
         except Exception as e:
             logger.error(f"Prometheus查询异常: {e}")
@@ -47,7 +39,6 @@ class PrometheusService:
     async def query_range(self, query: str, start: str, end: str, step: str = "15s") -> Dict:
         """执行范围查询"""
         try:
-            session = await self._get_session()
             url = f"{self.prometheus_url}/api/v1/query_range"
             params = {
                 'query': query,
@@ -56,12 +47,12 @@ class PrometheusService:
                 'step': step
             }
             
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    logger.error(f"Prometheus范围查询失败: {response.status}")
-                    return {"status": "error", "error": f"HTTP {response.status}"}
+            response = await self._get(url, params)
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logger.error(f"Prometheus范围查询失败: {response.status_code}")
+                return {"status": "error", "error": f"HTTP {response.status_code}"}
                     
         except Exception as e:
             logger.error(f"Prometheus范围查询异常: {e}")
@@ -23,6 +23,11 @@ class Settings(BaseSettings):
 
     # Prometheus配置
     prometheus_url: str = "http://localhost:9090/"
+    prometheus_http_pool_size: int = 32  # 连接池大小，不小于告警引擎查询线程数
+    prometheus_connect_timeout: int = 3  # 连接超时(秒)
+    prometheus_read_timeout: int = 10  # 读取超时(秒)
+    prometheus_http_retries: int = 2  # 网络错误和502/503/504时的重试次数
+    prometheus_http_retry_backoff_ms: int = 200  # 首次重试等待(毫秒)，之后翻倍并加入随机抖动
 
     # MySQL配置
     mysql_host: str = "localhost"
@@ -31,13 +36,50 @@ class Settings(BaseSettings):
     mysql_db: str = "bigdataops"
 
     # APScheduler定时任务配置
-    alert_engine_interval: int = 30  # 秒
+    alert_engine_interval: int = 30  # 规则默认评估间隔(秒)，规则未设置eval_interval时使用
+    alert_engine_resolution: int = 5  # 调度时间片(秒)，每个时间片评估到期的规则，也是评估间隔的下限
+
+    # 告警引擎并行评估配置
+    alert_engine_parallel: bool = True  # 是否启用并行评估
+    alert_engine_process: bool = False  # 告警引擎运行在独立子进程中，不与API请求处理争用GIL
+    alert_engine_query_workers: int = 16  # Prometheus查询阶段线程数
+    alert_engine_tick_budget: int = 4  # 每个时间片的评估预算(秒)，应小于调度时间片；超出预算的规则推迟或隔离
+    alert_engine_rule_full_sync_interval: int = 600  # 规则注册表全量同步间隔(秒)，其余轮次增量同步
+    alert_engine_checkpoint_interval: int = 60  # 告警实例最近监控值的检查点间隔(秒)
+    alert_engine_catchup_max_window: int = 3600  # 重启后补评估的最长时间窗口(秒)，0表示不补评估
+    alert_engine_cluster_enabled: bool = True  # 多实例协同：多个进程/副本按心跳租约分担规则评估，关闭时每个进程评估全部规则
+    alert_engine_instance_lease: int = 30  # 引擎实例心跳租约(秒)，超过租约未心跳的实例视为下线，其规则由其他实例接管
+    alert_backtest_max_days: int = 30  # 规则回测允许的最长天数
+
+    # 告警通知分发队列配置
+    alert_notify_queue_size: int = 1000  # 每个通知渠道的队列容量，队满时丢弃并计入溢出
+    alert_notify_email_concurrency: int = 2  # 邮件通知并发数
+    alert_notify_http_concurrency: int = 4  # HTTP通知并发数
+    alert_notify_lechat_concurrency: int = 4  # 乐聊通知并发数
+
+    # 告警通知发件箱配置
+    alert_notify_max_attempts: int = 5  # 单条通知最大发送次数
+    alert_notify_retry_base: int = 10  # 首次重试等待(秒)，之后按2倍递增
+    alert_notify_retry_max: int = 600  # 重试等待上限(秒)
+    alert_notify_outbox_batch_size: int = 100  # 每次领取的发件箱记录数
+    alert_notify_outbox_poll_interval: int = 2  # 发件箱轮询间隔(秒)
+    alert_notify_outbox_lease: int = 120  # 领取租约(秒)，进程退出后超过租约的记录被重新领取
+    alert_notify_outbox_retention_days: int = 7  # 已发送记录保留天数，0表示不清理
+    alert_notify_group_wait: int = 0  # 通知分组等待(秒)，同一模板的告警合并发送，0表示不分组、立即发送（默认）；模板params可覆盖
+    alert_notify_group_interval: int = 60  # 同一分组两次发送的最小间隔(秒)；模板params可覆盖
+    alert_notify_rate_limit: int = 0  # 每个通知模板每分钟最多发送的通知数，0表示不限流（默认）；模板params可覆盖
+    alert_notify_rate_burst: int = 20  # 每个通知模板允许的突发发送条数；模板params可覆盖
 
     # 服务启动配置
     uvicorn_host: str = "0.0.0.0"
     uvicorn_port: int = 8000
     uvicorn_reload: bool = True
 
+    # 日志配置
+    log_level: str = "INFO"  # 日志级别，DEBUG时输出告警引擎每条规则的评估和通知明细
+    log_queue_size: int = 10000  # 异步日志队列长度，队列满时丢弃新日志，不阻塞业务线程
+    log_sample_interval: int = 60  # 高频重复日志（如Prometheus查询失败）的限频间隔(秒)，间隔内只输出一条
+
     # ========== 业务监控配置 ==========
     
     # CDH集群配置 - Azkaban调度器
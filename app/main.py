@@ -1,8 +1,8 @@
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
-from app.alert.controllers import rule_controller, notify_template_controller, history_controller, alert_controller
+from app.alert.controllers import rule_controller, notify_template_controller, notify_route_controller, silence_controller, history_controller, alert_controller
 from app.ldap.controllers import ldap_controller
-from app.alert.services.engine_service import start_alert_engine, stop_alert_engine
+from app.alert.services.engine_process import start_engine, shutdown_engine
 from app.utils.logger import logger
 
 @asynccontextmanager
@@ -11,8 +11,8 @@ async def lifespan(app: FastAPI):
     # 启动时执行
     logger.info("BigDataOps 应用启动中...")
     try:
-        # 启动告警引擎
-        start_alert_engine()
+        # 启动告警引擎（开启 ALERT_ENGINE_PROCESS 时运行在独立子进程中）
+        start_engine()
         logger.info("告警引擎已自动启动")
     except Exception as e:
         logger.error(f"启动告警引擎失败: {e}")
@@ -25,7 +25,7 @@ async def lifespan(app: FastAPI):
     logger.info("BigDataOps 应用正在关闭...")
     try:
         # 停止告警引擎
-        stop_alert_engine()
+        shutdown_engine()
         logger.info("告警引擎已停止")
     except Exception as e:
         logger.error(f"停止告警引擎失败: {e}")
@@ -41,6 +41,8 @@ app = FastAPI(
 # 注册路由
 app.include_router(rule_controller.router, prefix="/api", tags=["告警规则"])
 app.include_router(notify_template_controller.router, prefix="/api", tags=["通知模板"])
+app.include_router(notify_route_controller.router, prefix="/api", tags=["通知路由"])
+app.include_router(silence_controller.router, prefix="/api", tags=["告警静默"])
 app.include_router(history_controller.router, prefix="/api", tags=["告警历史"])
 app.include_router(alert_controller.router, prefix="/api", tags=["告警引擎"])
 app.include_router(ldap_controller.router, prefix="/api", tags=["LDAP管理"])
@@ -1,2 +1,2 @@
-from .alert_models import AlertRule, AlertNotifyTemplate, AlertHistory
+from .alert_models import AlertRule, AlertNotifyTemplate, AlertHistory, AlertRuleState, AlertNotifyOutbox, AlertEngineCheckpoint, AlertNotifyRoute, AlertSilence, AlertEngineInstance
 from .db import engine, SessionLocal 
\ No newline at end of file
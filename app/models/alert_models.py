@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Index
 from sqlalchemy.sql import func
 from app.models.db import Base
 
@@ -20,6 +20,7 @@ class AlertRule(Base):
     promql = Column(Text, nullable=False, comment='PromQL表达式')
     condition = Column(String(64), nullable=False, comment='触发条件，如 > 80')
     for_duration = Column(Integer, default=60, comment='触发持续时间(秒)，条件需持续满足多长时间才触发告警')
+    eval_interval = Column(Integer, default=None, comment='评估间隔(秒)，为空时使用引擎默认间隔')
     level = Column(String(32), nullable=False, comment='告警等级，如critical/warning')
     description = Column(Text, default=None, comment='规则描述')
     labels = Column(JSON, default=None, comment='规则标签(JSON格式)')
@@ -33,9 +34,27 @@ class AlertRule(Base):
     alert_state = Column(String(32), default='ok', comment='当前告警状态(ok/alerting/silenced)')
     last_alert_time = Column(DateTime, default=None, comment='最后一次告警时间')
     notify_template_id = Column(Integer, ForeignKey('alert_notify_template.id'), nullable=True, comment='通知模板ID')
+    parent_rule_id = Column(Integer, ForeignKey('alert_rule.id', ondelete='SET NULL'), nullable=True,
+                            comment='父规则ID，父规则告警中时抑制本规则')
+    inhibit_labels = Column(JSON, default=None, comment='抑制匹配标签名列表，为空时父规则告警即抑制整条规则')
+    inhibit_skip_eval = Column(Boolean, default=False, comment='整条规则被抑制时是否跳过评估')
     created_at = Column(DateTime, server_default=func.now(), comment='创建时间')
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment='更新时间')
 
+class AlertRuleState(Base):
+    __tablename__ = 'alert_rule_state'
+    rule_id = Column(Integer, ForeignKey('alert_rule.id', ondelete='CASCADE'), primary_key=True, comment='规则ID')
+    fingerprint = Column(String(32), primary_key=True, default='', comment='序列标签指纹，空字符串表示规则汇总状态')
+    labels = Column(JSON, default=None, comment='序列标签(JSON格式)')
+    alert_state = Column(String(32), default='ok', comment='当前告警状态(ok/pending/inhibited/muted/alerting/silenced)')
+    send_count = Column(Integer, default=0, comment='当前已发送次数')
+    alert_start_time = Column(DateTime, default=None, comment='告警开始时间(pending状态为条件首次满足时间)')
+    last_alert_time = Column(DateTime, default=None, comment='最后一次告警时间')
+    last_value = Column(String(64), default=None, comment='最近一次监控值')
+    recent_values = Column(JSON, default=None, comment='最近的监控值(检查点，按时间从旧到新)')
+    manual_state = Column(String(32), default=None, comment='界面确认/解决请求的状态，引擎应用后清空')
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment='更新时间')
+
 class AlertHistory(Base):
     __tablename__ = 'alert_history'
     id = Column(Integer, primary_key=True, autoincrement=True, comment='主键')
@@ -54,4 +73,74 @@ class AlertHistory(Base):
     acknowledged = Column(Boolean, default=False, comment='是否已确认')
     acknowledged_at = Column(DateTime, default=None, comment='确认时间')
     acknowledged_by = Column(String(128), default=None, comment='确认人')
-    created_at = Column(DateTime, server_default=func.now(), comment='记录时间') 
\ No newline at end of file
+    created_at = Column(DateTime, server_default=func.now(), comment='记录时间')
+
+class AlertNotifyOutbox(Base):
+    __tablename__ = 'alert_notify_outbox'
+    __table_args__ = (
+        Index('idx_status_next_attempt', 'status', 'next_attempt_at'),
+        Index('idx_group_key_status', 'group_key', 'status'),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True, comment='主键')
+    idempotency_key = Column(String(64), nullable=False, unique=True, comment='幂等键(规则+序列+触发时间+模板)')
+    rule_id = Column(Integer, nullable=False, comment='规则ID')
+    history_id = Column(Integer, default=None, comment='关联的告警历史ID')
+    template_id = Column(Integer, nullable=False, comment='通知模板ID')
+    channel = Column(String(32), nullable=False, comment='通知渠道(email/http/lechat)')
+    payload = Column(JSON, nullable=False, comment='告警上下文(JSON格式)')
+    group_key = Column(String(32), default=None, comment='通知分组键(模板+group_by标签)，同组记录合并发送，为空表示不分组')
+    status = Column(String(16), nullable=False, default='pending', comment='状态(pending/sending/sent/failed)')
+    attempts = Column(Integer, nullable=False, default=0, comment='已尝试次数')
+    max_attempts = Column(Integer, nullable=False, default=5, comment='最大尝试次数')
+    next_attempt_at = Column(DateTime, nullable=False, comment='下次尝试时间')
+    locked_by = Column(String(128), default=None, comment='领取该记录的发送进程')
+    locked_until = Column(DateTime, default=None, comment='领取租约到期时间，过期后可被重新领取')
+    last_error = Column(Text, default=None, comment='最近一次失败原因')
+    sent_at = Column(DateTime, default=None, comment='发送成功时间')
+    created_at = Column(DateTime, server_default=func.now(), comment='创建时间')
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment='更新时间')
+
+class AlertNotifyRoute(Base):
+    __tablename__ = 'alert_notify_route'
+    id = Column(Integer, primary_key=True, autoincrement=True, comment='主键')
+    parent_id = Column(Integer, ForeignKey('alert_notify_route.id', ondelete='CASCADE'), nullable=True,
+                       comment='父路由ID，为空表示顶层路由')
+    name = Column(String(128), nullable=False, comment='路由名称')
+    matchers = Column(JSON, default=None, comment='标签匹配器列表(JSON格式)，如 ["level=critical", "instance=~dn.*"]')
+    notify_template_id = Column(Integer, ForeignKey('alert_notify_template.id', ondelete='SET NULL'), nullable=True,
+                                comment='通知模板ID，为空时继承父路由')
+    continue_matching = Column(Boolean, default=False, comment='命中后是否继续匹配后续同级路由')
+    sort_order = Column(Integer, default=0, comment='同级路由匹配顺序(从小到大)')
+    enabled = Column(Boolean, default=True, comment='是否启用')
+    description = Column(Text, default=None, comment='路由描述')
+    created_at = Column(DateTime, server_default=func.now(), comment='创建时间')
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment='更新时间')
+
+class AlertSilence(Base):
+    __tablename__ = 'alert_silence'
+    id = Column(Integer, primary_key=True, autoincrement=True, comment='主键')
+    matchers = Column(JSON, nullable=False, comment='标签匹配器列表(JSON格式)，如 ["instance=dn-01", "category=hdfs"]')
+    starts_at = Column(DateTime, nullable=False, comment='静默开始时间')
+    ends_at = Column(DateTime, nullable=False, comment='静默结束时间')
+    comment = Column(Text, default=None, comment='静默原因，如维护说明')
+    created_by = Column(String(128), default=None, comment='创建人')
+    created_at = Column(DateTime, server_default=func.now(), comment='创建时间')
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment='更新时间')
+
+class AlertEngineCheckpoint(Base):
+    __tablename__ = 'alert_engine_checkpoint'
+    name = Column(String(64), primary_key=True, comment='检查点名称')
+    last_tick_at = Column(DateTime, nullable=False, comment='最近一次成功评估的时间')
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment='更新时间')
+
+class AlertEngineInstance(Base):
+    __tablename__ = 'alert_engine_instance'
+    instance_id = Column(String(128), primary_key=True, comment='引擎实例ID(主机名-进程号-随机串)')
+    hostname = Column(String(128), default=None, comment='主机名')
+    pid = Column(Integer, default=None, comment='进程号')
+    started_at = Column(DateTime, nullable=False, comment='实例启动时间')
+    heartbeat_at = Column(DateTime, nullable=False, comment='最近一次心跳时间，超过租约未更新视为下线')
+    owned_rules = Column(Integer, default=0, comment='当前负责评估的规则数')
+    __table_args__ = (
+        Index('idx_heartbeat_at', 'heartbeat_at'),
+    )
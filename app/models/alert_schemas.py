@@ -12,6 +12,10 @@ class AlertRuleOut(BaseModel):
     level: str
     suppress: Optional[str]
     repeat: int
+    eval_interval: Optional[int] = None
+    parent_rule_id: Optional[int] = None
+    inhibit_labels: Optional[List[str]] = None
+    inhibit_skip_eval: Optional[bool] = False
     enabled: bool
     notify_template_id: Optional[int]
     created_at: datetime
@@ -31,6 +35,36 @@ class AlertNotifyTemplateOut(BaseModel):
         orm_mode = True
         from_attributes = True
 
+class AlertNotifyRouteOut(BaseModel):
+    id: int
+    parent_id: Optional[int] = None
+    name: str
+    matchers: Optional[List[str]] = None
+    notify_template_id: Optional[int] = None
+    continue_matching: Optional[bool] = False
+    sort_order: Optional[int] = 0
+    enabled: Optional[bool] = True
+    description: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    class Config:
+        orm_mode = True
+        from_attributes = True
+
+class AlertSilenceOut(BaseModel):
+    id: int
+    matchers: List[str]
+    starts_at: datetime
+    ends_at: datetime
+    comment: Optional[str] = None
+    created_by: Optional[str] = None
+    status: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    class Config:
+        orm_mode = True
+        from_attributes = True
+
 class AlertHistoryOut(BaseModel):
     id: int
     rule_id: int
@@ -0,0 +1,98 @@
+"""
+共享的HTTP连接池客户端
+告警引擎和集群监控查询Prometheus时共用一个 requests.Session：
+- 长连接复用，避免每次查询重新建立TCP/TLS连接
+- 连接池大小、连接超时、读取超时可配置
+- GET请求是幂等的，连接失败、超时和502/503/504时按指数退避+随机抖动重试
+"""
+
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.config import get_settings
+from app.utils.logger import logger
+
+# 可重试的响应状态码（Prometheus或前置代理暂时不可用）
+RETRY_STATUS_CODES = frozenset({502, 503, 504})
+
+
+class PooledHttpClient:
+    """线程安全的连接池客户端，会话在首次使用时按配置创建"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._stats = {"requests": 0, "retries": 0, "failures": 0}
+
+    def _get_session(self) -> requests.Session:
+        with self._lock:
+            if self._session is None:
+                pool_size = max(get_settings().prometheus_http_pool_size, 1)
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+            return self._session
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None) -> requests.Response:
+        """
+        发送GET请求，网络错误和502/503/504时重试
+        重试用尽后返回最后一次响应，或抛出最后一次的网络异常
+        """
+        settings = get_settings()
+        timeout = (settings.prometheus_connect_timeout, settings.prometheus_read_timeout)
+        retries = max(settings.prometheus_http_retries, 0)
+        session = self._get_session()
+
+        for attempt in range(retries + 1):
+            self._count("requests")
+            try:
+                response = session.get(url, params=params, timeout=timeout)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == retries:
+                    return response
+                reason = f"HTTP {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == retries:
+                    self._count("failures")
+                    raise
+                reason = str(e)
+            delay = self._backoff(attempt)
+            self._count("retries")
+            logger.warning(f"请求 {url} 失败({reason})，{delay:.2f}秒后第{attempt + 1}次重试")
+            time.sleep(delay)
+
+    def get_json(self, url: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """发送GET请求并解析JSON，非2xx响应抛出HTTPError"""
+        response = self.get(url, params)
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """指数退避，随机抖动避免多个查询同时重试"""
+        base = max(get_settings().prometheus_http_retry_backoff_ms, 1) / 1000
+        return base * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def close(self):
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+# 全局Prometheus连接池客户端（告警引擎与集群监控共用）
+prometheus_http = PooledHttpClient()
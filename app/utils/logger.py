@@ -1,11 +1,40 @@
-# 预留日志工具 
+"""
+日志工具
+日志记录通过 QueueHandler 放入内存队列，由后台 QueueListener 线程格式化并输出到控制台：
+- 调用方（告警引擎评估线程、接口请求线程）只拼接消息，不做时间格式化和 I/O，stdout 阻塞时不影响业务
+- 队列满时丢弃新的日志并计数，不阻塞调用方；进程退出时输出队列中剩余的日志
+- 热路径的调试日志使用 %s 参数延迟格式化（logger.debug("... %s", value)），未开启 DEBUG 时不生成消息
+- log_sampled 对高频重复的日志按键限频，间隔内的重复日志只计数，下次输出时附带省略条数
 
+用法示例：
+from app.utils.logger import logger, log_sampled
+logger.info("info日志")
+logger.debug("规则 %s 查询结果 %s 条", rule.name, len(series))
+log_sampled("prometheus_query_error", logging.ERROR, "查询Prometheus异常: %s", e)
+"""
+
+import atexit
+import copy
 import logging
+import logging.handlers
+import os
+import queue
 import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app.config import get_settings
+
+# 限频日志最多记录的键数，超过后清空重新计数
+MAX_SAMPLE_KEYS = 10000
+
+settings = get_settings()
 
 # 创建logger
 logger = logging.getLogger("BigDataOps")
-logger.setLevel(logging.INFO)
+_level = logging.getLevelName(settings.log_level.upper())
+logger.setLevel(_level if isinstance(_level, int) else logging.INFO)
 
 # 创建格式化器
 formatter = logging.Formatter(
@@ -13,21 +42,105 @@ formatter = logging.Formatter(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
-# 创建控制台处理器
+# 创建控制台处理器（在日志线程中输出）
 console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setLevel(logging.INFO)
+console_handler.setLevel(logging.DEBUG)
 console_handler.setFormatter(formatter)
 
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """把日志记录放入有界队列，队列满时丢弃并在下一条成功入队的日志前补一条丢弃提示"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self._dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """在调用方线程拼接消息、展开异常堆栈（参数可能随后被修改，堆栈对象不能跨线程保留），其余格式化在日志线程完成"""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        with self._dropped_lock:
+            dropped, self._dropped = self._dropped, 0
+        try:
+            if dropped:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': logger.name, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': f"日志队列已满，丢弃 {dropped} 条日志",
+                }))
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self._dropped += dropped + 1
+
+
+log_queue: queue.Queue = queue.Queue(maxsize=max(settings.log_queue_size, 1))
+queue_handler = NonBlockingQueueHandler(log_queue)
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _start_listener():
+    global _listener
+    _listener = logging.handlers.QueueListener(log_queue, console_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener():
+    """进程退出时输出队列中剩余的日志"""
+    if _listener is not None:
+        _listener.stop()
+
+
+def _restart_after_fork():
+    """fork 出的子进程没有日志线程，清空继承的队列后重新启动"""
+    global log_queue
+    log_queue = queue.Queue(maxsize=max(settings.log_queue_size, 1))
+    queue_handler.queue = log_queue
+    _start_listener()
+
+
 # 避免重复添加处理器
 if not logger.hasHandlers():
-    logger.addHandler(console_handler)
+    logger.addHandler(queue_handler)
+    _start_listener()
+    atexit.register(_stop_listener)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_after_fork)
 
 # 设置传播
 logger.propagate = False
 
-# 用法示例：
-# from app.utils.logger import logger
-# logger.info("info日志")
-# logger.warning("warning日志")
-# logger.error("error日志")
-# logger.debug("debug日志") 
\ No newline at end of file
+# 限频日志：键 -> [上次输出时间, 之后省略的条数]
+_samples: Dict[str, List] = {}
+_sample_lock = threading.Lock()
+
+
+def log_sampled(key: str, level: int, msg: str, *args, interval: Optional[float] = None):
+    """
+    按 key 限频输出高频重复的日志（如 Prometheus 不可用时每条规则的查询失败）：
+    interval 秒（默认 log_sample_interval）内只输出第一条，其余只计数，下次输出时附带省略条数
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if interval is None:
+        interval = get_settings().log_sample_interval
+    now = time.monotonic()
+    with _sample_lock:
+        sample = _samples.get(key)
+        if sample is not None and now - sample[0] < interval:
+            sample[1] += 1
+            return
+        suppressed = sample[1] if sample is not None else 0
+        if len(_samples) >= MAX_SAMPLE_KEYS:
+            _samples.clear()
+        _samples[key] = [now, 0]
+    if suppressed:
+        msg = f"{msg}（前{interval}秒内省略 {suppressed} 条同类日志）"
+    logger.log(level, msg, *args)
@@ -0,0 +1,328 @@
+"""
+告警引擎端到端基准测试
+启动本地模拟 Prometheus（可配置每条规则的序列数、查询延迟和错误率），在本地数据库中生成若干规则，
+然后直接调用 alert_engine_job 逐轮评估全部规则，输出：
+- 每秒评估的规则数、时间片耗时 p50/p99、各时间片阶段的平均耗时
+- 每个时间片的数据库语句数（评估线程和通知发送线程分开统计）
+- 进程峰值内存
+结果可保存为 JSON，用 --compare 与之前版本的结果对比。
+
+模拟 Prometheus 运行在独立进程中，生成查询结果不占用被测进程的GIL。
+序列值按 --flap-seconds 周期轮换，每个周期约 --firing 比例的序列满足条件，持续产生告警和恢复通知。
+
+运行: python -m benchmarks.bench_alert_engine [--rules 2000] [--series 10] [--ticks 10] [--output result.json]
+默认使用临时 SQLite 数据库；--db-url 指向专用的测试库时会在其中建表并写入规则，不要指向生产库。
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from sqlalchemy import create_engine, event
+
+# 被测进程中评估线程以外、由通知发送产生数据库语句的线程名前缀
+NOTIFY_THREAD_PREFIXES = ('alert-outbox', 'alert-notify')
+
+
+def _simulator_main(port_queue, series: int, latency_ms: float, error_rate: float, firing: float,
+                    flap_seconds: int):
+    """模拟 Prometheus 的即时查询接口和通知回调接口，运行在子进程中"""
+    rng = random.Random()
+    # 每 period 条序列中有一条满足条件
+    period = max(int(round(1 / firing)), 1) if firing > 0 else None
+    cache = {}
+    cache_lock = threading.Lock()
+
+    def render(expr: str, window: int) -> bytes:
+        with cache_lock:
+            body = cache.get((expr, window))
+        if body is not None:
+            return body
+        now = time.time()
+        offset = zlib.crc32(expr.encode()) % (period or 1) + window
+        result = [
+            {
+                'metric': {'__name__': 'bench_metric', 'expr': expr, 'instance': f"host-{i}:9100"},
+                'value': [now, '1' if period and (i + offset) % period == 0 else '0'],
+            }
+            for i in range(series)
+        ]
+        body = json.dumps({'status': 'success', 'data': {'resultType': 'vector', 'result': result}}).encode()
+        with cache_lock:
+            if len(cache) > 100000:
+                cache.clear()
+            cache[(expr, window)] = body
+        return body
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # 长连接上响应头和响应体分两次写出，不关闭Nagle算法时会与延迟确认叠加出约40ms的延迟
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, code: int, body: bytes):
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path.startswith('/hook'):
+                self._reply(200, b'{}')
+                return
+            if latency_ms > 0:
+                time.sleep(rng.uniform(0.5, 1.5) * latency_ms / 1000)
+            if rng.random() < error_rate:
+                self._reply(503, b'{"status":"error","error":"simulated"}')
+                return
+            expr = parse_qs(url.query).get('query', [''])[0]
+            self._reply(200, render(expr, int(time.time() // flap_seconds)))
+
+    ThreadingHTTPServer.daemon_threads = True
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_simulator(args) -> tuple:
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_simulator_main, name="prometheus-simulator", daemon=True,
+        args=(port_queue, args.series, args.latency_ms, args.error_rate, args.firing, args.flap_seconds)
+    )
+    process.start()
+    return process, f"http://127.0.0.1:{port_queue.get(timeout=30)}"
+
+
+class StatementCounter:
+    """按线程区分评估和通知发送的数据库语句数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.engine = 0
+        self.notify = 0
+
+    def __call__(self, *args):
+        notify = threading.current_thread().name.startswith(NOTIFY_THREAD_PREFIXES)
+        with self._lock:
+            if notify:
+                self.notify += 1
+            else:
+                self.engine += 1
+
+    def snapshot(self) -> tuple:
+        with self._lock:
+            return self.engine, self.notify
+
+
+def setup_database(db_url: str, counter: StatementCounter):
+    """把应用的会话工厂绑定到测试库并建表"""
+    from app.models import db as db_module
+
+    if db_url.startswith('sqlite'):
+        engine = create_engine(db_url, connect_args={'check_same_thread': False, 'timeout': 60})
+    else:
+        engine = create_engine(db_url, pool_pre_ping=True, pool_size=32, max_overflow=16)
+    event.listen(engine, 'before_cursor_execute', counter)
+    db_module.SessionLocal.configure(bind=engine)
+    db_module.Base.metadata.create_all(engine)
+    return engine
+
+
+def seed_rules(count: int, distinct_queries: int, hook_url: str, seed: int = 7) -> int:
+    """写入一个HTTP通知模板和count条规则，distinct_queries 条规则共用一个表达式"""
+    from app.models import AlertNotifyTemplate, AlertRule, SessionLocal
+
+    rng = random.Random(seed)
+    db = SessionLocal()
+    try:
+        template = AlertNotifyTemplate(name='bench-http', type='http', params=json.dumps(
+            {'url': hook_url + '/hook?rule={rule_name}', 'method': 'GET'}
+        ))
+        db.add(template)
+        db.flush()
+        queries = max(count // max(distinct_queries, 1), 1)
+        db.bulk_insert_mappings(AlertRule, [
+            {
+                'name': f"bench-rule-{i}",
+                'category': rng.choice(('hdfs', 'yarn', 'hive', 'spark', 'other')),
+                'promql': f'bench_metric{{group="{i % queries}"}}',
+                'condition': '> 0.5',
+                'for_duration': 0,
+                'level': rng.choice(('critical', 'warning', 'info')),
+                'repeat': 0,
+                'duration': 3600,
+                'notify_template_id': template.id,
+                'enabled': True,
+            }
+            for i in range(count)
+        ])
+        db.commit()
+        return queries
+    finally:
+        db.close()
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    index = min(max(int(math.ceil(fraction * len(ordered))) - 1, 0), len(ordered) - 1)
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    # Linux 上 ru_maxrss 单位为KB，macOS 上为字节
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(usage / 1024 / (1024 if os.uname().sysname == 'Darwin' else 1), 1)
+
+
+def git_version() -> str:
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(args) -> dict:
+    from app.config import get_settings
+    from app.utils.logger import logger
+
+    logger.setLevel(args.log_level.upper())
+    settings = get_settings()
+    settings.alert_engine_parallel = not args.serial
+    settings.alert_engine_query_workers = args.workers
+    settings.alert_engine_tick_budget = args.tick_budget
+    settings.alert_notify_group_wait = 0
+
+    simulator, prometheus_url = start_simulator(args)
+    counter = StatementCounter()
+    db_url = args.db_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    setup_database(db_url, counter)
+    queries = seed_rules(args.rules, args.rules_per_query, prometheus_url)
+
+    import app.alert.services.engine_service as engine_service
+    from app.alert.services.engine_metrics import engine_metrics
+    from app.alert.services.notify_outbox import notify_outbox
+    from app.alert.services.tick_monitor import tick_monitor
+
+    engine_service.PROMETHEUS_URL = prometheus_url
+    if args.notify:
+        notify_outbox.start(engine_service.send_alert_notification)
+
+    durations, statements, notify_statements = [], [], []
+    try:
+        for tick in range(args.warmup + args.ticks):
+            before = counter.snapshot()
+            started = time.perf_counter()
+            engine_service.alert_engine_job(evaluate_all=True)
+            duration = time.perf_counter() - started
+            after = counter.snapshot()
+            if tick >= args.warmup:
+                durations.append(duration)
+                statements.append(after[0] - before[0])
+                notify_statements.append(after[1] - before[1])
+            print(f"第 {tick + 1} 轮{'(预热)' if tick < args.warmup else ''}: {duration * 1000:8.1f}ms, "
+                  f"数据库语句 {after[0] - before[0]} 条")
+            if args.interval > 0:
+                time.sleep(args.interval)
+    finally:
+        notify_outbox.stop()
+        simulator.terminate()
+
+    tick_totals = tick_monitor.stats()["totals"]
+    outbox_stats = notify_outbox.stats()
+    return {
+        "version": git_version(),
+        "started_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "params": {
+            "rules": args.rules, "distinct_queries": queries, "series_per_query": args.series,
+            "latency_ms": args.latency_ms, "error_rate": args.error_rate, "firing": args.firing,
+            "parallel": not args.serial, "workers": args.workers, "ticks": args.ticks,
+            "database": db_url.split(':', 1)[0],
+        },
+        "results": {
+            "rules_per_second": round(args.rules / statistics.median(durations), 1),
+            "tick_p50_seconds": round(percentile(durations, 0.5), 4),
+            "tick_p99_seconds": round(percentile(durations, 0.99), 4),
+            "tick_max_seconds": round(max(durations), 4),
+            "db_statements_per_tick": round(statistics.mean(statements), 1),
+            "notify_db_statements_per_tick": round(statistics.mean(notify_statements), 1),
+            "peak_rss_mb": peak_rss_mb(),
+            "tick_stages": engine_metrics.tick_stats(),
+            "deferred_rules": tick_totals["deferred"],
+            "notifications_sent": outbox_stats["sent"],
+            "notifications_failed": outbox_stats["failed"],
+        },
+    }
+
+
+def compare(result: dict, baseline_path: str):
+    """与之前保存的结果对比主要指标"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get("params") != result["params"]:
+        print("注意: 基线的测试参数与本次不同，对比仅供参考")
+    print(f"对比基线 {baseline.get('version')} -> {result['version']}:")
+    for key in ("rules_per_second", "tick_p50_seconds", "tick_p99_seconds", "db_statements_per_tick", "peak_rss_mb"):
+        old, new = baseline["results"].get(key), result["results"][key]
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "-"
+        print(f"  {key:<24} {old!s:>10} -> {new!s:>10}  {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="告警引擎端到端基准测试")
+    parser.add_argument('--rules', type=int, default=2000, help="规则数")
+    parser.add_argument('--rules-per-query', type=int, default=1, help="共用同一表达式的规则数（测试查询合并）")
+    parser.add_argument('--series', type=int, default=10, help="每个表达式返回的序列数")
+    parser.add_argument('--latency-ms', type=float, default=20, help="模拟 Prometheus 的平均查询延迟(毫秒)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="查询返回503的比例")
+    parser.add_argument('--firing', type=float, default=0.1, help="满足告警条件的序列比例")
+    parser.add_argument('--flap-seconds', type=int, default=30, help="满足条件的序列轮换周期(秒)")
+    parser.add_argument('--ticks', type=int, default=10, help="统计的评估轮数")
+    parser.add_argument('--warmup', type=int, default=1, help="不计入统计的预热轮数（首轮加载规则和状态）")
+    parser.add_argument('--interval', type=float, default=0, help="两轮评估之间的间隔(秒)")
+    parser.add_argument('--serial', action='store_true', help="使用串行评估")
+    parser.add_argument('--workers', type=int, default=16, help="并行评估线程数")
+    parser.add_argument('--tick-budget', type=int, default=3600, help="时间片预算(秒)，默认足够大以评估全部规则")
+    parser.add_argument('--no-notify', dest='notify', action='store_false', help="不启动通知发件箱")
+    parser.add_argument('--db-url', default=None, help="数据库地址，默认临时 SQLite 文件")
+    parser.add_argument('--log-level', default='warning', help="引擎日志级别")
+    parser.add_argument('--output', default=None, help="结果保存为JSON文件")
+    parser.add_argument('--compare', default=None, help="与之前保存的JSON结果对比")
+    args = parser.parse_args()
+
+    result = run(args)
+    print(json.dumps(result["results"], ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+    if args.compare:
+        compare(result, args.compare)
+
+
+if __name__ == '__main__':
+    main()
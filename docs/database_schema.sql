@@ -5,8 +5,14 @@
 -- ======================================================
 
 -- 删除现有表（如果存在）
+DROP TABLE IF EXISTS `alert_engine_instance`;
+DROP TABLE IF EXISTS `alert_silence`;
+DROP TABLE IF EXISTS `alert_engine_checkpoint`;
+DROP TABLE IF EXISTS `alert_notify_outbox`;
 DROP TABLE IF EXISTS `alert_history`;
+DROP TABLE IF EXISTS `alert_rule_state`;
 DROP TABLE IF EXISTS `alert_rule`;
+DROP TABLE IF EXISTS `alert_notify_route`;
 DROP TABLE IF EXISTS `alert_notify_template`;
 -- ======================================================
 -- 告警通知模板表
@@ -25,6 +31,31 @@ CREATE TABLE `alert_notify_template` (
   INDEX `idx_created_at` (`created_at`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='告警通知模板表';
 
+-- ======================================================
+-- 告警通知路由表（按标签把告警路由到通知模板，树形结构，父路由先匹配）
+-- ======================================================
+CREATE TABLE `alert_notify_route` (
+  `id` INT AUTO_INCREMENT PRIMARY KEY COMMENT '主键',
+  `parent_id` INT DEFAULT NULL COMMENT '父路由ID，为空表示顶层路由',
+  `name` VARCHAR(128) NOT NULL COMMENT '路由名称',
+  `matchers` JSON DEFAULT NULL COMMENT '标签匹配器列表(JSON格式)',
+  `notify_template_id` INT DEFAULT NULL COMMENT '通知模板ID，为空时继承父路由',
+  `continue_matching` BOOLEAN DEFAULT FALSE COMMENT '命中后是否继续匹配后续同级路由',
+  `sort_order` INT DEFAULT 0 COMMENT '同级路由匹配顺序(从小到大)',
+  `enabled` BOOLEAN DEFAULT TRUE COMMENT '是否启用',
+  `description` TEXT DEFAULT NULL COMMENT '路由描述',
+  `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  
+  -- 外键约束
+  FOREIGN KEY (`parent_id`) REFERENCES `alert_notify_route`(`id`) ON DELETE CASCADE,
+  FOREIGN KEY (`notify_template_id`) REFERENCES `alert_notify_template`(`id`) ON DELETE SET NULL,
+  
+  -- 索引
+  INDEX `idx_parent_id` (`parent_id`),
+  INDEX `idx_updated_at` (`updated_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='告警通知路由表';
+
 -- ======================================================
 -- 告警规则表（增强版）
 -- ======================================================
@@ -35,6 +66,7 @@ CREATE TABLE `alert_rule` (
   `promql` TEXT NOT NULL COMMENT 'PromQL查询表达式',
   `condition` VARCHAR(64) NOT NULL COMMENT '触发条件(如: > 80, < 0.5, = 0)',
   `for_duration` INT DEFAULT 60 COMMENT '触发持续时间(秒)，条件需持续满足多长时间才触发告警',
+  `eval_interval` INT DEFAULT NULL COMMENT '评估间隔(秒)，为空时使用引擎默认间隔',
   `level` VARCHAR(32) NOT NULL DEFAULT 'medium' COMMENT '告警等级(low/medium/high/critical)',
   `description` TEXT DEFAULT NULL COMMENT '规则描述',
   `labels` JSON DEFAULT NULL COMMENT '规则标签(JSON格式，用于分组和过滤)',
@@ -54,11 +86,17 @@ CREATE TABLE `alert_rule` (
   
   -- 关联字段
   `notify_template_id` INT DEFAULT NULL COMMENT '通知模板ID',
+  
+  -- 抑制依赖字段
+  `parent_rule_id` INT DEFAULT NULL COMMENT '父规则ID，父规则告警中时抑制本规则',
+  `inhibit_labels` JSON DEFAULT NULL COMMENT '抑制匹配标签名列表，为空时父规则告警即抑制整条规则',
+  `inhibit_skip_eval` TINYINT(1) DEFAULT 0 COMMENT '整条规则被抑制时是否跳过评估',
   `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
   
   -- 外键约束
   FOREIGN KEY (`notify_template_id`) REFERENCES `alert_notify_template`(`id`) ON DELETE SET NULL,
+  FOREIGN KEY (`parent_rule_id`) REFERENCES `alert_rule`(`id`) ON DELETE SET NULL,
   
   -- 索引
   INDEX `idx_category` (`category`),
@@ -67,6 +105,7 @@ CREATE TABLE `alert_rule` (
   INDEX `idx_alert_state` (`alert_state`),
   INDEX `idx_last_alert_time` (`last_alert_time`),
   INDEX `idx_alert_start_time` (`alert_start_time`),
+  INDEX `idx_parent_rule_id` (`parent_rule_id`),
   INDEX `idx_created_at` (`created_at`),
   INDEX `idx_category_level` (`category`, `level`),
   INDEX `idx_enabled_state` (`enabled`, `alert_state`),
@@ -74,6 +113,29 @@ CREATE TABLE `alert_rule` (
   INDEX `idx_duration` (`duration`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='告警规则表(增强版)';
 
+-- ======================================================
+-- 告警运行状态表（告警引擎写入，与规则定义表分离）
+-- fingerprint为空字符串的记录是规则汇总状态，其余为各序列的告警实例
+-- ======================================================
+CREATE TABLE `alert_rule_state` (
+  `rule_id` INT NOT NULL COMMENT '规则ID',
+  `fingerprint` VARCHAR(32) NOT NULL DEFAULT '' COMMENT '序列标签指纹，空字符串表示规则汇总状态',
+  `labels` JSON DEFAULT NULL COMMENT '序列标签(JSON格式)',
+  `alert_state` VARCHAR(32) DEFAULT 'ok' COMMENT '当前告警状态(ok/pending/inhibited/muted/alerting/silenced)',
+  `send_count` INT DEFAULT 0 COMMENT '当前已发送次数',
+  `alert_start_time` DATETIME DEFAULT NULL COMMENT '告警开始时间(pending状态为条件首次满足时间)',
+  `last_alert_time` DATETIME DEFAULT NULL COMMENT '最后一次告警时间',
+  `last_value` VARCHAR(64) DEFAULT NULL COMMENT '最近一次监控值',
+  `recent_values` JSON DEFAULT NULL COMMENT '最近的监控值(检查点，按时间从旧到新)',
+  `manual_state` VARCHAR(32) DEFAULT NULL COMMENT '界面确认/解决请求的状态，引擎应用后清空',
+  `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  
+  PRIMARY KEY (`rule_id`, `fingerprint`),
+  FOREIGN KEY (`rule_id`) REFERENCES `alert_rule`(`id`) ON DELETE CASCADE,
+  INDEX `idx_alert_state` (`alert_state`),
+  INDEX `idx_manual_state` (`manual_state`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='告警运行状态表';
+
 -- ======================================================
 -- 告警历史表（增强版）
 -- ======================================================
@@ -125,6 +187,79 @@ CREATE TABLE `alert_history` (
   INDEX `idx_rule_acknowledged` (`rule_id`, `acknowledged`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='告警历史记录表(增强版)';
 
+-- ======================================================
+-- 告警通知发件箱（持久化待发送通知，失败后按退避策略重试）
+-- ======================================================
+CREATE TABLE `alert_notify_outbox` (
+  `id` INT AUTO_INCREMENT PRIMARY KEY COMMENT '主键',
+  `idempotency_key` VARCHAR(64) NOT NULL COMMENT '幂等键(规则+序列+触发时间+模板)',
+  `rule_id` INT NOT NULL COMMENT '规则ID',
+  `history_id` INT DEFAULT NULL COMMENT '关联的告警历史ID',
+  `template_id` INT NOT NULL COMMENT '通知模板ID',
+  `channel` VARCHAR(32) NOT NULL COMMENT '通知渠道(email/http/lechat)',
+  `payload` JSON NOT NULL COMMENT '告警上下文(JSON格式)',
+  `group_key` VARCHAR(32) DEFAULT NULL COMMENT '通知分组键(模板+group_by标签)，同组记录合并发送，为空表示不分组',
+  `status` VARCHAR(16) NOT NULL DEFAULT 'pending' COMMENT '状态(pending/sending/sent/failed)',
+  `attempts` INT NOT NULL DEFAULT 0 COMMENT '已尝试次数',
+  `max_attempts` INT NOT NULL DEFAULT 5 COMMENT '最大尝试次数',
+  `next_attempt_at` DATETIME NOT NULL COMMENT '下次尝试时间',
+  `locked_by` VARCHAR(128) DEFAULT NULL COMMENT '领取该记录的发送进程',
+  `locked_until` DATETIME DEFAULT NULL COMMENT '领取租约到期时间，过期后可被重新领取',
+  `last_error` TEXT DEFAULT NULL COMMENT '最近一次失败原因',
+  `sent_at` DATETIME DEFAULT NULL COMMENT '发送成功时间',
+  `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  
+  UNIQUE KEY `uk_idempotency_key` (`idempotency_key`),
+  INDEX `idx_status_next_attempt` (`status`, `next_attempt_at`),
+  INDEX `idx_group_key_status` (`group_key`, `status`),
+  INDEX `idx_history_id` (`history_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='告警通知发件箱';
+
+-- ======================================================
+-- 告警引擎检查点表（重启后据此补评估停机期间错过的时间段）
+-- ======================================================
+CREATE TABLE `alert_engine_checkpoint` (
+  `name` VARCHAR(64) NOT NULL COMMENT '检查点名称',
+  `last_tick_at` DATETIME NOT NULL COMMENT '最近一次成功评估的时间',
+  `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  PRIMARY KEY (`name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='告警引擎检查点表';
+
+-- ======================================================
+-- 告警静默表（维护窗口：时间段内按标签匹配的告警不发送通知）
+-- ======================================================
+CREATE TABLE `alert_silence` (
+  `id` INT AUTO_INCREMENT PRIMARY KEY COMMENT '主键',
+  `matchers` JSON NOT NULL COMMENT '标签匹配器列表(JSON格式)',
+  `starts_at` DATETIME NOT NULL COMMENT '静默开始时间',
+  `ends_at` DATETIME NOT NULL COMMENT '静默结束时间',
+  `comment` TEXT DEFAULT NULL COMMENT '静默原因，如维护说明',
+  `created_by` VARCHAR(128) DEFAULT NULL COMMENT '创建人',
+  `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  
+  -- 索引
+  INDEX `idx_ends_at` (`ends_at`),
+  INDEX `idx_updated_at` (`updated_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='告警静默表';
+
+-- ======================================================
+-- 告警引擎实例表（多实例部署时的心跳租约，存活实例按一致性哈希分担规则评估）
+-- ======================================================
+CREATE TABLE `alert_engine_instance` (
+  `instance_id` VARCHAR(128) NOT NULL COMMENT '引擎实例ID(主机名-进程号-随机串)',
+  `hostname` VARCHAR(128) DEFAULT NULL COMMENT '主机名',
+  `pid` INT DEFAULT NULL COMMENT '进程号',
+  `started_at` DATETIME NOT NULL COMMENT '实例启动时间',
+  `heartbeat_at` DATETIME NOT NULL COMMENT '最近一次心跳时间，超过租约未更新视为下线',
+  `owned_rules` INT DEFAULT 0 COMMENT '当前负责评估的规则数',
+  
+  -- 索引
+  PRIMARY KEY (`instance_id`),
+  INDEX `idx_heartbeat_at` (`heartbeat_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='告警引擎实例表';
+
 -- ======================================================
 -- 用户管理表（预留）
 -- ======================================================
@@ -0,0 +1,24 @@
+"""
+测试公共夹具：告警表建在临时 sqlite 库上，服务中使用的 SessionLocal 绑定到该库
+"""
+
+import pytest
+from sqlalchemy import create_engine
+
+from app.models import SessionLocal
+from app.models.db import Base
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'alert.db'}", connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+    original = SessionLocal.kw['bind']
+    SessionLocal.configure(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        SessionLocal.configure(bind=original)
+        engine.dispose()
@@ -0,0 +1,63 @@
+"""
+多序列告警：每条序列按标签指纹独立维护告警实例，只通知新触发的序列，消失的序列恢复
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.alert.services import engine_service
+from app.alert.services.instance_store import instance_store, label_fingerprint
+from app.alert.services.rule_compiler import CompiledRule
+from app.alert.services.silence_store import silence_store
+from app.models import AlertRule
+
+NOW = datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture(autouse=True)
+def clean_store():
+    instance_store.reset()
+    silence_store.reset()
+    yield
+    instance_store.reset()
+
+
+def _compile(**fields):
+    values = dict(id=1, name='disk', level='critical', category='other', promql='disk_used', condition='> 80',
+                  repeat=0, duration=3600, for_duration=0)
+    values.update(fields)
+    return CompiledRule(AlertRule(**values), None)
+
+
+def _evaluate(compiled, samples, at):
+    series = [{'labels': labels, 'value': value} for labels, value in samples]
+    instances = instance_store.get_rule_instances(compiled.id)
+    notifications = engine_service.evaluate_rule_series(None, compiled, instances, series,
+                                                        compiled.evaluate([value for _, value in samples]), at)
+    return instances, [instance.labels['host'] for instance, _, _ in notifications]
+
+
+def test_fingerprint_ignores_label_order():
+    assert label_fingerprint({'a': '1', 'b': '2'}) == label_fingerprint({'b': '2', 'a': '1'})
+    assert label_fingerprint({'a': '1'}) != label_fingerprint({'a': '2'})
+
+
+def test_each_series_alerts_and_recovers_independently():
+    compiled = _compile()
+    host_a, host_b = {'host': 'a'}, {'host': 'b'}
+
+    instances, notified = _evaluate(compiled, [(host_a, 90), (host_b, 50)], NOW)
+    assert notified == ['a']
+    # 正常且没有历史状态的序列不跟踪
+    assert list(instances) == [label_fingerprint(host_a)]
+
+    instances, notified = _evaluate(compiled, [(host_a, 95), (host_b, 85)], NOW + timedelta(minutes=1))
+    assert notified == ['b']
+    assert {instance.alert_state for instance in instances.values()} == {'alerting'}
+
+    # host b 从结果中消失视为恢复，host a 不受影响
+    instances, notified = _evaluate(compiled, [(host_a, 95)], NOW + timedelta(minutes=2))
+    assert notified == []
+    assert instances[label_fingerprint(host_a)].alert_state == 'alerting'
+    assert instances[label_fingerprint(host_b)].alert_state == 'ok'
@@ -0,0 +1,58 @@
+"""
+回测回放的回归测试：跳跃回放（_next_index）与逐个时刻执行状态机的结果必须一致
+"""
+
+import random
+from datetime import datetime
+
+import pytest
+
+from app.alert.services import backtest_service
+from app.alert.services.rule_compiler import CompiledRule
+from app.models import AlertRule
+
+START = int(datetime(2024, 1, 1).timestamp())
+
+
+def _compile(repeat, suppress, duration, max_send_count, for_duration):
+    return CompiledRule(AlertRule(
+        id=1, name='backtest', level='critical', category='other', promql='x', condition='> 0.5',
+        repeat=repeat, suppress=suppress, duration=duration, max_send_count=max_send_count,
+        for_duration=for_duration
+    ), None)
+
+
+def _random_values(rng, steps):
+    """连续满足/不满足条件的若干段"""
+    values = []
+    while len(values) < steps:
+        values += [rng.choice((0.0, 1.0))] * rng.randint(1, 40)
+    return values[:steps]
+
+
+def _replay(compiled, values, step):
+    timestamps = [START + index * step for index in range(len(values))]
+    moments = [datetime.fromtimestamp(ts) for ts in timestamps]
+    return backtest_service._replay_series(compiled, {'instance': 'a'}, timestamps, values, START, step, moments)
+
+
+@pytest.mark.parametrize('step', [60, 300, 900, 3600])
+def test_skip_replay_matches_step_by_step(monkeypatch, step):
+    rng = random.Random(step)
+    skip_next_index = backtest_service._next_index
+    for _ in range(300):
+        compiled = _compile(
+            repeat=rng.choice((0, 300, 600, 1800)),
+            suppress=rng.choice((None, '10m', '1h')),
+            duration=rng.choice((0, 3600, 7200, 86400)),
+            max_send_count=rng.choice((None, 3, 10)),
+            for_duration=rng.choice((0, 60, 600)),
+        )
+        values = _random_values(rng, 500)
+
+        monkeypatch.setattr(backtest_service, '_next_index', skip_next_index)
+        skipped = _replay(compiled, values, step)
+        monkeypatch.setattr(backtest_service, '_next_index', lambda instance, index, last, moments: index + 1)
+        stepped = _replay(compiled, values, step)
+
+        assert skipped == stepped
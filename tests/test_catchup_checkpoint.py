@@ -0,0 +1,32 @@
+"""
+集群共用的引擎检查点：只前进不后退，按时间片间隔限制写库
+"""
+
+from datetime import datetime, timedelta
+
+from app.alert.services import engine_service
+from app.alert.services.catchup_service import CHECKPOINT_SAVE_TICKS, load_last_tick, save_last_tick
+from app.config import get_settings
+
+NOW = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def test_checkpoint_never_moves_backwards(db):
+    assert save_last_tick(db, NOW) == NOW
+    db.commit()
+    assert save_last_tick(db, NOW - timedelta(minutes=5)) == NOW
+    db.commit()
+    assert load_last_tick(db) == NOW
+
+
+def test_checkpoint_save_is_throttled(db, monkeypatch):
+    monkeypatch.setattr(engine_service, '_checkpoint_at', None)
+    resolution = max(get_settings().alert_engine_resolution, 1)
+    engine_service._save_checkpoint(NOW)
+    engine_service._save_checkpoint(NOW + timedelta(seconds=resolution))
+    assert load_last_tick(db) == NOW
+
+    later = NOW + timedelta(seconds=CHECKPOINT_SAVE_TICKS * resolution)
+    engine_service._save_checkpoint(later)
+    db.expire_all()
+    assert load_last_tick(db) == later
@@ -0,0 +1,58 @@
+"""
+规则评估调度：到期时间对齐到规则相位，错过多个周期只评估一次，间隔变化和推迟后重新排期
+"""
+
+from types import SimpleNamespace
+
+from app.alert.services.eval_scheduler import EvalScheduler, next_due_time, rule_phase
+
+NOW = 1_700_000_000.0
+
+
+def _rules(*pairs):
+    return [SimpleNamespace(id=rule_id, eval_interval=interval) for rule_id, interval in pairs]
+
+
+def test_due_time_is_aligned_to_rule_phase():
+    for rule_id in range(1, 200):
+        due = next_due_time(rule_id, 60, NOW)
+        assert NOW < due <= NOW + 60
+        assert (due - rule_phase(rule_id, 60)) % 60 == 0
+
+
+def test_rules_with_same_interval_are_spread_over_the_interval():
+    phases = {rule_phase(rule_id, 60) for rule_id in range(1, 601)}
+    assert len(phases) > 50
+
+
+def test_pop_due_returns_each_rule_once_per_interval():
+    scheduler = EvalScheduler()
+    scheduler.sync(_rules((1, 60)), now=NOW)
+    due = next_due_time(1, 60, NOW)
+    assert scheduler.pop_due(now=due - 1) == []
+    assert scheduler.pop_due(now=due) == [1]
+    assert scheduler.pop_due(now=due + 30) == []
+    # 停顿错过多个周期后只评估一次，并对齐到下一个相位
+    assert scheduler.pop_due(now=due + 300) == [1]
+    assert scheduler.pop_due(now=due + 301) == []
+    assert scheduler.pop_due(now=due + 360) == [1]
+
+
+def test_interval_change_and_removal_reschedule():
+    scheduler = EvalScheduler()
+    scheduler.sync(_rules((1, 60), (2, 60)), now=NOW)
+    scheduler.sync(_rules((1, 300)), now=NOW)
+    horizon = NOW + 300
+    due_ids = []
+    moment = NOW
+    while moment <= horizon:
+        due_ids += scheduler.pop_due(now=moment)
+        moment += 5
+    assert due_ids == [1]
+
+
+def test_deferred_rule_is_due_immediately():
+    scheduler = EvalScheduler()
+    scheduler.sync(_rules((1, 3600)), now=NOW)
+    scheduler.defer([1], now=NOW + 5)
+    assert scheduler.pop_due(now=NOW + 5) == [1]
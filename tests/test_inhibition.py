@@ -0,0 +1,90 @@
+"""
+告警抑制：父规则先于子规则评估，子规则等待父规则完成后按匹配标签抑制序列或跳过整条规则
+"""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.alert.services.inhibition import InhibitionIndex, find_dependency_cycle
+from app.alert.services.instance_store import instance_store, label_fingerprint
+
+
+@pytest.fixture(autouse=True)
+def clean_store():
+    instance_store.reset()
+    yield
+    instance_store.reset()
+
+
+def _rule(rule_id, parent_id=None, inhibit_labels=None, skip_eval=False):
+    return SimpleNamespace(id=rule_id, parent_rule_id=parent_id, inhibit_labels=inhibit_labels,
+                           inhibit_skip_eval=skip_eval)
+
+
+def _fire(rule_id, labels, state='alerting'):
+    instance = instance_store.create_instance(SimpleNamespace(id=rule_id), label_fingerprint(labels), labels)
+    instance.alert_state = state
+
+
+def test_parents_are_ordered_before_children():
+    host, datanode, disk, other = _rule(1), _rule(2, 1), _rule(3, 2), _rule(4)
+    index = InhibitionIndex([disk, datanode, other, host])
+    assert [rule.id for rule in index.order([disk, datanode, other, host])] == [4, 1, 2, 3]
+
+
+def test_dependency_cycle_detection():
+    parents = {1: None, 2: 1, 3: 2}
+    assert find_dependency_cycle(1, 3, parents)
+    assert not find_dependency_cycle(4, 3, parents)
+
+
+def test_series_inhibited_by_matching_labels():
+    parent, child = _rule(1), _rule(2, 1, inhibit_labels=['host'])
+    _fire(1, {'host': 'a'})
+    _fire(1, {'host': 'b'}, state='muted')
+    _fire(1, {'host': 'c'}, state='ok')
+    index = InhibitionIndex([parent, child])
+
+    inhibited = index.series_filter(child)
+    assert inhibited({'host': 'a', 'disk': 'sda'})
+    # 静默中的父序列同样视为告警中，已恢复的不抑制
+    assert inhibited({'host': 'b'})
+    assert not inhibited({'host': 'c'})
+    assert index.series_filter(parent) is None
+    assert index.summary()["inhibited_series"] == 2
+
+
+def test_no_firing_parent_means_no_inhibition():
+    index = InhibitionIndex([_rule(1), _rule(2, 1, skip_eval=True)])
+    assert index.series_filter(_rule(2, 1, skip_eval=True)) is None
+    assert not index.skip_evaluation(_rule(2, 1, skip_eval=True))
+
+
+def test_skip_evaluation_only_without_inhibit_labels():
+    _fire(1, {'host': 'a'})
+    whole, by_label = _rule(2, 1, skip_eval=True), _rule(3, 1, inhibit_labels=['host'], skip_eval=True)
+    index = InhibitionIndex([_rule(1), whole, by_label])
+    assert index.skip_evaluation(whole)
+    assert not index.skip_evaluation(by_label)
+    assert index.summary()["skipped_rules"] == 1
+
+
+def test_child_waits_for_parent_in_the_same_round():
+    parent, child = _rule(1), _rule(2, 1)
+    index = InhibitionIndex([parent, child])
+    index.expect([parent, child])
+    result = {}
+
+    waiter = threading.Thread(target=lambda: result.update(filter=index.series_filter(child)))
+    waiter.start()
+    waiter.join(0.1)
+    assert waiter.is_alive()
+
+    # 父规则本轮评估产生告警后才完成，子规则据此判断
+    _fire(1, {'host': 'a'})
+    index.mark_done(parent.id)
+    waiter.join(1)
+    assert not waiter.is_alive()
+    assert result["filter"] is not None and result["filter"]({'host': 'z'})
@@ -0,0 +1,140 @@
+"""
+发件箱限流合并与发送结果：令牌不足时合并为汇总通知，没有令牌时推迟且不计发送次数，
+到期的分组记录带上同组等待中的记录，发送成功后合并通知中每条告警的历史都记为已通知
+"""
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.alert.services import notify_outbox as outbox_module
+from app.alert.services.notify_outbox import NotifyOutboxWorker, enqueue_notifications
+from app.alert.services.notify_rate_limiter import notify_rate_limiter
+from app.alert.services.rule_compiler import rule_cache
+from app.models import AlertHistory, AlertNotifyOutbox, AlertNotifyTemplate
+
+
+class SyncDispatcher:
+    """同步执行发送并回调，代替按渠道排队的通知分发器"""
+
+    def submit(self, channel, send, callback=None, description=''):
+        callback(send())
+        return True
+
+
+@pytest.fixture
+def worker(db, monkeypatch):
+    rule_cache.clear()
+    notify_rate_limiter.reset()
+    monkeypatch.setattr(outbox_module, 'notify_dispatcher', SyncDispatcher())
+    worker = NotifyOutboxWorker()
+    worker.sent = []
+    worker._sender = lambda template, context: worker.sent.append(context) or {"success": True, "msg": "ok"}
+    yield worker
+    rule_cache.clear()
+    notify_rate_limiter.reset()
+
+
+def _template(db, **params) -> AlertNotifyTemplate:
+    template = AlertNotifyTemplate(name='t', type='http', params=json.dumps({'url': 'http://hook', **params}))
+    db.add(template)
+    db.commit()
+    return template
+
+
+def _enqueue(db, template, count, start=0, group_key=None, delay=0):
+    now = datetime.now() - timedelta(seconds=1)
+    items = []
+    for index in range(start, start + count):
+        key = f"key-{index}"
+        history = {'rule_id': 1, 'rule_name': f'r{index}', 'category': 'other', 'level': 'critical',
+                   'status': 'triggered', 'message': f'alert {index}'}
+        outbox = {'idempotency_key': key, 'rule_id': 1, 'template_id': template.id, 'channel': 'http',
+                  'payload': {'rule_name': f'r{index}', 'message': f'alert {index}', 'idempotency_key': key,
+                              'trigger_time': now.strftime('%Y-%m-%d %H:%M:%S')},
+                  'max_attempts': 3, 'group_key': group_key, 'next_attempt_at': now + timedelta(seconds=delay)}
+        items.append((history, [outbox]))
+    enqueue_notifications(db, items)
+    db.commit()
+
+
+def _rows(db):
+    db.expire_all()
+    return db.query(AlertNotifyOutbox).order_by(AlertNotifyOutbox.id).all()
+
+
+def test_token_exhaustion_coalesces_the_rest_into_one_notification(db, worker):
+    template = _template(db, rate_limit=1, rate_burst=2)
+    _enqueue(db, template, 25)
+
+    worker.drain_once()
+
+    # 两个令牌：一条单独发送，其余24条合并为一条汇总通知
+    assert len(worker.sent) == 2
+    counts = sorted(context.get('alert_count', 1) for context in worker.sent)
+    assert counts == [1, 24]
+    summary = next(context for context in worker.sent if context.get('alert_count') == 24)
+    assert summary['message'].endswith('+4条告警')
+    assert worker.stats()["coalesced_alerts"] == 24
+    assert [row.status for row in _rows(db)] == ['sent'] * 25
+
+
+def test_success_marks_history_of_every_coalesced_member(db, worker):
+    template = _template(db, rate_limit=1, rate_burst=2)
+    _enqueue(db, template, 5)
+
+    worker.drain_once()
+
+    db.expire_all()
+    histories = db.query(AlertHistory).all()
+    assert len(histories) == 5
+    assert all(history.notified and history.notified_at for history in histories)
+
+
+def test_due_group_member_claims_waiting_members(db, worker):
+    template = _template(db, group_wait=10)
+    _enqueue(db, template, 1, group_key='g1')
+    _enqueue(db, template, 2, start=1, group_key='g1', delay=10)
+    _enqueue(db, template, 1, start=3, group_key='g2', delay=10)
+
+    worker.drain_once()
+
+    # 同组仍在 group_wait 内的记录随到期记录一起发送，其他分组不受影响
+    assert [context.get('alert_count', 1) for context in worker.sent] == [3]
+    assert [row.status for row in _rows(db)] == ['sent', 'sent', 'sent', 'pending']
+
+
+def test_no_tokens_reschedules_without_consuming_an_attempt(db, worker):
+    template = _template(db, rate_limit=1, rate_burst=1)
+    _enqueue(db, template, 1)
+    worker.drain_once()
+    assert len(worker.sent) == 1
+
+    _enqueue(db, template, 3, start=1)
+    worker.drain_once()
+
+    assert len(worker.sent) == 1
+    pending = [row for row in _rows(db) if row.status != 'sent']
+    assert len(pending) == 3
+    assert all(row.status == 'pending' and row.attempts == 0 for row in pending)
+    assert all(row.next_attempt_at > datetime.now() for row in pending)
+    assert worker.stats()["throttled"] == 3
+
+
+def test_dispatcher_rejection_gives_back_the_attempt(db, worker, monkeypatch):
+    class RejectingDispatcher:
+        def submit(self, channel, send, callback=None, description=''):
+            callback({"success": False, "rejected": True, "msg": "http 通知队列已满"})
+            return False
+
+    monkeypatch.setattr(outbox_module, 'notify_dispatcher', RejectingDispatcher())
+    template = _template(db)
+    _enqueue(db, template, 2)
+
+    worker.drain_once()
+
+    rows = _rows(db)
+    assert [(row.status, row.attempts) for row in rows] == [('pending', 0), ('pending', 0)]
+    assert all(row.next_attempt_at > datetime.now() for row in rows)
+    assert worker.stats()["rejected"] == 2
@@ -0,0 +1,62 @@
+"""
+通知路由树：同级按顺序匹配、子路由优先、continue_matching、模板继承，未命中时回退到规则模板
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from app.alert.services.notify_router import build_route_tree, parse_matcher, walk_routes
+
+
+def _route(route_id, matchers, template_id=None, parent_id=None, continue_matching=False, sort_order=0):
+    return SimpleNamespace(id=route_id, name=f'route-{route_id}', parent_id=parent_id, matchers=matchers,
+                           notify_template_id=template_id, continue_matching=continue_matching,
+                           sort_order=sort_order)
+
+
+@pytest.fixture
+def tree():
+    roots, invalid = build_route_tree([
+        _route(1, ['category=hdfs'], template_id=10),
+        _route(2, ['level=critical'], parent_id=1, sort_order=1),
+        _route(3, ['instance=~"dn-.*"'], template_id=30, parent_id=1, sort_order=0),
+        _route(4, ['level=~"critical|high"'], template_id=40, continue_matching=True, sort_order=-1),
+        _route(5, ['team=ops'], template_id=50, sort_order=2),
+        _route(6, ['bad matcher'], template_id=60, sort_order=3),
+        _route(7, ['team=ops'], template_id=70, parent_id=6),
+    ])
+    assert invalid == 1
+    return roots
+
+
+def _routes(roots, **labels):
+    return [(node.id, template_id) for node, template_id in walk_routes(roots, labels)]
+
+
+def test_parse_matcher_strips_quotes_and_rejects_bad_input():
+    matcher = parse_matcher('instance=~"dn-.*"')
+    assert (matcher.name, matcher.op, matcher.value) == ('instance', '=~', 'dn-.*')
+    with pytest.raises(ValueError):
+        parse_matcher('instance')
+    with pytest.raises(ValueError):
+        parse_matcher('instance=~"("')
+
+
+def test_first_matching_child_wins_and_inherits_template(tree):
+    # 子路由按 sort_order 匹配，instance 路由排在前面
+    assert _routes(tree, category='hdfs', level='low', instance='dn-01') == [(3, 30)]
+    # 子路由未配置模板时继承父路由
+    assert _routes(tree, category='hdfs', level='low', instance='nn-01', team='x') == [(1, 10)]
+
+
+def test_continue_matching_sends_to_later_siblings(tree):
+    # 路由4开启 continue_matching，继续匹配后续同级路由，直到未开启的路由1命中
+    assert _routes(tree, category='hdfs', level='critical', instance='nn-01') == [(4, 40), (2, 10)]
+    assert _routes(tree, category='yarn', level='high', team='ops') == [(4, 40), (5, 50)]
+
+
+def test_invalid_route_and_its_children_are_ignored(tree):
+    assert _routes(tree, category='yarn', level='low', team='ops') == [(5, 50)]
+    # 没有路由命中时返回空列表，由调用方使用规则自身的通知模板
+    assert _routes(tree, category='yarn', level='low') == []
@@ -0,0 +1,106 @@
+"""
+发件箱重试：失败按指数退避重新排期，达到最大次数后标记为failed；租约过期的发送中记录被重新领取
+"""
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.alert.services import notify_outbox as outbox_module
+from app.alert.services.notify_outbox import NotifyOutboxWorker, enqueue_notifications, retry_delay
+from app.alert.services.notify_rate_limiter import notify_rate_limiter
+from app.alert.services.rule_compiler import rule_cache
+from app.models import AlertHistory, AlertNotifyOutbox, AlertNotifyTemplate
+
+
+class SyncDispatcher:
+    """同步执行发送并回调，代替按渠道排队的通知分发器"""
+
+    def submit(self, channel, send, callback=None, description=''):
+        callback(send())
+        return True
+
+
+@pytest.fixture
+def worker(db, monkeypatch):
+    rule_cache.clear()
+    notify_rate_limiter.reset()
+    monkeypatch.setattr(outbox_module, 'notify_dispatcher', SyncDispatcher())
+    worker = NotifyOutboxWorker()
+    worker.result = {"success": False, "msg": "http 500"}
+    worker._sender = lambda template, context: worker.result
+    yield worker
+    rule_cache.clear()
+    notify_rate_limiter.reset()
+
+
+def _enqueue(db, max_attempts=3):
+    template = AlertNotifyTemplate(name='t', type='http', params=json.dumps({'url': 'http://hook'}))
+    db.add(template)
+    db.commit()
+    now = datetime.now() - timedelta(seconds=1)
+    history = {'rule_id': 1, 'rule_name': 'r', 'category': 'other', 'level': 'critical',
+               'status': 'triggered', 'message': 'alert'}
+    outbox = {'idempotency_key': 'key-0', 'rule_id': 1, 'template_id': template.id, 'channel': 'http',
+              'payload': {'rule_name': 'r', 'message': 'alert', 'idempotency_key': 'key-0',
+                          'trigger_time': now.strftime('%Y-%m-%d %H:%M:%S')},
+              'max_attempts': max_attempts, 'next_attempt_at': now}
+    enqueue_notifications(db, [(history, [outbox])])
+    db.commit()
+
+
+def _row(db) -> AlertNotifyOutbox:
+    db.expire_all()
+    return db.query(AlertNotifyOutbox).one()
+
+
+def _make_due(db):
+    db.query(AlertNotifyOutbox).update({'next_attempt_at': datetime.now() - timedelta(seconds=1)})
+    db.commit()
+
+
+def test_retry_delay_is_exponential_capped_and_jittered():
+    # 默认首次10秒、上限600秒，抖动±20%
+    for _ in range(20):
+        assert timedelta(seconds=8) <= retry_delay(1) <= timedelta(seconds=12)
+        assert timedelta(seconds=32) <= retry_delay(3) <= timedelta(seconds=48)
+        assert timedelta(seconds=480) <= retry_delay(20) <= timedelta(seconds=720)
+
+
+def test_failure_backs_off_until_max_attempts(db, worker):
+    _enqueue(db, max_attempts=2)
+
+    before = datetime.now()
+    worker.drain_once()
+    row = _row(db)
+    assert (row.status, row.attempts, row.last_error) == ('pending', 1, 'http 500')
+    assert row.locked_by is None
+    assert before + timedelta(seconds=7) < row.next_attempt_at < datetime.now() + timedelta(seconds=13)
+
+    # 退避未到期时不会被领取
+    assert worker.drain_once() == 0
+
+    _make_due(db)
+    worker.drain_once()
+    row = _row(db)
+    assert (row.status, row.attempts) == ('failed', 2)
+    assert not db.query(AlertHistory).one().notified
+
+
+def test_expired_lease_is_reclaimed(db, worker):
+    _enqueue(db)
+    db.query(AlertNotifyOutbox).update({'status': 'sending', 'attempts': 1, 'locked_by': 'crashed-worker',
+                                        'locked_until': datetime.now() + timedelta(minutes=1)})
+    db.commit()
+
+    # 租约未过期，仍属于原进程
+    assert worker.drain_once() == 0
+
+    db.query(AlertNotifyOutbox).update({'locked_until': datetime.now() - timedelta(seconds=1)})
+    db.commit()
+    worker.result = {"success": True, "msg": "ok"}
+    assert worker.drain_once() == 1
+    row = _row(db)
+    assert (row.status, row.attempts, row.locked_by) == ('sent', 2, None)
+    assert db.query(AlertHistory).one().notified
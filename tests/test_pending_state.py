@@ -0,0 +1,64 @@
+"""
+for_duration：条件首次满足进入 pending，持续满足 for_duration 后才告警并通知，等待期内恢复则回到 ok
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.alert.services import engine_service
+from app.alert.services.instance_store import instance_store
+from app.alert.services.rule_compiler import CompiledRule
+from app.alert.services.silence_store import silence_store
+from app.models import AlertRule
+
+NOW = datetime(2026, 1, 1, 12, 0, 0)
+HOST = {'host': 'a'}
+
+
+@pytest.fixture(autouse=True)
+def clean_store():
+    instance_store.reset()
+    silence_store.reset()
+    yield
+    instance_store.reset()
+
+
+def _compile(for_duration):
+    return CompiledRule(AlertRule(id=1, name='load', level='high', category='other', promql='load', condition='> 1',
+                                  repeat=0, duration=3600, for_duration=for_duration), None)
+
+
+def _step(compiled, value, seconds):
+    instances = instance_store.get_rule_instances(compiled.id)
+    notifications = engine_service.evaluate_rule_series(
+        None, compiled, instances, [{'labels': HOST, 'value': value}], compiled.evaluate([value]),
+        NOW + timedelta(seconds=seconds)
+    )
+    instance = next(iter(instances.values()), None)
+    return (instance.alert_state if instance else None), len(notifications)
+
+
+def test_pending_until_for_duration_then_alerting():
+    compiled = _compile(60)
+    assert _step(compiled, 2, 0) == ('pending', 0)
+    assert _step(compiled, 2, 30) == ('pending', 0)
+    assert _step(compiled, 2, 59) == ('pending', 0)
+    assert _step(compiled, 2, 60) == ('alerting', 1)
+    # 已告警且未开启重复通知时不再通知
+    assert _step(compiled, 2, 90) == ('alerting', 0)
+
+
+def test_pending_resets_when_condition_clears():
+    compiled = _compile(60)
+    assert _step(compiled, 2, 0) == ('pending', 0)
+    assert _step(compiled, 0, 30) == ('ok', 0)
+    # 重新满足条件时从头计时
+    assert _step(compiled, 2, 40) == ('pending', 0)
+    assert _step(compiled, 2, 80) == ('pending', 0)
+    assert _step(compiled, 2, 100) == ('alerting', 1)
+
+
+def test_without_for_duration_alerts_immediately():
+    compiled = _compile(0)
+    assert _step(compiled, 2, 0) == ('alerting', 1)
@@ -0,0 +1,19 @@
+"""
+查询计划：注释和空白不影响分组，发送给Prometheus的是规则原始的PromQL
+"""
+
+from app.alert.services.query_planner import QueryPlan, normalize_promql
+
+
+def test_normalize_strips_comments_to_end_of_line():
+    assert normalize_promql('sum(rate(x[5m])) # total\n  > 0') == 'sum(rate(x[5m])) > 0'
+    assert normalize_promql('# header\nup') == 'up'
+    assert normalize_promql('x{a="#1"} # it\'s\n>1') == 'x{a="#1"} >1'
+
+
+def test_query_sends_original_promql_once_per_group():
+    sent = []
+    plan = QueryPlan([], lambda promql, eval_time: sent.append(promql) or [])
+    plan.query('sum(x) # total\n  > 0')
+    plan.query('sum(x)   > 0')
+    assert sent == ['sum(x) # total\n  > 0']
@@ -0,0 +1,46 @@
+"""
+规则编译缓存：同一秒内的修改（updated_at 不变）也要重新编译
+"""
+
+from datetime import datetime
+
+from app.alert.services.rule_compiler import RuleCache
+from app.models import AlertNotifyTemplate, AlertRule
+
+
+def _rule(**fields) -> AlertRule:
+    values = dict(id=1, name='r', promql='up', condition='> 1', level='critical',
+                  updated_at=datetime(2026, 1, 1, 12, 0, 0))
+    values.update(fields)
+    return AlertRule(**values)
+
+
+def test_same_rule_hits_cache():
+    cache = RuleCache()
+    compiled = cache.get(None, _rule())
+    assert cache.get(None, _rule()) is compiled
+
+
+def test_edit_within_same_second_recompiles():
+    cache = RuleCache()
+    assert cache.get(None, _rule()).threshold == 1
+    assert cache.get(None, _rule(condition='> 5')).threshold == 5
+    assert cache.get(None, _rule(condition='> 5', labels={'team': 'a'})).labels == {'team': 'a'}
+
+
+def test_template_edit_within_same_second_clears_cache(db):
+    template = AlertNotifyTemplate(name='t', type='http', params='{"url": "http://a"}',
+                                   updated_at=datetime(2026, 1, 1, 12, 0, 0))
+    db.add(template)
+    db.commit()
+    cache = RuleCache()
+    cache.refresh_templates(db)
+    assert cache.get_template(db, template.id).params['url'] == 'http://a'
+
+    # 同一秒内的修改，updated_at 不变
+    db.query(AlertNotifyTemplate).filter(AlertNotifyTemplate.id == template.id).update(
+        {'params': '{"url": "http://b"}', 'updated_at': datetime(2026, 1, 1, 12, 0, 0)}
+    )
+    db.commit()
+    cache.refresh_templates(db)
+    assert cache.get_template(db, template.id).params['url'] == 'http://b'
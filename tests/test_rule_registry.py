@@ -0,0 +1,51 @@
+"""
+规则注册表增量同步：水位线回退窗口内未变化的记录不重复加载，只统计真正的变更
+"""
+
+from datetime import datetime, timedelta
+
+from app.alert.services.rule_registry import RuleRegistry
+from app.models import AlertRule
+
+BASE_TIME = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def _add_rules(db, count):
+    for index in range(count):
+        db.add(AlertRule(name=f'r{index}', promql='up', condition='> 1', level='critical', enabled=True,
+                         updated_at=BASE_TIME + timedelta(seconds=index)))
+    db.commit()
+
+
+def test_incremental_sync_skips_unchanged_watermark_row(db):
+    _add_rules(db, 3)
+    registry = RuleRegistry()
+    assert len(registry.refresh(db)) == 3
+
+    for _ in range(3):
+        assert len(registry.refresh(db)) == 3
+        assert registry.stats()["last_fetched_rows"] == 0
+
+
+def test_incremental_sync_applies_edits_and_disables(db):
+    _add_rules(db, 3)
+    registry = RuleRegistry()
+    registry.refresh(db)
+
+    rule = db.query(AlertRule).filter(AlertRule.name == 'r0').one()
+    rule.condition = '> 5'
+    rule.updated_at = BASE_TIME + timedelta(minutes=1)
+    db.commit()
+    rules = {rule.name: rule for rule in registry.refresh(db)}
+    assert registry.stats()["last_fetched_rows"] == 1
+    assert rules['r0'].condition == '> 5'
+
+    rule.enabled = False
+    rule.updated_at = BASE_TIME + timedelta(minutes=2)
+    db.commit()
+    assert sorted(rule.name for rule in registry.refresh(db)) == ['r1', 'r2']
+    assert registry.stats()["last_removed_rules"] == 1
+
+    # 已禁用的规则再次落在回退窗口内也不重复加载
+    registry.refresh(db)
+    assert registry.stats()["last_fetched_rows"] == 0
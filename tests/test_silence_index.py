@@ -0,0 +1,68 @@
+"""
+静默索引：按 [starts_at, ends_at) 时间段二分查找生效的静默，按相等匹配器分桶匹配告警标签
+"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from app.alert.services.notify_router import parse_matchers
+from app.alert.services.silence_store import Silence, SilenceIndex, SilenceStore
+
+T0 = datetime(2026, 1, 1, 0, 0, 0)
+
+
+def _silence(silence_id, matchers, start, end):
+    return Silence(silence_id, parse_matchers(matchers), T0 + timedelta(hours=start), T0 + timedelta(hours=end))
+
+
+def _matched(index, labels, hour):
+    active = index.active(T0 + timedelta(hours=hour))
+    if active is None:
+        return None
+    silence = active.first(labels)
+    return silence.id if silence is not None else None
+
+
+def test_active_window_is_half_open():
+    index = SilenceIndex([_silence(1, ['host=a'], 1, 3), _silence(2, ['host=a'], 2, 5)])
+    labels = {'host': 'a'}
+    assert index.active(T0) is None
+    assert _matched(index, labels, 1) == 1
+    assert _matched(index, labels, 2.5) == 1
+    # 结束时刻不再生效，由仍在窗口内的静默接替
+    assert _matched(index, labels, 3) == 2
+    assert _matched(index, labels, 5) is None
+    assert index.active(T0 + timedelta(hours=6)) is None
+
+
+def test_equal_matcher_buckets_and_scanned_matchers():
+    index = SilenceIndex([
+        _silence(1, ['host=a', 'level=critical'], 0, 1),
+        _silence(2, ['host=b'], 0, 1),
+        _silence(3, ['instance=~"dn-0[12]"'], 0, 1),
+        _silence(4, ['category!=hdfs', 'host=c'], 0, 1),
+    ])
+    assert _matched(index, {'host': 'a', 'level': 'critical'}, 0) == 1
+    # 桶命中但其余匹配器不满足
+    assert _matched(index, {'host': 'a', 'level': 'high'}, 0) is None
+    assert _matched(index, {'host': 'b'}, 0) == 2
+    # 正则整体匹配
+    assert _matched(index, {'host': 'x', 'instance': 'dn-02'}, 0) == 3
+    assert _matched(index, {'host': 'x', 'instance': 'dn-023'}, 0) is None
+    assert _matched(index, {'host': 'c', 'category': 'yarn'}, 0) == 4
+    assert _matched(index, {'host': 'c', 'category': 'hdfs'}, 0) is None
+
+
+def test_series_filter_only_when_a_silence_is_active():
+    store = SilenceStore()
+    rule = SimpleNamespace(name='disk', level='critical', category='hdfs', labels={'team': 'ops'})
+    assert store.series_filter(rule, T0) is None
+
+    store._index = SilenceIndex([_silence(7, ['team=ops', 'host=a'], 1, 2)])
+    assert store.series_filter(rule, T0) is None
+
+    silenced = store.series_filter(rule, T0 + timedelta(hours=1))
+    assert silenced({'host': 'a'}) == 7
+    assert silenced({'host': 'b'}) is None
+    assert store.match({'team': 'ops', 'host': 'a'}, T0 + timedelta(hours=1, minutes=30)) == 7
+    assert store.stats()["muted_series"] == 1
@@ -0,0 +1,40 @@
+"""
+时间片预算：到期规则按告警等级排序，超出预估评估能力的低优先级规则推迟
+"""
+
+from types import SimpleNamespace
+
+from app.alert.services import engine_service
+from app.alert.services.inhibition import InhibitionIndex
+from app.alert.services.tick_monitor import TickMonitor, prioritize
+
+
+def _rule(rule_id, level):
+    return SimpleNamespace(id=rule_id, name=f'r{rule_id}', level=level, parent_rule_id=None,
+                           inhibit_labels=None, inhibit_skip_eval=False)
+
+
+def test_rules_are_ordered_by_level_then_id():
+    rules = [_rule(1, 'info'), _rule(2, 'critical'), _rule(3, 'warning'), _rule(4, 'critical'), _rule(5, None)]
+    assert [rule.id for rule in prioritize(rules)] == [2, 4, 3, 1, 5]
+
+
+def test_capacity_follows_observed_rule_cost():
+    monitor = TickMonitor()
+    assert monitor.capacity(4, 2) is None
+    monitor.observe_rule(0.5)
+    assert monitor.capacity(4, 2) == 16
+    monitor.observe_rule(1.5)
+    assert monitor.capacity(4, 2) == 11
+
+
+def test_plan_defers_low_priority_rules_beyond_capacity(monkeypatch):
+    monitor = TickMonitor()
+    monitor.observe_rule(1.0)
+    monkeypatch.setattr(engine_service, 'tick_monitor', monitor)
+    rules = [_rule(1, 'low'), _rule(2, 'critical'), _rule(3, 'info'), _rule(4, 'high')]
+
+    planned, deferred = engine_service._plan_tick(rules, 2, 1, InhibitionIndex(rules))
+
+    assert sorted(rule.id for rule in planned) == [2, 4]
+    assert [rule.id for rule in deferred] == [1, 3]